@@ -37,11 +37,22 @@ def main(options, site=None):
     if options.get("mode"):
         os.environ['TACTIC_QUEUE_MODE'] = options.get("mode")
 
+    # with worker processes, the workers are recycled instead of
+    # restarting the whole queue process
+    max_jobs_completed = 50
+    workers = options.get("workers")
+    if workers:
+        workers = int(workers)
+        max_jobs_completed = -1
+
     JobTask.start(
         check_interval=0.1,
-        max_jobs_completed=50,
+        max_jobs_completed=max_jobs_completed,
+        max_jobs_per_worker=50,
         pid_path=pid_path,
-        queue=options.get("queue")
+        queue=options.get("queue"),
+        workers=workers,
+        concurrency=options.get("concurrency"),
     )
 
     try:
@@ -96,6 +107,8 @@ if __name__ == '__main__':
     parser.add_option("-i", "--index", dest="index", help="index of this job queue", default=0)
     parser.add_option("-s", "--site", dest="site", help="Site to grab queue from")
     parser.add_option("-m", "--mode", dest="mode", help="Mode to run (standalone or monitor)")
+    parser.add_option("-w", "--workers", dest="workers", help="Number of worker processes used to run the jobs", default=None)
+    parser.add_option("-c", "--concurrency", dest="concurrency", help="Maximum jobs run at once per queue, e.g. render:1,default:4", default=None)
     
  
     (options, args) = parser.parse_args()
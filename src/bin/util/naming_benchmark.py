@@ -0,0 +1,182 @@
+###########################################################
+#
+# Copyright (c) 2009, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+# Measures the lookup of naming conventions and the parsing of naming
+# templates over a generated naming table.  Nothing is written to the
+# database.
+#
+#   python naming_benchmark.py [project_code] [search_type]
+
+import sys, time, re
+
+import tacticenv
+
+from pyasm.security import Batch, Site
+from pyasm.search import SearchType
+
+
+SEARCH_TYPES = 40
+CONTEXTS = ['model', 'rig', 'texture', 'lookdev', 'anim', 'layout', 'light', 'comp', 'fx', 'cfx']
+REQUESTS = 200
+LOOKUPS = 50
+
+
+def create_namings(search_type):
+    '''build a naming table like the one of a production: namings for each
+    context of many search types, with sub contexts, versionless namings
+    and a few conditions'''
+    namings = []
+
+    search_types = [search_type]
+    for i in range(SEARCH_TYPES):
+        search_types.append("bench/type%s" % i)
+
+    count = 0
+    for stype in search_types:
+        for context in CONTEXTS:
+            for n_context, latest, current, condition in [
+                    (context, False, False, None),
+                    ("%s/*" % context, False, False, None),
+                    (context, True, False, None),
+                    (context, False, True, None),
+                    (context, False, False, "@GET(.process) == 'bench_%s'" % context),
+                ]:
+                naming = SearchType.create("config/naming")
+                naming.set_value("code", "NAMING%05d" % count)
+                naming.set_value("search_type", stype)
+                naming.set_value("snapshot_type", "file")
+                naming.set_value("context", n_context)
+                naming.set_value("latest_versionless", latest)
+                naming.set_value("current_versionless", current)
+                if condition:
+                    naming.set_value("condition", condition)
+                naming.set_value("dir_naming", "{project.code}/%s/{sobject.code}/{context[0]}" % stype.replace("/", "_"))
+                naming.set_value("file_naming", "{sobject.code}_{context[0]}_v{version}.{ext}")
+                namings.append(naming)
+                count += 1
+
+    return namings
+
+
+def create_snapshots(sobject):
+    snapshots = []
+    for i, context in enumerate(CONTEXTS):
+        for version in [i+1, -1, 0]:
+            snapshot = SearchType.create("sthpw/snapshot")
+            snapshot.set_value("context", context)
+            snapshot.set_value("snapshot_type", "file")
+            snapshot.set_value("version", version)
+            snapshot.set_sobject(sobject)
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def parse_template(template):
+    '''parse a template as NamingUtil did before templates were compiled'''
+    parts = []
+    for part in re.compile(r'{(.*?)}').findall(template):
+        index = -1
+        if part.startswith(("@","$")):
+            parts.append( (part, "@", None, index) )
+            continue
+        if part.find(".") != -1:
+            object, attr = part.split(".")
+        else:
+            object, attr = None, part
+        if attr.endswith(']'):
+            attr, index = attr.split("[")
+            index = int(index.rstrip("]"))
+        parts.append( (part, object, attr, index) )
+    return parts
+
+
+def execute(project_code, search_type):
+    from pyasm.biz import Naming, NamingUtil, Project, CacheContainer
+
+    Batch(project_code=project_code)
+
+    namings = create_namings(search_type)
+    sobject = SearchType.create(search_type)
+    sobject.set_value("code", "BENCH001")
+    snapshots = create_snapshots(sobject)
+
+    print("namings: %s" % len(namings))
+    print("requests: %s, lookups per request: %s" % (REQUESTS, LOOKUPS))
+    print(" ")
+
+    # make sure the index cache exists, then replace the index of this
+    # project with the generated table
+    Naming._get_index()
+    caches = CacheContainer.get(Naming.INDEX_KEY).caches
+    key = (Site.get_site(), Project.get_project_code())
+
+    def run():
+        for i in range(LOOKUPS):
+            snapshot = snapshots[i % len(snapshots)]
+            Naming.get(sobject, snapshot)
+
+    # the namings are indexed for every request, as they were when they
+    # were kept in the Container
+    start = time.time()
+    for i in range(REQUESTS):
+        caches[key] = Naming._build_index(namings)
+        run()
+    per_request = time.time() - start
+
+    # the index is shared by all requests
+    caches[key] = Naming._build_index(namings)
+    start = time.time()
+    for i in range(REQUESTS):
+        run()
+    shared = time.time() - start
+
+    num = REQUESTS * LOOKUPS
+    print("naming index per request: %0.3fs (%0.1fus per lookup)" % (per_request, per_request * 1000000 / num))
+    print("shared naming index:      %0.3fs (%0.1fus per lookup)" % (shared, shared * 1000000 / num))
+    print(" ")
+
+    templates = []
+    for naming in namings:
+        templates.append(naming.get_value("dir_naming"))
+        templates.append(naming.get_value("file_naming"))
+
+    start = time.time()
+    for i in range(REQUESTS):
+        for template in templates[:LOOKUPS]:
+            parse_template(template)
+    parsed = time.time() - start
+
+    start = time.time()
+    for i in range(REQUESTS):
+        for template in templates[:LOOKUPS]:
+            NamingUtil.compile_template(template)
+    compiled = time.time() - start
+
+    print("template parsing:  %0.3fs" % parsed)
+    print("compiled template: %0.3fs" % compiled)
+    print(" ")
+
+    # remove the generated table
+    Naming.clear_index()
+
+
+if __name__ == '__main__':
+    project_code = "admin"
+    search_type = "sthpw/note"
+    args = sys.argv[1:]
+    if len(args) > 0:
+        project_code = args[0]
+    if len(args) > 1:
+        search_type = args[1]
+    execute(project_code, search_type)
+
+
@@ -12,3 +12,4 @@
 
 from .common import *
 from .upload_multipart import *
+from .result_encoding import *
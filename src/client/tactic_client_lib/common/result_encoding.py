@@ -0,0 +1,220 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['ResultEncoding']
+
+import base64, datetime, decimal, gzip, io, json
+
+import six
+
+try:
+    import xmlrpclib
+except:
+    # Python3
+    from xmlrpc import client as xmlrpclib
+
+
+
+class ResultEncoding(object):
+    '''Compact encoding of the results of the API sent over XML-RPC.
+
+    A list of dictionaries with the same keys is sent as a table: the
+    column names once and each row as a list of values.  Everything else
+    is sent as plain JSON.  Dates, times, intervals, binary data and sets
+    are tagged so that they are returned as the same objects as with the
+    default encoding.  Values of any other type which JSON does not support
+    raise a TypeError, so the server can send the default encoding instead.
+
+    The client asks for an encoding with the "encoding" key of the ticket:
+        columnar - JSON string
+        columnar_gzip - JSON compressed with gzip when it is large, sent
+            as XML-RPC binary
+    Servers which do not know the key ignore it and return the default
+    encoding, so the client has to accept both.
+    '''
+
+    ENCODINGS = ['columnar', 'columnar_gzip']
+
+    # marks a JSON encoded result
+    PREFIX = "SPTJSON:"
+
+    # results smaller than this are not worth compressing
+    GZIP_MIN_SIZE = 4096
+
+    VERSION = 1
+
+
+    def encode(cls, results, encoding='columnar'):
+        '''encode the results to be sent to the client'''
+        data = {'v': cls.VERSION}
+
+        if cls.is_table(results):
+            columns = list(results[0].keys())
+            data['c'] = columns
+            data['r'] = [[cls._encode_value(x.get(c)) for c in columns] for x in results]
+        else:
+            data['d'] = cls._encode_value(results)
+
+        payload = json.dumps(data, separators=(',',':'))
+
+        if encoding == 'columnar_gzip' and len(payload) >= cls.GZIP_MIN_SIZE:
+            buf = io.BytesIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            try:
+                f.write(payload.encode('utf-8'))
+            finally:
+                f.close()
+            return xmlrpclib.Binary(buf.getvalue())
+
+        return "%s%s" % (cls.PREFIX, payload)
+    encode = classmethod(encode)
+
+
+    def decode(cls, results):
+        '''decode results received from the server.  Results that were not
+        encoded by the server are returned unchanged'''
+        if isinstance(results, xmlrpclib.Binary):
+            f = gzip.GzipFile(fileobj=io.BytesIO(results.data), mode='rb')
+            try:
+                payload = f.read().decode('utf-8')
+            finally:
+                f.close()
+
+        elif isinstance(results, six.string_types) and results.startswith(cls.PREFIX):
+            payload = results[len(cls.PREFIX):]
+
+        else:
+            return results
+
+        data = json.loads(payload)
+
+        if 'c' in data:
+            columns = [cls._decode_key(x) for x in data.get('c')]
+            results = []
+            for row in data.get('r'):
+                results.append( dict(zip(columns, [cls._decode_value(x) for x in row])) )
+            return results
+
+        return cls._decode_value(data.get('d'))
+    decode = classmethod(decode)
+
+
+    def is_encoded(cls, results):
+        if isinstance(results, xmlrpclib.Binary):
+            return True
+        return isinstance(results, six.string_types) and results.startswith(cls.PREFIX)
+    is_encoded = classmethod(is_encoded)
+
+
+    def is_table(cls, results):
+        '''determine if the results can be sent as columns and rows'''
+        if not isinstance(results, list) or not results:
+            return False
+
+        first = results[0]
+        if not isinstance(first, dict):
+            return False
+
+        keys = set(first.keys())
+        for item in results:
+            if not isinstance(item, dict) or len(item) != len(keys):
+                return False
+            for key in item:
+                if key not in keys:
+                    return False
+        return True
+    is_table = classmethod(is_table)
+
+
+    def _encode_value(cls, value):
+        if isinstance(value, datetime.datetime):
+            return {'$dt': value.isoformat()}
+        elif isinstance(value, datetime.date):
+            return {'$d': value.isoformat()}
+        elif isinstance(value, datetime.time):
+            return {'$t': value.isoformat()}
+        elif isinstance(value, datetime.timedelta):
+            return {'$td': [value.days, value.seconds, value.microseconds]}
+        elif isinstance(value, (set, frozenset)):
+            return {'$set': [cls._encode_value(x) for x in value]}
+        elif isinstance(value, decimal.Decimal):
+            return float(value)
+        elif isinstance(value, dict):
+            return dict([(k, cls._encode_value(v)) for k, v in value.items()])
+        elif isinstance(value, (list, tuple)):
+            return [cls._encode_value(x) for x in value]
+        elif six.PY2 and isinstance(value, str):
+            return value.decode('utf-8', 'ignore')
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            return {'$b': base64.b64encode(bytes(value)).decode('ascii')}
+        return value
+    _encode_value = classmethod(_encode_value)
+
+
+    def _decode_key(cls, key):
+        # match the str keys of the default encoding
+        if six.PY2 and isinstance(key, unicode):
+            try:
+                return key.encode('ascii')
+            except UnicodeEncodeError:
+                pass
+        return key
+    _decode_key = classmethod(_decode_key)
+
+
+    def _decode_value(cls, value):
+        if isinstance(value, dict):
+            if len(value) == 1:
+                if '$dt' in value:
+                    return cls._parse_datetime(value.get('$dt'))
+                elif '$d' in value:
+                    return datetime.datetime.strptime(value.get('$d'), "%Y-%m-%d").date()
+                elif '$t' in value:
+                    return cls._parse_time(value.get('$t'))
+                elif '$td' in value:
+                    days, seconds, microseconds = value.get('$td')
+                    return datetime.timedelta(days=days, seconds=seconds, microseconds=microseconds)
+                elif '$b' in value:
+                    return base64.b64decode(value.get('$b'))
+                elif '$set' in value:
+                    return set([cls._decode_value(x) for x in value.get('$set')])
+            return dict([(cls._decode_key(k), cls._decode_value(v)) for k, v in value.items()])
+        elif isinstance(value, list):
+            return [cls._decode_value(x) for x in value]
+        return value
+    _decode_value = classmethod(_decode_value)
+
+
+    def _parse_datetime(cls, value):
+        # isoformat() leaves out the microseconds when there are none.  The
+        # offset of aware dates is dropped as the default encoding has no
+        # time zone class to return either
+        if len(value) > 19 and value[-6] in ['+', '-']:
+            value = value[:-6]
+
+        if "." in value:
+            return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+        else:
+            return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+    _parse_datetime = classmethod(_parse_datetime)
+
+
+    def _parse_time(cls, value):
+        if len(value) > 8 and value[-6] in ['+', '-']:
+            value = value[:-6]
+
+        if "." in value:
+            return datetime.datetime.strptime(value, "%H:%M:%S.%f").time()
+        else:
+            return datetime.datetime.strptime(value, "%H:%M:%S").time()
+    _parse_time = classmethod(_parse_time)
+
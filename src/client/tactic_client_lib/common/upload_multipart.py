@@ -124,6 +124,42 @@ class UploadMultipart(object):
 
 
 
+    def upload_chunk(self, upload_id, offset, buffer, checksum=None):
+        '''send a chunk of a resumable upload which is written at offset.
+        Chunks can be sent in any order and from many threads, each with
+        its own UploadMultipart'''
+        assert self.server_url
+
+        fields = [
+            ("ajax", "true"),
+            ("upload_id", upload_id),
+            ("offset", str(offset)),
+        ]
+        if checksum:
+            fields.append(("checksum", checksum))
+        if self.ticket:
+            fields.append(("ticket", self.ticket))
+            fields.append(("login_ticket", self.ticket))
+
+        files = [("file", "chunk", buffer)]
+
+        # a chunk which is sent again is simply written again
+        error = None
+        for i in range(5):
+            try:
+                (status, reason, content) = self.posturl(self.server_url, fields, files)
+            except (socket.error, httplib.HTTPException) as e:
+                error = e
+                continue
+
+            if status == 200:
+                return content
+            error = "%s %s" % (status, reason)
+
+        raise TacticUploadException("Upload of chunk at [%s] of [%s] failed: %s" % (offset, upload_id, error))
+
+
+
     def upload(self, url, fields, files):
 
         try:
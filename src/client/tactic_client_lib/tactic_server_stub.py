@@ -33,6 +33,12 @@ except:
     # Python3
     from http import client as httplib
 
+# the stub may be copied without the rest of the client library
+try:
+    from .common import ResultEncoding
+except (ImportError, ValueError):
+    ResultEncoding = None
+
 
 
 class TacticApiException(Exception):
@@ -77,6 +83,12 @@ class TacticServerStub(object):
 
         self.site = site
 
+        # encoding of the results of queries requested from the server
+        if ResultEncoding:
+            self.result_encoding = 'columnar_gzip'
+        else:
+            self.result_encoding = None
+
         # autodetect protocol
         if not protocol:
             protocol = 'xmlrpc'
@@ -172,6 +184,8 @@ class TacticServerStub(object):
             'language': 'python',
             'site': self.site
         }
+        if self.result_encoding:
+            self.ticket['encoding'] = self.result_encoding
 
         """
         if self.project_code:
@@ -190,6 +204,35 @@ class TacticServerStub(object):
     def get_transaction_ticket(self):
         return self.transaction_ticket
 
+
+    def set_result_encoding(self, encoding):
+        '''Function: set_result_encoding(encoding)
+        Set the encoding of the results of query(), query_snapshots(),
+        eval() and get_all_children()
+
+        @params
+           string - columnar, columnar_gzip or None to use the default
+              encoding'''
+        if not ResultEncoding:
+            encoding = None
+        self.result_encoding = encoding
+        if self.ticket:
+            self.set_transaction_ticket(self.transaction_ticket)
+
+
+    def get_result_encoding(self):
+        return self.result_encoding
+
+
+    def _decode_results(self, results, evaluate=True):
+        '''decode results sent by the server in the negotiated encoding.
+        Results in the default encoding are evaluated if evaluate is True'''
+        if ResultEncoding and ResultEncoding.is_encoded(results):
+            return ResultEncoding.decode(results)
+        if evaluate and isinstance(results, six.string_types):
+            return eval(results)
+        return results
+
     def get_login_ticket(self):
         return self.login_ticket
 
@@ -1010,6 +1053,37 @@ class TacticServerStub(object):
 
 
 
+    def batch(self, use_transaction=False):
+        '''API Function: batch(use_transaction=False)
+        Create a batch of calls which are sent to the server in a single
+        request.  Calls made on the batch are queued and return a
+        TacticBatchResult.  The results are available after the batch is
+        executed, which is done when the "with" block ends.  Only functions
+        which make a single call to the server can be batched, so functions
+        which upload files cannot
+
+        @keyparam:
+        use_transaction - if True, all of the calls are run in a single
+            transaction which is aborted if any of them fails.  Otherwise,
+            the error of a call is raised when its result is read
+
+        @return:
+        TacticServerBatch
+
+        @example:
+        [code]
+        with server.batch() as batch:
+            shot = batch.get_by_search_key(search_key)
+            snapshot = batch.get_snapshot(search_key, context="publish")
+
+        print(shot.get().get("code"))
+        print(snapshot.get().get("version"))
+        [/code]
+        '''
+        return TacticServerBatch(self, use_transaction=use_transaction)
+
+
+
     # FIXME: have to fix these because these are post transaction!!
     def undo(self, transaction_ticket=None, transaction_id=None,
              ignore_files=False):
@@ -1100,8 +1174,9 @@ class TacticServerStub(object):
 
     def query(self, search_type, filters=[], columns=[], order_bys=[],
               show_retired=False, limit=None, offset=None, single=False,
-              distinct=None, return_sobjects=False, parent_key=None):
-        '''API Function: query(search_type, filters=[], columns=[], order_bys=[], show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False) 
+              distinct=None, return_sobjects=False, parent_key=None,
+              cursor=None):
+        '''API Function: query(search_type, filters=[], columns=[], order_bys=[], show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False, cursor=None) 
         General query for sobject information
 
         @param:
@@ -1121,10 +1196,16 @@ class TacticServerStub(object):
         return_sobjects - return sobjects instead of dictionary.  This
                 works only when using the API on the server.
         parent_key - filter to specify a parent sobject
+        cursor - page through the results using the cursor returned with
+                the previous page instead of an offset.  Use an empty
+                string for the first page.  See also iter_query()
 
         @return:
         list of dictionary/sobjects - Each array item represents an sobject
                and is a dictionary of name/value pairs
+               If a cursor is given, a dictionary with the "results" of the
+               page and the "cursor" of the next page, which is None after
+               the last page
 
         @example:
         [code]
@@ -1149,13 +1230,63 @@ class TacticServerStub(object):
         [/code]
         '''
         #return self.server.query(self.ticket, search_type, filters, columns, order_bys, show_retired, limit, offset, single, return_sobjects)
-        results = self.server.query(self.ticket, search_type, filters, columns,
-                                  order_bys, show_retired, limit, offset,
-                                  single, distinct, return_sobjects, parent_key)
-        if not return_sobjects and isinstance(results, six.string_types):
-            results = eval(results)
+        args = [self.ticket, search_type, filters, columns, order_bys,
+                show_retired, limit, offset, single, distinct,
+                return_sobjects, parent_key]
+        # only sent when used so that older servers can still be queried
+        if cursor != None:
+            args.append(cursor)
+
+        results = self.server.query(*args)
+        if cursor != None:
+            if not return_sobjects:
+                results['results'] = self._decode_results(results.get('results'))
+            return results
+
+        if not return_sobjects:
+            results = self._decode_results(results)
         return results
 
+
+    def iter_query(self, search_type, filters=[], columns=[], order_bys=[],
+                   show_retired=False, page_size=1000, parent_key=None):
+        '''API Function: iter_query(search_type, filters=[], columns=[], order_bys=[], show_retired=False, page_size=1000, parent_key=None)
+        Iterate through the results of a query one page at a time.  Each
+        page starts after the last sobject of the previous page, so large
+        numbers of sobjects can be read without slowing down with each
+        page as with an offset
+
+        @param:
+        search_type - the key identifying a type of sobject as registered in
+                      the search_type table.
+
+        @keyparam:
+        filters -  an array of filters to alter the search
+        columns -  an array of columns whose values should be retrieved
+        order_bys - an array of columns to order by.  Only columns of the
+                search type can be used
+        show_retired - sets whether retired sobjects are also returned
+        page_size - number of sobjects retrieved with each call to the server
+        parent_key - filter to specify a parent sobject
+
+        @return:
+        generator of dictionaries - Each item represents an sobject
+
+        @example:
+        [code]
+            for snapshot in server.iter_query("sthpw/snapshot", order_bys=['timestamp']):
+                print(snapshot.get("code"))
+        [/code]
+        '''
+        cursor = ""
+        while cursor != None:
+            page = self.query(search_type, filters, columns, order_bys,
+                              show_retired, limit=page_size,
+                              parent_key=parent_key, cursor=cursor)
+            for result in page.get('results'):
+                yield result
+            cursor = page.get('cursor')
+
         
     def insert(self, search_type, data, metadata={}, parent_key=None,  info={},
                use_id=False, triggers=True):
@@ -1427,7 +1558,7 @@ class TacticServerStub(object):
         results = self.server.eval(self.ticket, expression, search_keys, mode,
                                  single, vars, show_retired)
         try:
-            return eval(results)
+            return self._decode_results(results)
         except:
             return results
 
@@ -1628,8 +1759,9 @@ class TacticServerStub(object):
             list of dictionary - a list of sobjects dictionaries
         '''
         #filters = []
-        return self.server.get_all_children(self.ticket, search_key, child_type,
-                                          filters, columns)
+        results = self.server.get_all_children(self.ticket, search_key,
+                                          child_type, filters, columns)
+        return self._decode_results(results, evaluate=False)
 
 
 
@@ -1849,7 +1981,28 @@ class TacticServerStub(object):
         if offset:
             upload.set_offset(offset)
         upload.set_ticket(self.transaction_ticket)
-       
+
+        if base_dir:
+            sub_dir = self._get_upload_subdir(path, base_dir)
+            if sub_dir:
+                upload.set_subdir(sub_dir)
+
+
+        upload.set_upload_server(self._get_upload_server_url())
+
+        while True:
+            try:
+                upload.execute(path)
+            except Exception as e:
+                print("offset: ", upload.offset)
+                raise
+
+
+            break
+
+
+
+    def _get_upload_server_url(self):
         # If a portal set up is used, alter server name for upload
         if self.site:
             upload_server_name = "%s/tactic/%s" % (self.server_name, self.site)
@@ -1861,29 +2014,212 @@ class TacticServerStub(object):
             upload_server_url = "%s/default/UploadServer/" % upload_server_name
         else:
             upload_server_url = "http://%s/default/UploadServer/" % upload_server_name
+        return upload_server_url
 
-        if base_dir:
-            basename = os.path.basename(path)
-            dirname = os.path.dirname(path)
-            if not path.startswith(dirname):
-                raise TacticApiException("Path [%s] does not start with base_dir [%s]" % (path, base_dir))
-            base_dir = base_dir.rstrip("/")
-            sub_dir = dirname.replace("%s/" % base_dir, "")
-            if sub_dir:
-                upload.set_subdir(sub_dir)
 
+    def _get_upload_subdir(self, path, base_dir):
+        dirname = os.path.dirname(path)
+        if not path.startswith(dirname):
+            raise TacticApiException("Path [%s] does not start with base_dir [%s]" % (path, base_dir))
+        base_dir = base_dir.rstrip("/")
+        return dirname.replace("%s/" % base_dir, "")
 
-        upload.set_upload_server(upload_server_url)
 
-        while True:
+
+    def start_upload(self, path, size=None, subdir=None, algorithm=None):
+        '''API Function: start_upload(path, size=None, subdir=None, algorithm=None)
+        Start a resumable upload of a file.  The chunks of the file can then
+        be sent in any order, see upload_file_resumable()
+
+        @param:
+        path - the path of the file that will be uploaded
+
+        @keyparam:
+        size - the size of the file.  Defaults to the size of path
+        subdir - sub directory of the upload dir
+        algorithm - checksum algorithm.  Defaults to the one of the server
+
+        @return
+        dictionary - upload_id, chunk_size and algorithm
+        '''
+        if size == None:
+            size = os.path.getsize(path)
+        kwargs = {}
+        if subdir:
+            kwargs['subdir'] = subdir
+        if algorithm:
+            kwargs['algorithm'] = algorithm
+
+        # sizes are sent as strings because XML-RPC integers are 32 bit
+        return self.server.start_upload(self.ticket, os.path.basename(path), str(size), kwargs)
+
+
+    def get_upload_status(self, upload_id):
+        '''API Function: get_upload_status(upload_id)
+        Get the status of a resumable upload
+
+        @param:
+        upload_id - the id returned by start_upload()
+
+        @return
+        dictionary - size, algorithm, chunk_size, received: the list of
+            [start, end] ranges which have been received, received_size
+            and complete
+        '''
+        status = self.server.get_upload_status(self.ticket, upload_id)
+        status['size'] = int(status.get('size'))
+        status['received_size'] = int(status.get('received_size'))
+        status['received'] = [[int(x[0]), int(x[1])] for x in status.get('received')]
+        return status
+
+
+    def finish_upload(self, upload_id, checksum=None):
+        '''API Function: finish_upload(upload_id, checksum=None)
+        Finish a resumable upload once all of the data has been sent.  The
+        file is then in the upload dir as with upload_file()
+
+        @param:
+        upload_id - the id returned by start_upload()
+
+        @keyparam:
+        checksum - checksum of the whole file, which is verified on the server
+
+        @return
+        string - the name of the uploaded file
+        '''
+        return self.server.finish_upload(self.ticket, upload_id, checksum)
+
+
+    def abort_upload(self, upload_id):
+        '''API Function: abort_upload(upload_id)
+        Remove a resumable upload and all of the data sent
+
+        @param:
+        upload_id - the id returned by start_upload()
+        '''
+        return self.server.abort_upload(self.ticket, upload_id)
+
+
+    def _get_upload_hash(self, algorithm):
+        if algorithm == "blake2b":
+            return hashlib.blake2b(digest_size=16)
+        elif algorithm == "xxh128":
+            import xxhash
+            return xxhash.xxh3_128()
+        return hashlib.new(algorithm)
+
+
+    def _get_missing_chunks(self, size, received, chunk_size):
+        '''get the (offset, length) of the chunks which cover the parts of
+        a file of a given size which have not been received'''
+        chunks = []
+        start = 0
+        for end, next_start in [(x[0], x[1]) for x in received] + [(size, size)]:
+            while start < end:
+                length = min(chunk_size, end - start)
+                chunks.append( (start, length) )
+                start += length
+            start = max(start, next_start)
+        return chunks
+
+
+    def upload_file_resumable(self, path, base_dir=None, upload_id=None, chunk_size=None, threads=4, algorithm=None):
+        '''API Function: upload_file_resumable(path, base_dir=None, upload_id=None, chunk_size=None, threads=4, algorithm=None)
+        Upload a file in chunks sent in parallel over http.  Each chunk is
+        verified with its checksum as it arrives and the whole file is
+        verified at the end.  If the upload is interrupted, calling again
+        with the same upload_id only sends the chunks which are missing.
+
+        @param:
+        path - the name of the file that will be uploaded
+
+        @keyparam:
+        base_dir - the file is uploaded to the sub directory of path
+            relative to base_dir
+        upload_id - the id of an interrupted upload to resume
+        chunk_size - size of the chunks.  Defaults to the one of the server
+        threads - number of chunks sent at the same time
+        algorithm - checksum algorithm.  Defaults to the one of the server
+
+        @return
+        string - the name of the uploaded file
+        '''
+        import threading
+        from six.moves import queue
+        from .common import UploadMultipart
+
+        size = os.path.getsize(path)
+
+        if upload_id:
+            status = self.get_upload_status(upload_id)
+            if status.get('size') != size:
+                raise TacticApiException("Upload [%s] is for [%s] bytes, but [%s] has [%s] bytes" % (upload_id, status.get('size'), path, size))
+            received = status.get('received')
+        else:
+            subdir = None
+            if base_dir:
+                subdir = self._get_upload_subdir(path, base_dir)
+            status = self.start_upload(path, size, subdir=subdir, algorithm=algorithm)
+            upload_id = status.get('upload_id')
+            received = []
+
+        algorithm = status.get('algorithm')
+        if not chunk_size:
+            chunk_size = status.get('chunk_size')
+
+        chunks = queue.Queue()
+        for chunk in self._get_missing_chunks(size, received, chunk_size):
+            chunks.put(chunk)
+
+        upload_server_url = self._get_upload_server_url()
+        errors = []
+
+        def send_chunks():
+            upload = UploadMultipart()
+            upload.set_ticket(self.transaction_ticket)
+            upload.set_upload_server(upload_server_url)
+
+            f = open(path, 'rb')
             try:
-                upload.execute(path)
+                while not errors:
+                    try:
+                        offset, length = chunks.get_nowait()
+                    except queue.Empty:
+                        break
+                    f.seek(offset)
+                    buffer = f.read(length)
+                    m = self._get_upload_hash(algorithm)
+                    m.update(buffer)
+                    upload.upload_chunk(upload_id, offset, buffer, m.hexdigest())
             except Exception as e:
-                print("offset: ", upload.offset)
-                raise
-
+                errors.append(e)
+            finally:
+                f.close()
+
+        workers = []
+        for i in range(max(1, min(threads, chunks.qsize()))):
+            worker = threading.Thread(target=send_chunks)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+
+        status = self.get_upload_status(upload_id)
+        if errors or not status.get('complete'):
+            raise TacticApiException("Upload of [%s] is incomplete: %s. Resume with upload_id [%s]" % (path, errors and errors[0] or "missing data", upload_id))
+
+        m = self._get_upload_hash(algorithm)
+        f = open(path, 'rb')
+        try:
+            while True:
+                buffer = f.read(1024*1024)
+                if not buffer:
+                    break
+                m.update(buffer)
+        finally:
+            f.close()
 
-            break
+        return self.finish_upload(upload_id, m.hexdigest())
 
 
 
@@ -2762,8 +3098,8 @@ class TacticServerStub(object):
 
 
 
-    def query_snapshots(self, filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False):
-        '''API Function:  query_snapshots(filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths=False)
+    def query_snapshots(self, filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False, cursor=None):
+        '''API Function:  query_snapshots(filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths=False, cursor=None)
 
         thin wrapper around query, but is specific to querying snapshots
         with some useful included flags that are specific to snapshots
@@ -2791,15 +3127,50 @@ class TacticServerStub(object):
         include_parent - includes all of the parent attributes in a __parent__ dictionary
         include_files - includes all of the file objects referenced in the
                     snapshots
+        cursor - page through the snapshots as with query()
 
         @return:
         list of snapshots
+        If a cursor is given, a dictionary with the "results" of the page
+        and the "cursor" of the next page
         '''
-        return self.server.query_snapshots(self.ticket, filters, columns, order_bys,
-                                         show_retired, limit, offset, single,
-                                         include_paths, include_full_xml,
-                                         include_paths_dict, include_parent,
-                                         include_files, include_web_paths_dict)
+        args = [self.ticket, filters, columns, order_bys, show_retired, limit,
+                offset, single, include_paths, include_full_xml,
+                include_paths_dict, include_parent, include_files,
+                include_web_paths_dict]
+        if cursor != None:
+            args.append(cursor)
+
+        results = self.server.query_snapshots(*args)
+        if cursor != None:
+            results['results'] = self._decode_results(results.get('results'), evaluate=False)
+            return results
+
+        return self._decode_results(results, evaluate=False)
+
+
+    def iter_query_snapshots(self, filters=None, columns=None, order_bys=[], show_retired=False, page_size=1000, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False):
+        '''API Function: iter_query_snapshots(filters=None, columns=None, order_bys=[], show_retired=False, page_size=1000, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False)
+        Iterate through snapshots one page at a time.  See iter_query() and
+        query_snapshots()
+
+        @return:
+        generator of snapshots
+        '''
+        cursor = ""
+        while cursor != None:
+            page = self.query_snapshots(filters, columns, order_bys,
+                                        show_retired, limit=page_size,
+                                        include_paths=include_paths,
+                                        include_full_xml=include_full_xml,
+                                        include_paths_dict=include_paths_dict,
+                                        include_parent=include_parent,
+                                        include_files=include_files,
+                                        include_web_paths_dict=include_web_paths_dict,
+                                        cursor=cursor)
+            for result in page.get('results'):
+                yield result
+            cursor = page.get('cursor')
 
 
 
@@ -4222,6 +4593,160 @@ class TACTIC(TacticServerStub):
     pass
 
 
+
+
+class TacticBatchCallRecorded(Exception):
+    pass
+
+
+class TacticBatchRecorder(object):
+    '''Stands in for the server while a function of the stub is queued in
+    a batch.  The call to the server is recorded instead of being sent'''
+    def __init__(self):
+        self.call = None
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.call = (name, args)
+            raise TacticBatchCallRecorded()
+        return record
+
+
+class TacticBatchReplay(object):
+    '''Stands in for the server when the results of a batch are returned
+    to the functions of the stub, so that they process the result as if it
+    had come from the server'''
+    def __init__(self, name, result):
+        self.name = name
+        self.result = result
+        self.called = False
+
+    def __getattr__(self, name):
+        def replay(*args):
+            if self.called or name != self.name:
+                raise TacticApiException("Function [%s] cannot be called in a batch" % self.name)
+            self.called = True
+            return self.result
+        return replay
+
+
+class TacticBatchResult(object):
+    '''Result of a call queued in a batch'''
+    def __init__(self, name):
+        self.name = name
+        self.executed = False
+        self.result = None
+        self.error = None
+
+    def set_result(self, result):
+        self.executed = True
+        self.result = result
+
+    def set_error(self, error):
+        self.executed = True
+        self.error = error
+
+    def get(self):
+        if not self.executed:
+            raise TacticApiException("Batch containing [%s] has not been executed" % self.name)
+        if self.error:
+            raise TacticApiException(self.error)
+        return self.result
+
+
+
+class TacticServerBatch(object):
+    '''Queues calls to the functions of a TacticServerStub and sends them
+    to the server in a single request'''
+
+    def __init__(self, stub, use_transaction=False):
+        self.stub = stub
+        self.use_transaction = use_transaction
+        self.calls = []
+
+
+    def __getattr__(self, name):
+        func = getattr(self.stub, name)
+        if not callable(func):
+            return func
+
+        def queue(*args, **kwargs):
+            result = TacticBatchResult(name)
+            self.calls.append( (name, args, kwargs, result) )
+            return result
+        return queue
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        return False
+
+
+    def execute(self):
+        '''send the queued calls to the server.  Returns the list of
+        TacticBatchResult in the order the calls were queued'''
+        calls = self.calls
+        self.calls = []
+        if not calls:
+            return []
+
+        # find the server call made by each function of the stub
+        server_calls = []
+        for name, args, kwargs, result in calls:
+            method_name, method_args = self._record(name, args, kwargs)
+            server_calls.append( {
+                'method': method_name,
+                'args': list(method_args),
+            } )
+
+        server = self.stub.server
+        replies = server.batch(self.stub.ticket, server_calls, {'use_transaction': self.use_transaction})
+
+        # process the results with the functions of the stub
+        for i, (name, args, kwargs, result) in enumerate(calls):
+            reply = replies[i]
+            if reply.get("status") != "OK":
+                result.set_error(reply.get("error"))
+                continue
+
+            replay = TacticBatchReplay(server_calls[i].get("method"), reply.get("result"))
+            self.stub.server = replay
+            try:
+                result.set_result( getattr(self.stub, name)(*args, **kwargs) )
+            except Exception as e:
+                result.set_error(str(e))
+            finally:
+                self.stub.server = server
+
+        return [x[3] for x in calls]
+
+
+    def _record(self, name, args, kwargs):
+        recorder = TacticBatchRecorder()
+        server = self.stub.server
+        self.stub.server = recorder
+        try:
+            getattr(self.stub, name)(*args, **kwargs)
+        except Exception as e:
+            # the function may catch the exception used to stop it
+            if not recorder.call:
+                raise
+        finally:
+            self.stub.server = server
+
+        if not recorder.call:
+            raise TacticApiException("Function [%s] does not call the server and cannot be batched" % name)
+
+        method_name, method_args = recorder.call
+        if not method_args or method_args[0] != self.stub.ticket:
+            raise TacticApiException("Function [%s] cannot be called in a batch" % name)
+        return method_name, method_args[1:]
+
+
 #
 # Objects
 #
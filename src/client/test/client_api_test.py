@@ -116,6 +116,9 @@ class ClientApiTest(unittest.TestCase):
             self._test_get_unique_sobject()
             self._test_simple()
             self._test_query()
+            self._test_result_encoding()
+            self._test_query_cursor()
+            self._test_batch()
             self._test_update()
             self._test_insert_multiple()
             self._test_update_multiple()
@@ -481,6 +484,131 @@ class ClientApiTest(unittest.TestCase):
 
        
 
+    def _test_result_encoding(self):
+        search_type = "unittest/person"
+        filters = [("code", ("joe", "mary"))]
+        order_bys = ['code']
+
+        current_encoding = self.server.get_result_encoding()
+        try:
+            self.server.set_result_encoding(None)
+            expected = self.server.query(search_type, filters, order_bys=order_bys)
+            expected_eval = self.server.eval("@GET(unittest/person['code','joe'].name_first)", single=True)
+
+            for encoding in ['columnar', 'columnar_gzip']:
+                self.server.set_result_encoding(encoding)
+                results = self.server.query(search_type, filters, order_bys=order_bys)
+                self.assertEquals(expected, results)
+
+                result = self.server.query(search_type, filters, order_bys=order_bys, single=True)
+                self.assertEquals(expected[0], result)
+
+                results = self.server.eval("@GET(unittest/person['code','joe'].name_first)", single=True)
+                self.assertEquals(expected_eval, results)
+
+                results = self.server.query(search_type, [("code", "none")])
+                self.assertEquals([], results)
+        finally:
+            self.server.set_result_encoding(current_encoding)
+
+        # rows with time, interval and bytea columns and sets come back
+        # as the same objects as with the default encoding
+        import datetime
+        from tactic_client_lib.common import ResultEncoding
+        rows = [{
+            'code': 'joe',
+            'start_time': datetime.time(9, 30, 15, 500),
+            'duration': datetime.timedelta(days=1, seconds=30),
+            'data': b'\x00\x01\xff',
+            'tags': set(['a', 'b']),
+        }] * 100
+        for encoding in ['columnar', 'columnar_gzip']:
+            results = ResultEncoding.decode(ResultEncoding.encode(rows, encoding))
+            self.assertEquals(rows, results)
+
+        # other values cannot be encoded and are sent the default way
+        try:
+            ResultEncoding.encode([{'code': 'joe', 'value': object()}])
+        except TypeError:
+            pass
+        else:
+            self.fail("Unknown value was encoded")
+
+
+
+    def _test_query_cursor(self):
+        search_type = "unittest/person"
+        columns = ['code', 'name_first']
+
+        expected = self.server.query(search_type, columns=columns, order_bys=['name_first', 'id'])
+        expected = [x.get('code') for x in expected]
+
+        # page through one sobject at a time
+        codes = []
+        cursor = ""
+        while cursor != None:
+            page = self.server.query(search_type, columns=columns, order_bys=['name_first'], limit=1, cursor=cursor)
+            self.assertEquals(True, len(page.get('results')) <= 1)
+            codes.extend( [x.get('code') for x in page.get('results')] )
+            cursor = page.get('cursor')
+        self.assertEquals(expected, codes)
+
+        results = self.server.iter_query(search_type, columns=columns, order_bys=['name_first'], page_size=2)
+        self.assertEquals(expected, [x.get('code') for x in results])
+
+        # descending order
+        results = self.server.iter_query(search_type, columns=columns, order_bys=['name_first desc', 'id desc'], page_size=2)
+        self.assertEquals(list(reversed(expected)), [x.get('code') for x in results])
+
+        # a cursor cannot be used for another query
+        page = self.server.query(search_type, columns=columns, limit=1, cursor="")
+        try:
+            self.server.query(search_type, columns=columns, order_bys=['code'], limit=1, cursor=page.get('cursor'))
+        except Exception as e:
+            self.assertEquals(True, str(e).find("Cursor does not match") != -1)
+        else:
+            self.fail("Cursor of another query was accepted")
+
+
+
+    def _test_batch(self):
+        search_type = "unittest/person"
+        filters = [("code", "joe")]
+
+        expected = self.server.query(search_type, filters)
+        search_key = expected[0].get("__search_key__")
+
+        with self.server.batch() as batch:
+            result = batch.query(search_type, filters)
+            sobject = batch.get_by_search_key(search_key)
+            value = batch.eval("@GET(unittest/person['code','joe'].name_first)", single=True)
+            error = batch.get_by_search_key("unittest/person?project=unittest&code=does_not_exist")
+
+        self.assertEquals(expected, result.get())
+        self.assertEquals('joe', sobject.get().get("code"))
+        self.assertEquals('Joe', value.get())
+        try:
+            error.get()
+        except Exception:
+            pass
+        else:
+            self.fail("Error in batch was not raised")
+
+        # in a transaction, the batch fails as a whole
+        try:
+            with self.server.batch(use_transaction=True) as batch:
+                batch.update(search_key, {'name_last': 'Batch'})
+                batch.get_by_search_key("unittest/person?project=unittest&code=does_not_exist")
+        except Exception:
+            pass
+        else:
+            self.fail("Error in batch was not raised")
+
+        sobject = self.server.get_by_search_key(search_key)
+        self.assertEquals('Smoe', sobject.get("name_last"))
+
+
+
     def _test_local_protocol(self):
         from pyasm.security import Batch
         from tactic_client_lib import TacticServerStub
@@ -2023,6 +2151,8 @@ class ClientApiTest(unittest.TestCase):
         if os.path.exists(file_path):
             self._test_base64_upload(file_name)
 
+        self._test_resumable_upload()
+
     def _test_multipart_upload(self, file_name):
         from pyasm.common import Environment
 
@@ -2082,6 +2212,66 @@ class ClientApiTest(unittest.TestCase):
         os.rename(file_path, unencoded_file)
         os.rename(temporary_name, file_path) 
 
+    def _test_resumable_upload(self):
+        import hashlib
+        from pyasm.common import Environment
+        from tactic_client_lib.common import UploadMultipart
+
+        file_path = "%s/test/miso_ramen.jpg" % self.client_lib_dir
+        size = os.path.getsize(file_path)
+        checksum = get_md5.get_md5(file_path)
+        transaction_ticket = self.server.get_transaction_ticket()
+        upload_dir = Environment.get_upload_dir(transaction_ticket)
+        upload_path = "%s/miso_ramen.jpg" % upload_dir
+        if os.path.exists(upload_path):
+            os.unlink(upload_path)
+
+        file_name = self.server.upload_file_resumable(file_path, chunk_size=1024, threads=3, algorithm="md5")
+        self.assertEquals("miso_ramen.jpg", file_name)
+        self.assertEquals(size, os.path.getsize(upload_path))
+        self.assertEquals(checksum, get_md5.get_md5(upload_path))
+        os.unlink(upload_path)
+
+        # send only the last chunk, then resume
+        info = self.server.start_upload(file_path, algorithm="md5")
+        upload_id = info.get('upload_id')
+        self.assertEquals("md5", info.get('algorithm'))
+
+        f = open(file_path, 'rb')
+        f.seek(size - 1024)
+        buffer = f.read()
+        f.close()
+
+        upload = UploadMultipart()
+        upload.set_ticket(transaction_ticket)
+        upload.set_upload_server(self.server._get_upload_server_url())
+        upload.upload_chunk(upload_id, size - 1024, buffer, hashlib.md5(buffer).hexdigest())
+
+        status = self.server.get_upload_status(upload_id)
+        self.assertEquals(size, status.get('size'))
+        self.assertEquals([[size - 1024, size]], status.get('received'))
+        self.assertEquals(False, status.get('complete'))
+
+        # an incomplete upload cannot be finished
+        try:
+            self.server.finish_upload(upload_id)
+        except Exception as e:
+            pass
+        else:
+            self.fail("Incomplete upload was finished")
+
+        self.server.upload_file_resumable(file_path, upload_id=upload_id, chunk_size=1024)
+        self.assertEquals(checksum, get_md5.get_md5(upload_path))
+
+        # the session is removed once it is finished
+        try:
+            self.server.get_upload_status(upload_id)
+        except Exception as e:
+            pass
+        else:
+            self.fail("Finished upload still exists")
+
+
     def _test_check_access(self):
         returned = self.server.check_access('project', {'code':'unittest'}, 'allow')
         self.assertEquals(True, returned)
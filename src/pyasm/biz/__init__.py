@@ -10,6 +10,7 @@
 #
 #
 from .cache import *
+from .cache_bus import *
 from .expression import *
 from .csv_import import *
 from .naming import *
@@ -28,6 +29,7 @@ from .task import *
 from .note import *
 from .clipboard import *
 from .project import *
+from .path_resolver import *
 from .schema import *
 from .notification import *
 from .command_trigger import *
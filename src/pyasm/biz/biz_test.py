@@ -14,7 +14,7 @@ __all__ = ["BizTest"]
 
 import tacticenv
 
-import unittest
+import os, unittest, datetime
 
 from pyasm.common import *
 from pyasm.security import *
@@ -78,6 +78,9 @@ class BizTest(unittest.TestCase):
 
             self._test_add_tasks()
             self._test_time()
+            self._test_cache_bus()
+            self._test_search_type_cache()
+            self._test_ticket_cache()
         finally:
             self.transaction.rollback()
             Project.set_project('unittest')
@@ -85,6 +88,157 @@ class BizTest(unittest.TestCase):
             test_env.delete()
             #sample3d_test_env.delete()
 
+    def _test_cache_bus(self):
+        from .cache import SearchTypeCache
+        from .cache_bus import CacheBus, CacheBusListener
+
+        CacheBus.set_mode("file")
+        listener = CacheBusListener()
+        try:
+            # the listener starts at the end of the bus
+            self.assertEqual([], listener.wait(0))
+
+            cache = SearchTypeCache.get("sthpw/login_group")
+            cache.build_cache_by_column("login_group")
+            num_sobjects = len(cache.get_sobjects())
+
+            login_group = SearchType.create("sthpw/login_group")
+            login_group.set_value("login_group", "cache_bus_test")
+            login_group.commit(triggers=False)
+            id = login_group.get_id()
+
+            # the message is only written when the transaction commits
+            transaction = Transaction.get(force=True)
+            try:
+                self.assertEqual(True, CacheBus.publish("sthpw/login_group", ids=[id]))
+                self.assertEqual([], listener.wait(0))
+                transaction.commit()
+            finally:
+                Transaction.remove_from_stack()
+
+            messages = listener.wait(1)
+            self.assertEqual([{'key': 'sthpw/login_group', 'ids': [id]}], messages)
+
+            # only the changed row is loaded
+            CacheBus.dispatch(messages)
+            self.assertEqual(num_sobjects+1, len(cache.get_sobjects()))
+            sobject = cache.get_sobject_by_key("login_group", "cache_bus_test")
+            self.assertEqual(id, sobject.get_id())
+
+            # deleted rows are removed
+            login_group.delete(triggers=False)
+            cache.update_sobjects([id])
+            self.assertEqual(num_sobjects, len(cache.get_sobjects()))
+            self.assertEqual(None, cache.get_sobject_by_key("login_group", "cache_bus_test"))
+
+            # the log is rotated once the listener has read all of it and
+            # messages appended to the rotated log are still received
+            path = CacheBus.get_file_path()
+            inode = CacheBus.stat_file(path)[0]
+            max_file_size = CacheBus.MAX_FILE_SIZE
+            CacheBus.MAX_FILE_SIZE = 1
+            try:
+                self.assertEqual([], listener.wait(0))
+            finally:
+                CacheBus.MAX_FILE_SIZE = max_file_size
+            self.assertEqual(inode, CacheBus.stat_file(CacheBus.get_rotated_path())[0])
+            self.assertEqual(False, os.path.exists(path))
+
+            f = open(CacheBus.get_rotated_path(), 'a')
+            f.write('{"key": "sthpw/login_group"}\n')
+            f.close()
+            CacheBus.write_file(['{"key": "sthpw/project"}'])
+            messages = listener.wait(1)
+            self.assertEqual([{'key': 'sthpw/login_group'}, {'key': 'sthpw/project'}], messages)
+
+        finally:
+            listener.close()
+            CacheBus.set_mode(None)
+
+
+
+    def _test_ticket_cache(self):
+        from .cache import TicketCache
+
+        cache = TicketCache.get()
+        key = Common.generate_random_key()
+
+        # keys which are not valid are cached as well
+        ticket = Ticket.get_by_valid_key(key)
+        self.assertEqual(None, ticket)
+        self.assertEqual((True, None), cache.get_ticket(key))
+
+        ticket = Ticket.create(key, "admin")
+        self.assertEqual((False, None), cache.get_ticket(key))
+
+        hits = cache.get_stats().get("hits")
+        ticket = Ticket.get_by_valid_key(key)
+        self.assertEqual(key, ticket.get_key())
+        ticket = Ticket.get_by_valid_key(key)
+        self.assertEqual(key, ticket.get_key())
+        self.assertEqual(True, cache.get_stats().get("hits") > hits)
+
+        cache.remove_ticket(key, notify=False)
+        self.assertEqual((False, None), cache.get_ticket(key))
+
+        # the expiry is extended once per interval
+        self.assertEqual(True, cache.should_update_expiry(key))
+        self.assertEqual(False, cache.should_update_expiry(key))
+
+        # a cached ticket which has expired is not valid
+        key = Common.generate_random_key()
+        expiry = datetime.datetime.now() - datetime.timedelta(hours=1)
+        ticket = Ticket.create(key, "admin")
+        ticket.set_value("expiry", expiry)
+        self.assertEqual(True, ticket.is_expired())
+        cache.add_ticket(key, ticket)
+        self.assertEqual(None, Ticket.get_by_valid_key(key))
+
+
+
+    def _test_search_type_cache(self):
+        from .cache import SearchTypeCache
+
+        cache = SearchTypeCache.get("sthpw/login_group")
+        cache.build_cache_by_column("description")
+
+        login_groups = []
+        for name in ['cache_test1', 'cache_test2']:
+            login_group = SearchType.create("sthpw/login_group")
+            login_group.set_value("login_group", name)
+            login_group.set_value("description", "cache_test")
+            login_group.commit(triggers=False)
+            cache.add_sobject_to_cache(login_group)
+            login_groups.append(login_group)
+
+        # both rows are kept in the index
+        sobjects = cache.get_sobjects_by_key("description", "cache_test")
+        self.assertEqual(2, len(sobjects))
+        sobject = cache.get_sobject_by_key("description", "cache_test")
+        self.assertEqual("cache_test2", sobject.get_value("login_group"))
+
+        # an update moves the row to its new value
+        login_group = login_groups[1]
+        login_group.set_value("description", "cache_test_changed")
+        login_group.commit(triggers=False)
+        cache.update_sobjects([login_group.get_id()])
+        sobject = cache.get_sobject_by_key("description", "cache_test")
+        self.assertEqual("cache_test1", sobject.get_value("login_group"))
+        sobject = cache.get_sobject_by_key("description", "cache_test_changed")
+        self.assertEqual("cache_test2", sobject.get_value("login_group"))
+
+        # a delete removes the row from all of the indexes
+        ids = [x.get_id() for x in login_groups]
+        code = login_groups[0].get_code()
+        for login_group in login_groups:
+            login_group.delete(triggers=False)
+        cache.update_sobjects(ids)
+        self.assertEqual([], cache.get_sobjects_by_key("description", "cache_test"))
+        self.assertEqual(None, cache.get_sobject_by_key("code", code))
+        self.assertEqual(None, cache.get_sobject_by_key("login_group", "cache_test2"))
+
+
+
     def _test_add_tasks(self):
 
         """
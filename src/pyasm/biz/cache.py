@@ -10,16 +10,18 @@
 #
 #
 
-__all__ = ["BaseCache", "SearchTypeCache", "CacheContainer", "CustomCache"]
+__all__ = ["BaseCache", "SearchTypeCache", "CacheContainer", "CustomCache", "TableInfoCache", "TicketCache", "STHPW_TABLES"]
 
 import tacticenv
 
-import sys, time, datetime, types
+import sys, time, datetime, types, hashlib, threading
 from dateutil import parser
 
-from pyasm.common import Container
+import six
 
-from pyasm.search import SObject, Search, SearchType, SearchKey
+from pyasm.common import Container, Config, LRUCache
+
+from pyasm.search import Search, SearchType, SearchKey
 
 CACHE = {}
 
@@ -63,10 +65,24 @@ class BaseCache(object):
 
 
 
-    def make_dirty(self):
-        '''function to make the cache dirty.  All proceses will compare this
-        change time with their internal time and update the cache if necessary
+    def invalidate(self, ids=None):
+        '''called when another process has changed the data of this cache.
+        The ids of the changed rows are given if they are known.  By
+        default, the entire cache is reloaded'''
+        self.init_cache()
+
+
+
+    def make_dirty(self, ids=None):
+        '''function to make the cache dirty.  If there is a cache bus, the
+        invalidation is published to all of the processes.  Otherwise, all
+        proceses will compare this change time with their internal time and
+        update the cache if necessary
         '''
+        from .cache_bus import CacheBus
+        if CacheBus.publish(self.key, ids=ids):
+            return
+
         dirty = Search.eval("@SOBJECT(sthpw/cache['key','%s'])" % self.key, single=True)
         if not dirty:
             dirty = SearchType.create("sthpw/cache")
@@ -111,43 +127,164 @@ class SearchTypeCache(BaseCache):
     There should only be one of these for each search type.  It is used
     for data that does not change much and is much faster to have
     cached in memory
+
+    Each cache is backed by an index which maps a value to all of the
+    sobjects with that value.  The indexes are updated row by row when
+    sobjects are inserted, updated, retired or deleted, so the table is
+    only searched again in full as a fallback.
     '''
+
+    # above this many changed rows, the whole table is reloaded
+    MAX_UPDATE_SIZE = 1000
+
     def __init__(self, search_type):
         self.search_type = search_type
         self.sobjects = []
+        self.indexes = {}
+        # the value each sobject is indexed under for each index, so that
+        # it can be removed even if it was changed in place after caching
+        self.index_values = {}
+        # writers are serialized and build new dicts which are swapped in,
+        # so readers do not need to lock
+        self.lock = threading.RLock()
 
         super(SearchTypeCache,self).__init__(search_type)
 
 
     def init_cache(self):
         '''initialize the cache'''
-        self.mtime = datetime.datetime.now()
+        self.lock.acquire()
+        try:
+            self.mtime = datetime.datetime.now()
 
-        keys = self.caches.keys()
-        self.caches = {}
+            keys = list(self.caches.keys())
 
-        search = Search(self.search_type, sudo=True)
-        search.set_show_retired(True)
-        self.sobjects = search.get_sobjects()
+            # the classes of search types may have changed
+            if self.search_type == "sthpw/search_object":
+                SearchType.clear_sobject_class_cache()
 
+            search = Search(self.search_type, sudo=True)
+            search.set_show_retired(True)
+            sobjects = search.get_sobjects()
 
-        # build a search_key cache
-        search_key_cache = {}
-        search_keys = SearchKey.get_by_sobjects(self.sobjects)
-        for search_key, sobject in zip(search_keys, self.sobjects):
-            search_key_cache[search_key] = sobject
-        self.caches['search_key'] = search_key_cache
+            self._set_sobjects(sobjects, keys)
+        finally:
+            self.lock.release()
 
-        code_cache = {}
-        for sobject in self.sobjects:
-            code = sobject.get_code()
-            code_cache[code] = sobject
-        self.caches['code'] = code_cache 
 
+    def _set_sobjects(self, sobjects, keys):
+        '''build all of the indexes for a list of sobjects.  The new
+        caches are swapped in at the end so that readers never see a
+        partially built cache'''
+        names = ['search_key', 'code']
         for key in keys:
-            if key in ['search_key', 'code']:
-                continue
-            self.build_cache_by_column(key)
+            if key not in names:
+                names.append(key)
+
+        # this is much faster than getting the search keys one at a time
+        search_keys = SearchKey.get_by_sobjects(sobjects)
+
+        indexes = {}
+        caches = {}
+        index_values = {}
+        for name in names:
+            if name == 'search_key':
+                values = search_keys
+            else:
+                values = [self._get_index_value(x, name) for x in sobjects]
+
+            index = self._build_index(sobjects, values)
+            indexes[name] = index
+            caches[name] = self._get_cache_from_index(index)
+            index_values[name] = dict(zip([id(x) for x in sobjects], values))
+
+        self.sobjects = sobjects
+        self.index_values = index_values
+        self.indexes = indexes
+        self.caches = caches
+
+
+    def _build_index(self, sobjects, values):
+        index = {}
+        for value, sobject in zip(values, sobjects):
+            items = index.get(value)
+            if items == None:
+                index[value] = [sobject]
+            else:
+                items.append(sobject)
+        return index
+
+
+    def _get_index_value(self, sobject, name):
+        if name == 'search_key':
+            return SearchKey.get_by_sobject(sobject)
+        elif name == 'code':
+            return sobject.get_code()
+
+        # same key as SObject.get_dict()
+        value = sobject.get_value(name, no_exception=True)
+        if not isinstance(value, six.string_types):
+            value = str(value)
+        return value
+
+
+    def _get_cache_from_index(self, index):
+        # the last sobject with a value is found, as with SObject.get_dict()
+        cache = {}
+        for value, items in index.items():
+            cache[value] = items[-1]
+        return cache
+
+
+    def _update_indexes(self, sobjects, removed, added):
+        '''build new indexes with the removed sobjects taken out and the
+        added sobjects put in.  The lists of the index are never changed
+        in place, since readers may be holding them, and the new dicts are
+        swapped in at the end'''
+        indexes = {}
+        caches = self.caches.copy()
+        index_values = {}
+        for name, index in self.indexes.items():
+            index = index.copy()
+            values = self.index_values.get(name, {}).copy()
+            changed_values = set()
+
+            for sobject in removed:
+                value = values.pop(id(sobject), None)
+                items = index.get(value)
+                if not items:
+                    continue
+                items = [x for x in items if x is not sobject]
+                if items:
+                    index[value] = items
+                else:
+                    del(index[value])
+                changed_values.add(value)
+
+            for sobject in added:
+                value = self._get_index_value(sobject, name)
+                index[value] = (index.get(value) or []) + [sobject]
+                values[id(sobject)] = value
+                changed_values.add(value)
+
+            cache = caches.get(name)
+            if cache != None:
+                cache = cache.copy()
+                for value in changed_values:
+                    items = index.get(value)
+                    if items:
+                        cache[value] = items[-1]
+                    elif value in cache:
+                        del(cache[value])
+                caches[name] = cache
+
+            indexes[name] = index
+            index_values[name] = values
+
+        self.sobjects = sobjects
+        self.index_values = index_values
+        self.indexes = indexes
+        self.caches = caches
 
 
     def get_refresh_events(self):
@@ -159,21 +296,43 @@ class SearchTypeCache(BaseCache):
 
 
     def build_cache_by_column(self, column):
-        # do not build if it already exists
-        if column in self.caches:
-            return
-
-        # build a search_key cache
-        column_cache = SObject.get_dict(self.sobjects, key_cols=[column])
-        self.caches[column] = column_cache
-        return column_cache
+        self.lock.acquire()
+        try:
+            # do not build if it already exists
+            if column in self.caches:
+                return
+
+            sobjects = self.sobjects
+            values = [self._get_index_value(x, column) for x in sobjects]
+            index = self._build_index(sobjects, values)
+            column_cache = self._get_cache_from_index(index)
+
+            index_values = self.index_values.copy()
+            index_values[column] = dict(zip([id(x) for x in sobjects], values))
+            indexes = self.indexes.copy()
+            indexes[column] = index
+            caches = self.caches.copy()
+            caches[column] = column_cache
+
+            self.index_values = index_values
+            self.indexes = indexes
+            self.caches = caches
+            return column_cache
+        finally:
+            self.lock.release()
 
     def get_sobjects(self):
         return self.sobjects
 
 
     def add_cache(self, key, cache):
-        self.caches[key] = cache
+        self.lock.acquire()
+        try:
+            caches = self.caches.copy()
+            caches[key] = cache
+            self.caches = caches
+        finally:
+            self.lock.release()
         
     def get_cache_by_key(self, key):
         cache = self.caches.get(key)
@@ -187,6 +346,85 @@ class SearchTypeCache(BaseCache):
         return sobject
 
 
+    def get_sobjects_by_key(self, cache_name, key):
+        '''get all of the sobjects with the given value in an index'''
+        index = self.indexes.get(cache_name)
+        if not index:
+            return []
+        return list(index.get(key) or [])
+
+
+
+    def invalidate(self, ids=None):
+        if ids:
+            self.update_sobjects(ids)
+        else:
+            self.init_cache()
+
+
+    def update_sobjects(self, ids):
+        '''reload only the rows with the given ids.  Rows which no longer
+        exist are removed from the cache and new rows are added'''
+        if len(ids) > self.MAX_UPDATE_SIZE:
+            self.init_cache()
+            return
+
+        search = Search(self.search_type, sudo=True)
+        search.set_show_retired(True)
+        id_col = search.get_id_col()
+        search.add_filters(id_col, ids)
+        changed = search.get_sobjects()
+
+        self._replace_sobjects(ids, changed, id_col)
+
+
+    def _replace_sobjects(self, ids, changed, id_col):
+        '''replace the cached rows with the given ids with the changed
+        sobjects.  Cached rows which are not in changed are removed'''
+        self.lock.acquire()
+        try:
+            self.mtime = datetime.datetime.now()
+
+            if self.search_type == "sthpw/search_object":
+                SearchType.clear_sobject_class_cache()
+
+            ids = set([str(x) for x in ids])
+            changed_by_id = {}
+            for sobject in changed:
+                changed_by_id[str(sobject.get_value(id_col))] = sobject
+
+            try:
+                sobjects = []
+                removed = []
+                added = []
+                for sobject in self.sobjects:
+                    id = str(sobject.get_value(id_col))
+                    if id not in ids:
+                        sobjects.append(sobject)
+                        continue
+
+                    # replace updated rows in place and drop deleted ones
+                    removed.append(sobject)
+                    new_sobject = changed_by_id.pop(id, None)
+                    if new_sobject:
+                        sobjects.append(new_sobject)
+                        added.append(new_sobject)
+
+                # the remaining rows were inserted
+                for sobject in changed:
+                    if str(sobject.get_value(id_col)) in changed_by_id:
+                        sobjects.append(sobject)
+                        added.append(sobject)
+
+                self._update_indexes(sobjects, removed, added)
+
+            except Exception as e:
+                print("WARNING: could not update cache [%s]: %s" % (self.key, e))
+                self.init_cache()
+        finally:
+            self.lock.release()
+
+
     def add_sobject_to_cache(self, sobject):
         '''add an sobject to the cache.  This is useful if a new sobject
         has been inserted and it is too expensive to have to recache the entire
@@ -197,25 +435,11 @@ class SearchTypeCache(BaseCache):
         search_type = sobject.get_base_search_type()
         assert search_type == self.search_type
 
-
-        # FIXME: add to all of the caches
-        for key, cache in self.caches.items():
-            if key == 'search_key':
-                # add to the search_key cache
-                search_key = SearchKey.get_by_sobject(sobject)
-                cache[search_key] = sobject
-
-            elif key == 'code':
-                # add to the code cache
-                code = sobject.get_code()
-                cache[code] = sobject
-
-            else:
-                value = sobject.get_value(key)
-                cache[value] = sobject
+        id = sobject.get_id()
+        self._replace_sobjects([id], [sobject], sobject.get_id_col())
 
         # make sure this cache is set to dirty so other processes update
-        self.make_dirty()
+        self.make_dirty(ids=[id])
 
 
 
@@ -232,6 +456,326 @@ class SearchTypeCache(BaseCache):
 
 
 
+STHPW_TABLES = ['project', 'search_object', 'login', 'login_group', 'login_in_group','snapshot','file','trigger','notification','ticket', 'task', 'status_log', 'pref_setting', 'cache', 'transaction_log', 'change_timestamp']
+
+
+class TableInfoCache(BaseCache):
+    '''Process wide cache of the table metadata of a single database
+    resource: the column info, ordered column list and existence of each
+    table.  There is one of these for each database resource, which is
+    shared by all threads.  Schema changing statements (CreateTable,
+    AlterTable, DropTable, CreateView) clear the tables they alter.
+    '''
+    def __init__(self, **kwargs):
+        self.database = kwargs.get("database")
+        self.tables = kwargs.get("tables") or []
+
+        self.db_resource = kwargs.get("db_resource")
+        if not self.db_resource:
+            from pyasm.search import DbResource
+            self.db_resource = DbResource.get_default(self.database)
+
+        if not kwargs.get("key") and self.db_resource:
+            self.key = str(self.db_resource)
+        else:
+            self.key = kwargs.get("key")
+
+        self.hits = 0
+        self.misses = 0
+
+        # precache some of the sthpw tables
+        if not self.tables and  self.db_resource.get_database() == "sthpw":
+            self.tables = STHPW_TABLES
+
+        super(TableInfoCache, self).__init__(self.key)
+
+        # warm up after registering so that the database implementations
+        # fill in this cache
+        self.warm(self.tables)
+
+
+
+    def init_cache(self):
+        '''clear the cache and rewarm all of the tables already cached'''
+        self.mtime = datetime.datetime.now()
+
+        tables = set(self.tables)
+        data = self.caches.get('data')
+        if data:
+            tables.update(data.keys())
+
+        self.caches = {
+            'data': {},
+            'columns': {},
+            'tables': {},
+        }
+
+        # on construction, this is done after registering
+        if CacheContainer.get(self.key) == self:
+            self.warm(tables)
+
+
+    def warm(self, tables):
+        '''load the column info and columns of the given tables'''
+        sql = self.db_resource.get_sql()
+        for table in tables:
+            try:
+                sql.get_column_info(table)
+                sql.get_columns(table)
+            except Exception as e:
+                print("WARNING: could not cache table [%s] in [%s]: %s" % (table, self.db_resource, e))
+
+
+    def _get(self, cache_name, table):
+        cache = self.caches.get(cache_name)
+        value = None
+        if cache:
+            value = cache.get(table)
+        if value == None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+
+    def get_column_info(self, table):
+        return self._get('data', table)
+
+    def add_table(self, table, column_data):
+        data = self.caches.get('data')
+        if data == None:
+            data = self.caches['data'] = {}
+        data[table] = column_data
+
+    def get_columns(self, table):
+        '''get the ordered list of columns of a table'''
+        columns = self._get('columns', table)
+        if columns != None:
+            columns = list(columns)
+        return columns
+
+    def add_columns(self, table, columns):
+        cache = self.caches.get('columns')
+        if cache == None:
+            cache = self.caches['columns'] = {}
+        cache[table] = list(columns)
+
+    def table_exists(self, table):
+        '''returns True or False if the existence of a table is known,
+        otherwise None'''
+        return self._get('tables', table)
+
+    def set_table_exists(self, table, exists):
+        cache = self.caches.get('tables')
+        if cache == None:
+            cache = self.caches['tables'] = {}
+        cache[table] = exists
+
+
+    def clear_table(self, table=None):
+        '''clear the cached information of a table or all tables'''
+        for cache_name in ['data', 'columns', 'tables']:
+            cache = self.caches.get(cache_name)
+            if not cache:
+                continue
+            if table:
+                if table in cache:
+                    del(cache[table])
+            else:
+                cache.clear()
+
+
+    def invalidate(self, ids=None):
+        '''the ids of a table cache are the names of the altered tables'''
+        if ids:
+            for table in ids:
+                self.clear_table(table)
+        else:
+            self.init_cache()
+
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'tables': len(self.caches.get('data') or {}),
+        }
+
+
+
+    def get_by_db_resource(cls, db_resource, create=True):
+        '''get the cache for a database resource'''
+        key = str(db_resource)
+        cache = CacheContainer.get(key)
+        if cache == None and create:
+            cache = cls(db_resource=db_resource)
+        return cache
+    get_by_db_resource = classmethod(get_by_db_resource)
+
+
+    def clear_by_db_resource(cls, db_resource=None, table=None, notify=False):
+        '''clear a table, or all tables, in the cache of a database
+        resource.  If no database resource is given, all of the table
+        caches are cleared.  If notify is set, the cache is made dirty so
+        that other processes refresh it'''
+        if db_resource:
+            caches = [CacheContainer.get(str(db_resource))]
+        else:
+            caches = list(CacheContainer.get_all_caches().values())
+
+        for cache in caches:
+            if not isinstance(cache, TableInfoCache):
+                continue
+            cache.clear_table(table)
+
+            if notify:
+                try:
+                    if table:
+                        cache.make_dirty(ids=[table])
+                    else:
+                        cache.make_dirty()
+                except Exception as e:
+                    print("WARNING: could not mark cache [%s] dirty: %s" % (cache.key, e))
+    clear_by_db_resource = classmethod(clear_by_db_resource)
+
+
+    def get_all_stats(cls):
+        '''get the hit/miss statistics of all table caches'''
+        stats = {}
+        for key, cache in list(CacheContainer.get_all_caches().items()):
+            if isinstance(cache, TableInfoCache):
+                stats[key] = cache.get_stats()
+        return stats
+    get_all_stats = classmethod(get_all_stats)
+
+
+
+
+
+class TicketCache(BaseCache):
+    '''Short lived cache of the tickets validated by this process, so that
+    the ticket table is not searched on every request.  Tickets which are
+    not found are cached for a shorter time.  Signing out removes the
+    ticket from the caches of all processes through the cache bus.
+
+    The cache also limits how often the expiry of a ticket is extended to
+    once per interval.
+
+    The times are set in the "security" config:
+        ticket_cache_ttl - seconds a valid ticket is kept.  Default 30.
+            0 disables the cache
+        ticket_expiry_interval - minimum seconds between updates of the
+            expiry of a ticket.  Default 60
+    '''
+
+    KEY = "sthpw_ticket_cache"
+
+    # seconds a ticket which is not found is kept
+    NEGATIVE_TTL = 5
+    SIZE = 10000
+
+    def __init__(self, key=None):
+        self.tickets = LRUCache(size=self.SIZE)
+        self.expiry_updates = LRUCache(size=self.SIZE)
+
+        ttl = Config.get_value("security", "ticket_cache_ttl")
+        if ttl in [None, '']:
+            ttl = 30
+        self.ttl = float(ttl)
+
+        interval = Config.get_value("security", "ticket_expiry_interval")
+        if interval in [None, '']:
+            interval = 60
+        self.expiry_interval = float(interval)
+
+        super(TicketCache,self).__init__(key or self.KEY)
+
+
+    def init_cache(self):
+        self.mtime = datetime.datetime.now()
+        self.tickets.clear()
+
+
+    def get_hash(self, key):
+        '''tickets are identified by a hash so that the keys are not sent
+        over the cache bus'''
+        if not isinstance(key, six.binary_type):
+            key = key.encode("utf-8")
+        return hashlib.sha256(key).hexdigest()
+
+
+    def get_ticket(self, key):
+        '''get a cached ticket.  Returns a tuple of whether the key was
+        found and the ticket, which is None for a key that is not valid'''
+        if self.ttl <= 0:
+            return False, None
+
+        item = self.tickets.get(self.get_hash(key))
+        if not item:
+            return False, None
+
+        cache_time, ticket = item
+        if ticket:
+            ttl = self.ttl
+        else:
+            ttl = min(self.ttl, self.NEGATIVE_TTL)
+        if time.time() - cache_time > ttl:
+            return False, None
+
+        return True, ticket
+
+
+    def add_ticket(self, key, ticket):
+        if self.ttl <= 0:
+            return
+        self.tickets.put(self.get_hash(key), (time.time(), ticket))
+
+
+    def remove_ticket(self, key, notify=True):
+        '''remove a ticket from the cache.  If notify is True, it is
+        removed from the other processes as well'''
+        hash = self.get_hash(key)
+        self.tickets.remove(hash)
+        self.expiry_updates.remove(hash)
+        if notify:
+            self.make_dirty(ids=[hash])
+
+
+    def invalidate(self, ids=None):
+        if not ids:
+            self.init_cache()
+            return
+        for hash in ids:
+            self.tickets.remove(hash)
+            self.expiry_updates.remove(hash)
+
+
+    def should_update_expiry(self, key):
+        '''determine if the expiry of a ticket should be extended now.
+        Returns True at most once per interval for each ticket'''
+        hash = self.get_hash(key)
+        now = time.time()
+        last = self.expiry_updates.get(hash)
+        if last and now - last < self.expiry_interval:
+            return False
+        self.expiry_updates.put(hash, now)
+        return True
+
+
+    def get_stats(self):
+        return self.tickets.get_stats()
+
+
+    def get(cls):
+        cache = CacheContainer.get(cls.KEY)
+        if cache == None:
+            cache = cls()
+        return cache
+    get = classmethod(get)
+
+
+
+
 class CustomCache(BaseCache):
 
     def __init__(self, key=None, action=None):
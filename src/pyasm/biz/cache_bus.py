@@ -0,0 +1,383 @@
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ["CacheBus", "CacheBusListener"]
+
+import tacticenv
+
+import os, time
+
+from pyasm.common import Config, Environment, jsondumps, jsonloads
+from pyasm.search import DbContainer, DbResource, DbListener, Transaction
+
+
+class CacheBus(object):
+    '''Carries cache invalidations between processes.  An invalidation
+    names the key of a cache and optionally the ids of the rows that
+    changed, so that the cache can be patched instead of reloaded.
+
+    The mode is set with the "cache_bus" value of the "services" config:
+        notify - PostgreSQL LISTEN/NOTIFY.  Default for PostgreSQL
+        file - a file in the temp dir shared by the processes of a host
+        poll - no bus, caches are made dirty through the sthpw/cache table
+
+    In file mode, the log is rotated once it is larger than MAX_FILE_SIZE
+    and every listener has read all of it.
+    '''
+
+    CHANNEL = "spt_cache"
+
+    # maximum size of a notification payload
+    MAX_PAYLOAD = 7900
+
+    # size of the file log before it is rotated
+    MAX_FILE_SIZE = 1024*1024
+
+    # listeners which have not recorded their offset for this long are
+    # considered gone
+    LISTENER_TIMEOUT = 300
+
+    MODE = None
+
+    def get_mode(cls):
+        if cls.MODE:
+            return cls.MODE
+
+        mode = Config.get_value("services", "cache_bus")
+        if mode not in ['notify', 'file', 'poll']:
+            db_resource = DbResource.get_default("sthpw")
+            impl = db_resource.get_database_impl()
+            if impl.get_database_type() == "PostgreSQL":
+                mode = "notify"
+            else:
+                mode = "poll"
+
+        cls.MODE = mode
+        return mode
+    get_mode = classmethod(get_mode)
+
+
+    def set_mode(cls, mode):
+        assert mode in ['notify', 'file', 'poll', None]
+        cls.MODE = mode
+    set_mode = classmethod(set_mode)
+
+
+    def get_file_path(cls):
+        path = Config.get_value("services", "cache_bus_path")
+        if not path:
+            path = "%s/cache/cache_bus.log" % Environment.get_tmp_dir()
+        return path
+    get_file_path = classmethod(get_file_path)
+
+
+    def get_rotated_path(cls):
+        return "%s.1" % cls.get_file_path()
+    get_rotated_path = classmethod(get_rotated_path)
+
+
+    def get_offsets_dir(cls):
+        '''get the dir where each listener records how far it has read'''
+        return "%s.offsets" % cls.get_file_path()
+    get_offsets_dir = classmethod(get_offsets_dir)
+
+
+    def stat_file(cls, path):
+        '''get the inode and the size of a file.  The inode is None if the
+        file does not exist'''
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, 0
+        return st.st_ino, st.st_size
+    stat_file = classmethod(stat_file)
+
+
+    def publish(cls, key, ids=None):
+        '''publish an invalidation of a cache.  If ids is given, only those
+        rows are invalidated.  Returns False if there is no bus, in which
+        case the cache has to be made dirty some other way'''
+        mode = cls.get_mode()
+        if mode == "poll":
+            return False
+
+        message = {'key': key}
+        if ids:
+            message['ids'] = list(ids)
+        payload = jsondumps(message)
+
+        if mode == "notify":
+            # too many rows to fit, so invalidate the whole cache
+            if len(payload) > cls.MAX_PAYLOAD:
+                payload = jsondumps({'key': key})
+
+            # this is only sent when the transaction is committed
+            sql = DbContainer.get("sthpw")
+            return sql.notify(cls.CHANNEL, payload)
+
+        # the other processes reload the rows, so they can only be told
+        # once the changes are committed, as with notify
+        transaction = Transaction.get()
+        if transaction and transaction.is_in_transaction():
+            buffer = transaction.get_commit_buffer(cls.CHANNEL, cls.write_file)
+            buffer.append(payload)
+        else:
+            cls.write_file([payload])
+        return True
+    publish = classmethod(publish)
+
+
+    def write_file(cls, payloads):
+        '''append messages to the file log'''
+        if not payloads:
+            return
+        path = cls.get_file_path()
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        f = open(path, 'a')
+        try:
+            f.write("".join(["%s\n" % x for x in payloads]))
+        finally:
+            f.close()
+    write_file = classmethod(write_file)
+
+
+    def dispatch(cls, messages):
+        '''apply received invalidations to the caches of this process'''
+        from .cache import CacheContainer
+
+        # combine the messages so that each cache is refreshed once
+        full = set()
+        rows = {}
+        for message in messages:
+            if message.get("all"):
+                for key in list(CacheContainer.get_all_caches().keys()):
+                    full.add(key)
+                continue
+
+            key = message.get("key")
+            ids = message.get("ids")
+            if ids:
+                rows.setdefault(key, set()).update(ids)
+            else:
+                full.add(key)
+
+        for key in full:
+            cache = CacheContainer.get(key)
+            if cache:
+                cache.invalidate()
+
+        for key, ids in rows.items():
+            if key in full:
+                continue
+            cache = CacheContainer.get(key)
+            if cache:
+                cache.invalidate(ids=list(ids))
+    dispatch = classmethod(dispatch)
+
+
+
+
+class CacheBusListener(object):
+    '''Receives the invalidations published on the cache bus'''
+
+    def __init__(self):
+        self.mode = CacheBus.get_mode()
+        self.db_listener = None
+        self.inode = None
+        self.offset = None
+        self.record = None
+        self.record_time = 0
+
+
+    def wait(self, timeout):
+        '''wait up to timeout seconds for invalidations.  Returns the list
+        of messages received.  If messages may have been missed, a message
+        invalidating all of the caches is returned'''
+        if self.mode == "notify":
+            return self._wait_notify(timeout)
+        elif self.mode == "file":
+            return self._wait_file(timeout)
+        else:
+            time.sleep(timeout)
+            return []
+
+
+    def _wait_notify(self, timeout):
+        messages = []
+        if not self.db_listener:
+            db_resource = DbResource.get_default("sthpw")
+            self.db_listener = DbListener(db_resource, CacheBus.CHANNEL)
+
+        if not self.db_listener.is_listening():
+            self.db_listener.listen()
+            # anything may have changed while not listening
+            messages.append( {'all': True} )
+
+        try:
+            payloads = self.db_listener.wait(timeout)
+        except Exception as e:
+            print("WARNING: cache bus listener failed: ", e)
+            time.sleep(timeout)
+            return messages
+
+        for payload in payloads:
+            try:
+                messages.append( jsonloads(payload) )
+            except Exception:
+                print("WARNING: invalid cache bus message [%s]" % payload)
+        return messages
+
+
+    def _wait_file(self, timeout):
+        path = CacheBus.get_file_path()
+        messages = []
+
+        if self.offset is None:
+            # start from the end.  Everything before is already cached
+            self.inode, self.offset = CacheBus.stat_file(path)
+
+        end = time.time() + timeout
+        while True:
+            inode, size = CacheBus.stat_file(path)
+
+            if inode != self.inode:
+                # the log was rotated.  Finish reading the rotated log, which
+                # may have been appended to after it was last read
+                if self.inode is not None:
+                    rotated_path = CacheBus.get_rotated_path()
+                    if CacheBus.stat_file(rotated_path)[0] == self.inode:
+                        messages.extend( self._read_file(rotated_path) )
+                    else:
+                        messages.append( {'all': True} )
+                self.inode = inode
+                self.offset = 0
+
+            elif size < self.offset:
+                # the file was truncated
+                self.offset = 0
+                messages.append( {'all': True} )
+
+            if size > self.offset:
+                messages.extend( self._read_file(path) )
+
+            if messages or time.time() >= end:
+                break
+            time.sleep(0.2)
+
+        self._record_offset()
+        self._rotate_file()
+
+        return messages
+
+
+    def _read_file(self, path):
+        f = open(path, 'rb')
+        try:
+            f.seek(self.offset)
+            data = f.read()
+        finally:
+            f.close()
+
+        # only consume complete lines
+        messages = []
+        last = data.rfind(b"\n")
+        if last == -1:
+            return messages
+
+        self.offset += last + 1
+        for line in data[:last].split(b"\n"):
+            if not line:
+                continue
+            line = line.decode("utf-8")
+            try:
+                messages.append( jsonloads(line) )
+            except Exception:
+                print("WARNING: invalid cache bus message [%s]" % line)
+        return messages
+
+
+    def _get_offset_path(self):
+        return "%s/%s_%s" % (CacheBus.get_offsets_dir(), os.getpid(), id(self))
+
+
+    def _record_offset(self):
+        '''record how far this listener has read so that the log can be
+        rotated once every listener is done with it'''
+        now = time.time()
+        record = "%s %s" % (self.inode, self.offset)
+        if record == self.record and now - self.record_time < CacheBus.LISTENER_TIMEOUT / 2:
+            return
+
+        dirname = CacheBus.get_offsets_dir()
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        f = open(self._get_offset_path(), 'w')
+        try:
+            f.write(record)
+        finally:
+            f.close()
+
+        self.record = record
+        self.record_time = now
+
+
+    def _rotate_file(self):
+        '''rotate the log if it is too large and all of the listeners
+        have read all of it'''
+        path = CacheBus.get_file_path()
+        inode, size = CacheBus.stat_file(path)
+        if size < CacheBus.MAX_FILE_SIZE or inode != self.inode or self.offset < size:
+            return
+
+        dirname = CacheBus.get_offsets_dir()
+        now = time.time()
+        for name in os.listdir(dirname):
+            offset_path = "%s/%s" % (dirname, name)
+            try:
+                mtime = os.path.getmtime(offset_path)
+                f = open(offset_path, 'r')
+                try:
+                    record = f.read().split(" ")
+                finally:
+                    f.close()
+            except (IOError, OSError):
+                continue
+
+            if now - mtime > CacheBus.LISTENER_TIMEOUT:
+                try:
+                    os.unlink(offset_path)
+                except OSError:
+                    pass
+                continue
+
+            if len(record) != 2 or record[0] != str(inode) or int(record[1]) < size:
+                return
+
+        rotated_path = CacheBus.get_rotated_path()
+        try:
+            if os.path.exists(rotated_path):
+                os.unlink(rotated_path)
+            os.rename(path, rotated_path)
+        except OSError as e:
+            print("WARNING: cannot rotate cache bus log: ", e)
+
+
+    def close(self):
+        if os.path.exists(self._get_offset_path()):
+            os.unlink(self._get_offset_path())
+        if self.db_listener:
+            self.db_listener.close()
+            self.db_listener = None
+
+
@@ -10,17 +10,17 @@
 #
 #
 
-__all__ = ['ExpressionParser']
+__all__ = ['ExpressionParser', 'ExpressionCompiler', 'ExpressionVars']
 
 
-import os, re, types, math
+import os, re, types, math, time
 import dateutil
 from dateutil import parser
 from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
 import calendar
 import datetime
 
-from pyasm.common import TacticException, Environment, Container, FormatValue, Config, SPTDate, Common
+from pyasm.common import TacticException, Environment, Container, FormatValue, Config, SPTDate, Common, LRUCache
 from pyasm.search import Search, SObject, SearchKey, SearchType
 from pyasm.security import Site
 
@@ -43,12 +43,164 @@ class ParserException(TacticException):
     pass
 
 
+# marks a variable in compiled expression text
+VAR_PATTERN = re.compile("\x00(\w+)\x00")
+
+# compiled expressions shared by all threads
+EXPRESSION_CACHE = LRUCache(size=2000)
+
+
+
+
+
+class ExpressionVars(object):
+    '''Variables of the environment available to every expression, such
+    as $LOGIN, $PROJECT, $BASE_URL and the date variables.  A group of
+    variables is only computed when an expression uses one of them, and is
+    then kept for the rest of the request'''
+
+    KEY = "Expression:env_vars"
+
+    # the logins in the group of each login are shared by all requests
+    # for this number of seconds
+    LOGIN_GROUP_TIMEOUT = 60
+    LOGIN_GROUP_CACHE = LRUCache(size=1000)
+
+    DATE_NAMES = None
+
+    GROUPS = [
+        ('login', ['LOGIN', 'LOGIN_ID']),
+        ('login_group', ['LOGINS_IN_GROUP']),
+        ('project', ['PROJECT']),
+        ('url', ['BASE_URL', 'PROJECT_URL']),
+    ]
+
+    def __init__(self):
+        self.values = {}
+        self.loaded = set()
+        self.context = None
+
+
+    def get(cls):
+        env_vars = Container.get(cls.KEY)
+        if env_vars == None:
+            env_vars = cls()
+            Container.put(cls.KEY, env_vars)
+        return env_vars
+    get = classmethod(get)
+
+
+    def clear(cls):
+        Container.put(cls.KEY, None)
+        cls.LOGIN_GROUP_CACHE.clear()
+    clear = classmethod(clear)
+
+
+    def get_values(self, expression):
+        '''get the variables which are used in an expression'''
+        # the login and the project can change during a request
+        login_name = Environment.get_user_name()
+        project_code = Project.get_project_code()
+        context = (login_name, project_code)
+        if context != self.context:
+            self.context = context
+            self.values = {}
+            self.loaded = set()
+
+        values = {}
+
+        if self.DATE_NAMES == None:
+            date_vars = ExpressionParser().get_date_vars()
+            ExpressionVars.DATE_NAMES = list(date_vars.keys())
+        for name in self.DATE_NAMES:
+            if "$%s" % name in expression:
+                values.update( ExpressionParser().get_date_vars() )
+                break
+
+        for group, names in self.GROUPS:
+            for name in names:
+                if "$%s" % name not in expression:
+                    continue
+                if group not in self.loaded:
+                    self.loaded.add(group)
+                    load = getattr(self, "_load_%s" % group)
+                    load(self.values)
+                break
+
+        for group, names in self.GROUPS:
+            if group not in self.loaded:
+                continue
+            for name in names:
+                if name in self.values:
+                    values[name] = self.values[name]
+
+        return values
+
+
+    def _load_login(self, values):
+        login = Environment.get_login()
+        if login:
+            values['LOGIN'] = login.get_value("login")
+            values['LOGIN_ID'] = login.get_id()
+
+
+    def _load_login_group(self, values):
+        login = Environment.get_login()
+        if not login:
+            return
+
+        # add users in current login group
+        login_name = login.get_value("login")
+        key = "%s|%s" % (Site.get_site(), login_name)
+        cached = self.LOGIN_GROUP_CACHE.get(key)
+        if cached and time.time() - cached[0] < self.LOGIN_GROUP_TIMEOUT:
+            values['LOGINS_IN_GROUP'] = cached[1]
+            return
+
+        from pyasm.security import LoginGroup, Sudo
+        sudo = Sudo()
+        try:
+            login_codes = LoginGroup.get_login_codes_in_group()
+        finally:
+            sudo.exit()
+
+        login_codes = "|".join(login_codes)
+        self.LOGIN_GROUP_CACHE.put(key, (time.time(), login_codes))
+        values['LOGINS_IN_GROUP'] = login_codes
+
+
+    def _load_project(self, values):
+        values['PROJECT'] = Project.get_project_code()
+
+
+    def _load_url(self, values):
+        project = Project.get_project_code()
+
+        try:
+            from pyasm.web import WebContainer
+            web = WebContainer.get_web()
+        except Exception as e:
+            web = None
+        if web:
+            url = web.get_base_url()
+            values['BASE_URL'] = url.to_string()
+
+            url = web.get_project_url()
+            values['PROJECT_URL'] = url.to_string()
+        else:
+            base_url = Config.get_value("services", "mail_base_url")
+            if base_url:
+                values['BASE_URL'] = base_url
+                values['PROJECT_URL'] = "%s/tactic/%s" % (base_url, project)
+
 
 
 
 class ExpressionParser(object):
         
     def __init__(self):
+        # relationships shared by the sobjects of eval_many()
+        self.batch = None
         self.init()
 
 
@@ -67,6 +219,7 @@ class ExpressionParser(object):
         self.return_mode = 'array'
         self.is_single = False
         self.use_cache = True
+        self.arg_sources = {}
 
 
     # unfortunately, this function redefines list so, make a global
@@ -115,48 +268,11 @@ class ExpressionParser(object):
         if vars:
             self.vars.update(vars)
 
-
-        self.vars.update( self.get_date_vars() )
-
-        # add the environment
-        login = Environment.get_login()
-        if login:
-            self.vars['LOGIN'] = login.get_value("login")
-            self.vars['LOGIN_ID'] = login.get_id()
-
-            # add users in current login group
-            from pyasm.security import LoginGroup, Sudo
-            sudo = Sudo()
-            try:
-                login_codes = LoginGroup.get_login_codes_in_group()
-            finally:
-                sudo.exit()
-
-
-            login_codes = "|".join(login_codes)
-            self.vars['LOGINS_IN_GROUP'] = login_codes
-
-
-        project = Project.get_project_code()
-        self.vars['PROJECT'] = project
-
-        try:
-            from pyasm.web import WebContainer
-            web = WebContainer.get_web()
-        except Exception as e:
-            web = None
-        if web:
-            url = web.get_base_url()
-            self.vars['BASE_URL'] = url.to_string()
-
-            url = web.get_project_url()
-            self.vars['PROJECT_URL'] = url.to_string()
-        else:
-            base_url = Config.get_value("services", "mail_base_url")
-            if base_url:
-                self.vars['BASE_URL'] = base_url
-                self.vars['PROJECT_URL'] = "%s/tactic/%s" % (base_url, project)
-
+        # add the environment.  Only the variables used by the expression
+        # are looked up
+        if '$' in self.expression:
+            env_vars = ExpressionVars.get()
+            self.vars.update( env_vars.get_values(self.expression) )
 
 
         # preprocess multi-line expressions
@@ -167,30 +283,22 @@ class ExpressionParser(object):
 
 
 
-        # replace all of the variables: Note that this replaces even in the
-        # string area ... not sure if this is what we want
-        keys = self.vars.keys()
-        keys = sorted(keys)
-        keys.reverse()
-
-        #for name, value in self.vars.items():
+        # variables are not replaced in the text.  The expression is
+        # compiled with a marker for each variable and the values are bound
+        # when it is evaluated, so the compiled expression can be reused
+        names = []
         if '$' in self.expression:
-            for name in keys:
-                value = self.vars.get(name)
-
-                if Common.IS_Pv3:
-                    new_value = "'%s'" % str(value) # python 3 
-                else:
-                    new_value = "'%s'" % unicode(value).encode('utf-8', 'ignore')
-
-                # HACK: replace with the single quotes first.  Not elegant, but
-                # it works for now until we have real variables
-                self.expression = self.expression.replace("'$%s'"%name, new_value).replace("$%s"%name, new_value)
+            for name in self.vars.keys():
+                if "$%s" % name in self.expression:
+                    names.append(name)
+        text = ExpressionCompiler.mark_vars(self.expression, names)
+        if names:
+            self.expression = self.bind_vars(text)
 
         if not mode:
             # start in string mode
-            string_idx = self.expression.find("{")
-            expr_idx = self.expression.find("@")
+            string_idx = text.find("{")
+            expr_idx = text.find("@")
 
             if string_idx == -1:
                 new_parser = ExpressionMode()
@@ -212,7 +320,7 @@ class ExpressionParser(object):
             self.is_single = True
 
             # if the are no {}, then just exit ... no use parsing
-            string_idx = self.expression.find("{")
+            string_idx = text.find("{")
             if string_idx == -1:
                 return self.expression
 
@@ -225,7 +333,8 @@ class ExpressionParser(object):
         
         Container.put("Expression::extra_filters", extra_filters)
 
-        self.dive(new_parser)
+        node = ExpressionCompiler.get(new_parser, text)
+        self.dive_compiled(new_parser, node, self.expression)
         Container.put("Expression::extra_filters", None)
         if self.is_single and isinstance(self.result, self.LIST):
             if self.result:
@@ -238,6 +347,43 @@ class ExpressionParser(object):
         else:
             return self.result
 
+    def eval_many(self, expression, sobjects, vars={}, row_vars=None, **kwargs):
+        '''evaluate an expression for each sobject in a list.  Returns a list
+        with the result for each sobject, the same as eval() would return
+        for that sobject.  Each relationship is searched once for all of
+        the sobjects instead of once for each sobject.
+
+        @params
+        expression: the expression to evaluate
+        sobjects: list of sobjects of the same search type
+        vars: variables used for all of the sobjects
+        row_vars: optional list of variables for each sobject
+        kwargs: any other arguments of eval()
+        '''
+        results = []
+        if not sobjects:
+            return results
+
+        search_types = set([x.get_base_search_type() for x in sobjects if x])
+        if len(search_types) == 1:
+            self.batch = ExpressionBatch(sobjects)
+
+        try:
+            for i, sobject in enumerate(sobjects):
+                sobject_vars = vars
+                if row_vars:
+                    sobject_vars = vars.copy()
+                    sobject_vars.update(row_vars[i])
+
+                result = self.eval(expression, sobject, vars=sobject_vars, **kwargs)
+                results.append(result)
+        finally:
+            self.batch = None
+
+        return results
+
+
+
     def get_date_vars(self):
         from pyasm.biz import PrefSetting
 
@@ -559,6 +705,12 @@ class ExpressionParser(object):
         if expression == '':
             return ''
 
+        # expressions evaluated by methods are also compiled
+        if expression and type(new_parser) in [ExpressionMode, StringMode]:
+            source = self.arg_sources.get(expression) or expression
+            node = ExpressionCompiler.get(new_parser, source)
+            return self.dive_compiled(new_parser, node, expression)
+
         if expression:
             new_parser.expression = expression
             new_parser.index = 0
@@ -569,8 +721,37 @@ class ExpressionParser(object):
             else:
                 new_parser.index = self.index + 1
 
+        self.init_child(new_parser)
 
+        new_parser.do_parse()
+
+        # get the result from the parse
+        self.result = new_parser.get_result()
 
+        # get the related_types going back up after a dive
+        # This is for caching purposes
+        self.related_types = new_parser.related_types
+
+        if not expression:
+            self.index = new_parser.index
+
+        return self.result
+
+
+    def dive_compiled(self, new_parser, node, expression):
+        '''evaluate a compiled node with a new parser'''
+        new_parser.expression = expression
+        new_parser.index = 0
+        self.init_child(new_parser)
+
+        new_parser.eval_node(node)
+
+        self.result = new_parser.get_result()
+        self.related_types = new_parser.related_types
+        return self.result
+
+
+    def init_child(self, new_parser):
         new_parser.sobjects = self.sobjects
         new_parser.search = self.search
         new_parser.env_sobjects = self.env_sobjects
@@ -579,20 +760,29 @@ class ExpressionParser(object):
         new_parser.show_retired = self.show_retired
         new_parser.use_cache = self.use_cache
         new_parser.related_types = self.related_types
+        new_parser.batch = self.batch
 
-        new_parser.do_parse()
 
-        # get the result from the parse
-        self.result = new_parser.get_result()
+    def eval_node(self, node):
+        raise ParserException("Parser [%s] cannot evaluate compiled expressions" % self.__class__.__name__)
 
-        # get the related_types going back up after a dive
-        # This is for caching purposes
-        self.related_types = new_parser.related_types
 
-        if not expression:
-            self.index = new_parser.index
+    def bind_vars(self, text):
+        '''replace the variable markers of compiled text with the values of
+        the variables'''
+        if not isinstance(text, basestring) or '\x00' not in text:
+            return text
+        return VAR_PATTERN.sub(self._get_var_value, text)
 
-        return self.result
+
+    def _get_var_value(self, match):
+        value = self.vars.get(match.group(1))
+        if value is None:
+            value = ''
+        if Common.IS_Pv3:
+            return str(value)
+        else:
+            return unicode(value).encode('utf-8', 'ignore')
 
 
     def get_mode(self, expression):
@@ -640,75 +830,15 @@ class StringMode(ExpressionParser):
         if token == '{':
             mode = ExpressionMode()
             result = self.dive(mode)
-            # NOTE:: for now, take the first element
-            if isinstance(result, list):
-                if not result:
-                    result = ''
-                else:
-                    result = result[0]
-                    if isinstance(result, SObject):
-                        result = result.get_display_value()
-
-
 
+            format = None
             if self.expression[self.index] != '}':
 
                 mode = StringFormatMode()
                 format = self.dive(mode)
                 format = format.strip()
-                if isinstance(result, datetime.datetime):
-                    try:
-                        result = result.strftime(str(format))
-                    except Exception as e:
-                        raise SyntaxError("Error when using format [%s] on datetime result [%s] in expression [%s]: [%s]" % (format, result, self.expression, str(e)))
-
-                # NOTE: does this make sense??
-                # if it is a timedelta, convert to seconds for
-                # formatting
-                elif isinstance(result, datetime.timedelta):
-                    result = result.seconds
-
-                elif format.startswith("%"):
-                    if result == None:
-                        result = ''
-                    else:
-                        try:
-                            result = format % result
-                        except Exception as e:
-                            # handle the case where an integer is expected
-                            # in the string formatting
-                            if str(e) == "an integer is required":
-                                result = ''
-                            elif str(e) == "a float is required":
-                                result = ''
-                            else:
-                                #raise SyntaxError("Error when using format [%s] on result [%s] in expression [%s]: [%s]" % (format, result, self.expression, str(e)))
-                                result = ''
-                elif format.startswith("format="):
-
-                    # {@GET(.cost),-$1,234.00}
-                    format_value = FormatValue()
-                    parts = format.split("=")
-                    format = parts[1]
-                    format = format.strip("'")
-                    result = format_value.get_format_value(result, format)
-
-
-                else: # regex formatting
-                    if not result:
-                        result = ''
-                    else:
-                        p = re.compile(format)
-                        m = p.search(result)
-                        if m:
-                            groups = m.groups()
-                            if groups:
-                                result = ''.join(groups)
-                                # just take the first one right now
-                                #result = m.groups()[0]
 
-            if not isinstance(result, basestring):
-                result = str(result)
+            result = self.format_result(result, format)
             self.stack.append(result)
 
         elif token == '}':
@@ -718,6 +848,86 @@ class StringMode(ExpressionParser):
             self.stack.append(token)
 
 
+    def eval_node(self, node):
+        for part in node.parts:
+            if isinstance(part, tuple):
+                expr_node, format = part
+                result = self.dive_compiled(ExpressionMode(), expr_node, self.expression)
+                result = self.format_result(result, self.bind_vars(format))
+                self.stack.append(result)
+            else:
+                self.stack.append( self.bind_vars(part) )
+
+
+    def format_result(self, result, format=None):
+        '''convert the result of an expression in {} to a string'''
+        # NOTE:: for now, take the first element
+        if isinstance(result, list):
+            if not result:
+                result = ''
+            else:
+                result = result[0]
+                if isinstance(result, SObject):
+                    result = result.get_display_value()
+
+
+        if format is not None:
+            if isinstance(result, datetime.datetime):
+                try:
+                    result = result.strftime(str(format))
+                except Exception as e:
+                    raise SyntaxError("Error when using format [%s] on datetime result [%s] in expression [%s]: [%s]" % (format, result, self.expression, str(e)))
+
+            # NOTE: does this make sense??
+            # if it is a timedelta, convert to seconds for
+            # formatting
+            elif isinstance(result, datetime.timedelta):
+                result = result.seconds
+
+            elif format.startswith("%"):
+                if result == None:
+                    result = ''
+                else:
+                    try:
+                        result = format % result
+                    except Exception as e:
+                        # handle the case where an integer is expected
+                        # in the string formatting
+                        if str(e) == "an integer is required":
+                            result = ''
+                        elif str(e) == "a float is required":
+                            result = ''
+                        else:
+                            #raise SyntaxError("Error when using format [%s] on result [%s] in expression [%s]: [%s]" % (format, result, self.expression, str(e)))
+                            result = ''
+            elif format.startswith("format="):
+
+                # {@GET(.cost),-$1,234.00}
+                format_value = FormatValue()
+                parts = format.split("=")
+                format = parts[1]
+                format = format.strip("'")
+                result = format_value.get_format_value(result, format)
+
+
+            else: # regex formatting
+                if not result:
+                    result = ''
+                else:
+                    p = re.compile(format)
+                    m = p.search(result)
+                    if m:
+                        groups = m.groups()
+                        if groups:
+                            result = ''.join(groups)
+                            # just take the first one right now
+                            #result = m.groups()[0]
+
+        if not isinstance(result, basestring):
+            result = str(result)
+        return result
+
+
 
        
 
@@ -875,6 +1085,29 @@ class ExpressionMode(ExpressionParser):
             #raise SyntaxError("Unrecognized token [%s] in expression mode in line [%s]" % (token, self.expression))
 
 
+    def eval_node(self, node):
+        for kind, value in node.items:
+            if kind == 'literal':
+                self.literal = [self.bind_vars(value)]
+                self.handle_literal()
+                self.literal = []
+
+            elif kind == 'op':
+                self.stack.append(value)
+
+            elif kind == 'method':
+                self.result = self.dive_compiled(MethodMode(), value, self.expression)
+                self.stack.append(self.result)
+
+            elif kind == 'expr':
+                value = self.dive_compiled(ExpressionMode(), value, self.expression)
+                self.stack.append(value)
+
+            elif kind == 'reset':
+                self.result = None
+                self.stack = []
+
+
     def handle_literal(self):
         if not self.literal:
             return
@@ -1146,6 +1379,27 @@ class MethodMode(ExpressionParser):
         self.method_name = []
         self.result = None
         self.brackets = 0
+        self.arg_sources = {}
+
+
+    def eval_node(self, node):
+        # the method was never closed
+        if node.args is None:
+            return
+
+        method_name = self.bind_vars(node.name)
+
+        # remember the compiled text of each argument so that arguments
+        # which are expressions are compiled with their variable markers
+        args = []
+        for arg in node.args:
+            value = self.bind_vars(arg)
+            if value is not arg:
+                self.arg_sources[value] = arg
+            args.append(value)
+
+        self.result = self.execute_method(method_name, args)
+
 
     def parse(self, token):
 
@@ -2075,9 +2329,16 @@ class MethodMode(ExpressionParser):
                 return [sobject]
 
             elif related_type == 'parent':
+                parents = None
+                if self.batch and self.batch.is_row(self.sobjects):
+                    parents = self.batch.get_related((), ('parent',), self.sobjects, self.get_parents_by_sobjects)
+
                 related_sobjects = []
                 for sobject in self.sobjects:
-                    parent = sobject.get_parent()
+                    if parents != None:
+                        parent = (parents.get(sobject.get_search_key()) or [None])[0]
+                    else:
+                        parent = sobject.get_parent()
                     related_sobjects.append(parent)
                     self.cache_sobjects(sobject.get_search_key(), [parent])
                 return related_sobjects
@@ -2224,6 +2485,13 @@ class MethodMode(ExpressionParser):
             # start of with the current sobject list
             related_sobjects = self.sobjects
 
+        # the relationships of the sobjects of eval_many() are searched
+        # together.  The level is the path of related types from these
+        # sobjects
+        level = None
+        if self.batch and not is_search and related_sobjects is self.sobjects and self.batch.is_row(self.sobjects):
+            level = ()
+
         # go through each of the related types
         cur_search_type = ''
         if related_sobjects:
@@ -2254,9 +2522,22 @@ class MethodMode(ExpressionParser):
                 related_sobjects = [Environment.get_login()]
 
             elif related_type == 'parent':
+                parents = None
+                if level != None:
+                    parents = self.batch.get_related(level, ('parent',), related_sobjects, self.get_parents_by_sobjects)
+                if parents != None:
+                    level = level + (('parent',),)
+                else:
+                    level = None
+
                 list = []
                 for related_sobject in related_sobjects:
-                    parent = related_sobject.get_parent()
+                    if not related_sobject:
+                        continue
+                    if parents != None:
+                        parent = (parents.get(related_sobject.get_search_key()) or [None])[0]
+                    else:
+                        parent = related_sobject.get_parent()
                     list.append(parent)
                     self.cache_sobjects(related_sobject.get_search_key(), [parent])
 
@@ -2282,6 +2563,8 @@ class MethodMode(ExpressionParser):
                     connections = SObjectConnection.get_connections(related_sobjects, context_filters=context_filters)
                     list = SObjectConnection.get_sobjects(connections, filters=reg_filters)
 
+                level = None
+
 
                 # TODO: caching is not implemented on connect
                 #self.cache_sobjects(related_sobject.get_search_key(), sobjects)
@@ -2291,6 +2574,7 @@ class MethodMode(ExpressionParser):
                 sobject = self.get_env_sobject(related_type)
                 if sobject:
                     list.append(sobject)
+                level = None
 
             #elif i == 0 and related_type == cur_search_type:
             elif False:
@@ -2335,8 +2619,9 @@ class MethodMode(ExpressionParser):
                 else:
 
                     # on the very specific case when there is just one relative
-                    # type, then just use the count method
-                    if is_count and len(related_types) == 1:
+                    # type, then just use the count method.  With eval_many(),
+                    # the related sobjects are searched for all rows instead
+                    if is_count and len(related_types) == 1 and level == None:
                         search = Search(related_type)
                         search.add_relationship_filters(related_sobjects, path=path)
                         search.add_op_filters(filters)
@@ -2349,7 +2634,18 @@ class MethodMode(ExpressionParser):
                         list = self.sobjects
 
                     else:
-                        tmp_dict = Search.get_related_by_sobjects(related_sobjects, related_type, filters=filters, path=path, show_retired=self.show_retired)
+                        def get_related(sobjects):
+                            return Search.get_related_by_sobjects(sobjects, related_type, filters=filters, path=path, show_retired=self.show_retired)
+
+                        tmp_dict = None
+                        if level != None:
+                            spec = (related_type, str(filters), path, self.show_retired)
+                            tmp_dict = self.batch.get_related(level, spec, related_sobjects, get_related)
+                        if tmp_dict != None:
+                            level = level + (spec,)
+                        else:
+                            level = None
+                            tmp_dict = get_related(related_sobjects)
 
                         # collapse the list and make it unique
                         tmp_list = []
@@ -2411,6 +2707,69 @@ class MethodMode(ExpressionParser):
 
 
 
+    def get_parents_by_sobjects(self, sobjects):
+        '''get the parents of a list of sobjects with one search for each
+        parent type.  Returns a dictionary of the search key of each sobject
+        to a list containing its parent'''
+        results = {}
+
+        groups = {}
+        for sobject in sobjects:
+            search_type = sobject.get_base_search_type()
+            groups.setdefault(search_type, []).append(sobject)
+
+        for search_type, group in groups.items():
+            schema = group[0].get_schema()
+            parent_type = schema.get_parent_type(search_type)
+
+            if parent_type and parent_type != '*':
+                related = Search.get_related_by_sobjects(group, parent_type)
+                for sobject in group:
+                    search_key = sobject.get_search_key()
+                    parents = related.get(search_key) or [None]
+                    results[search_key] = parents[:1]
+                continue
+
+            # parents which are found by search_type and search_code
+            codes = {}
+            if parent_type == '*':
+                attrs = schema.get_relationship_attrs("*", search_type, path=None)
+                prefix = attrs.get("prefix")
+                if prefix:
+                    prefix = "%s_" % prefix
+                else:
+                    prefix = ""
+
+                for sobject in group:
+                    parent_search_type = sobject.get_value("%ssearch_type" % prefix, no_exception=True)
+                    parent_code = sobject.get_value("%ssearch_code" % prefix, no_exception=True)
+                    if parent_search_type and parent_code:
+                        codes.setdefault(parent_search_type, set()).add(parent_code)
+
+            parents = {}
+            for parent_search_type, parent_codes in codes.items():
+                search = Search(parent_search_type)
+                search.add_filters("code", list(parent_codes))
+                for parent in search.get_sobjects():
+                    parents[(parent_search_type, parent.get_code())] = parent
+
+            for sobject in group:
+                search_key = sobject.get_search_key()
+                if parent_type == '*':
+                    parent_search_type = sobject.get_value("%ssearch_type" % prefix, no_exception=True)
+                    parent_code = sobject.get_value("%ssearch_code" % prefix, no_exception=True)
+                    if parent_search_type and parent_code:
+                        parent = parents.get( (parent_search_type, parent_code) )
+                        results[search_key] = [parent]
+                        continue
+
+                # anything else is found one at a time
+                results[search_key] = [sobject.get_parent()]
+
+        return results
+
+
+
     def get(self, sobjects, column):
 
         # fix bad column names.  This can happen if expression comes from xml
@@ -2794,3 +3153,467 @@ def tokenize(expr, special_chars):
 
 
 
+class ExpressionBatch(object):
+    '''Related sobjects searched once for all of the sobjects of
+    ExpressionParser.eval_many().  A level is the path of relationships
+    followed from these sobjects.  The first time a relationship is followed
+    from a level, it is searched for every sobject of that level and the
+    results are kept for the following rows'''
+
+    # maximum number of different filters of a related type at a level.
+    # Filters which depend on the row are searched one row at a time
+    MAX_VARIANTS = 4
+
+    def __init__(self, sobjects):
+        self.levels = { (): sobjects }
+        self.related = {}
+        self.variants = {}
+        self.row_ids = set([id(x) for x in sobjects])
+
+
+    def is_row(self, sobjects):
+        '''determine if the sobjects are one of the rows of the batch'''
+        return len(sobjects) == 1 and id(sobjects[0]) in self.row_ids
+
+
+    def get_related(self, level, spec, sobjects, find):
+        '''get the related sobjects of the sobjects at a level.  Find
+        is called with all of the sobjects of the level and returns a
+        dictionary of search key to a list of related sobjects.  Returns
+        None if the relationship cannot be searched for the whole level'''
+        key = level + (spec,)
+        related = self.related.get(key)
+        if related == None:
+            sources = self.levels.get(level)
+            if sources == None:
+                return None
+
+            variant_key = level + (spec[0],)
+            variants = self.variants.setdefault(variant_key, set())
+            variants.add(spec)
+            if len(variants) > self.MAX_VARIANTS:
+                return None
+
+            related = find([x for x in sources if x])
+            self.related[key] = related
+
+            # the related sobjects become the next level
+            next_level = []
+            search_keys = set()
+            search_types = set()
+            for items in related.values():
+                for item in items:
+                    if not item:
+                        continue
+                    search_key = item.get_search_key()
+                    if search_key in search_keys:
+                        continue
+                    search_keys.add(search_key)
+                    search_types.add(item.get_base_search_type())
+                    next_level.append(item)
+            if len(search_types) <= 1:
+                self.levels[key] = next_level
+
+        results = {}
+        for sobject in sobjects:
+            if not sobject:
+                continue
+            search_key = sobject.get_search_key()
+            results[search_key] = related.get(search_key) or []
+        return results
+
+
+
+
+class StringNode(object):
+    '''compiled string mode.  The parts are either text or a tuple of an
+    ExpressionNode and the format of its result'''
+    def __init__(self, parts):
+        self.parts = parts
+
+
+class ExpressionNode(object):
+    '''compiled expression mode.  The items are (kind, value) tuples where
+    kind is one of literal, op, method, expr or reset'''
+    def __init__(self, items):
+        self.items = items
+
+
+class MethodNode(object):
+    '''compiled method call.  The args are the text of each argument or
+    None if the method has no argument list'''
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+
+class ExpressionCompiler(object):
+    '''Turns the text of an expression into a tree of nodes which can be
+    evaluated many times.  This follows the parse() methods of the parser
+    modes, but nothing is evaluated.
+
+    Variables are marked in the text by mark_vars() and bound by the parser
+    when the nodes are evaluated.'''
+
+    def __init__(self, text):
+        self.text = text
+        self.index = 0
+
+
+    def get(cls, mode, text):
+        '''get the compiled node of an expression from the cache'''
+        if isinstance(mode, StringMode):
+            key = "string|%s" % text
+        else:
+            key = "expression|%s" % text
+
+        node = EXPRESSION_CACHE.get(key)
+        if node is None:
+            compiler = cls(text)
+            if isinstance(mode, StringMode):
+                node = compiler.compile_string(0)
+            else:
+                node = compiler.compile_expression(0)
+            EXPRESSION_CACHE.put(key, node)
+        return node
+    get = classmethod(get)
+
+
+    def mark_vars(expression, names):
+        '''replace the variables with markers.  A variable is a quoted
+        value once it is bound, so the markers are quoted'''
+        if not names:
+            return expression
+
+        # longer names first so that a name which starts with another
+        # name is replaced first
+        names = sorted(names)
+        names.reverse()
+        for name in names:
+            marker = "'\x00%s\x00'" % name
+            expression = expression.replace("'$%s'"%name, marker).replace("$%s"%name, marker)
+        return expression
+    mark_vars = staticmethod(mark_vars)
+
+
+    def clear_cache():
+        EXPRESSION_CACHE.clear()
+    clear_cache = staticmethod(clear_cache)
+
+
+    def get_display(self):
+        return VAR_PATTERN.sub(r"$\1", self.text)
+
+
+    def _loop(self, start, parse):
+        text = self.text
+        self.index = start
+        while 1:
+            if parse(text[self.index]) == 'exit':
+                return
+            self.index += 1
+            if self.index >= len(text):
+                break
+
+
+
+    def compile_string(self, start):
+        text = self.text
+        parts = []
+        chars = []
+
+        def parse(token):
+            if token == '{':
+                if chars:
+                    parts.append("".join(chars))
+                    del chars[:]
+
+                node = self.compile_expression(self.index + 1)
+                format = None
+                if text[self.index] != '}':
+                    format = self.compile_string_format(self.index + 1)
+                    format = format.strip()
+                parts.append( (node, format) )
+
+            elif token == '}':
+                return 'exit'
+
+            else:
+                chars.append(token)
+
+        self._loop(start, parse)
+        if chars:
+            parts.append("".join(chars))
+        return StringNode(parts)
+
+
+
+    def compile_string_format(self, start):
+        text = self.text
+        format = []
+        state = {'start_char': False, 'brackets': 0}
+
+        def parse(token):
+            if not state['start_char'] and token == '}':
+                return 'exit'
+
+            elif token == state['start_char']:
+                if state['brackets'] == 0:
+                    # skip pass the } after |
+                    char = text[self.index]
+                    while char != '}':
+                        self.index += 1
+                        char = text[self.index]
+                    return 'exit'
+                else:
+                    format.append(token)
+
+            elif token == '|':
+                state['start_char'] = token
+
+            else:
+                if token == '(':
+                    state['brackets'] += 1
+                elif token == ')':
+                    state['brackets'] -= 1
+                format.append(token)
+
+        self._loop(start, parse)
+        return "".join(format)
+
+
+
+    def compile_expression(self, start):
+        text = self.text
+        items = []
+        literal = []
+        state = {'literal_mode': False}
+
+        def handle_literal():
+            if literal:
+                items.append( ('literal', "".join(literal)) )
+                del literal[:]
+
+        def parse(token):
+            if state['literal_mode']:
+                if token == "'":
+                    state['literal_mode'] = False
+                    if not literal:
+                        literal.append(ExpressionMode.EMPTY_LITERAL)
+                else:
+                    literal.append(token)
+                return
+
+            if token == '}':
+                return 'exit'
+
+            elif token == '@':
+                node = self.compile_method(self.index + 1)
+                items.append( ('method', node) )
+
+            elif token == ',':
+                return 'exit'
+
+            elif token == '(':
+                node = self.compile_expression(self.index + 1)
+                items.append( ('expr', node) )
+
+            elif token == ')':
+                return 'exit'
+
+            elif token == '-':
+                try:
+                    # handle negative number
+                    int(text[self.index+1])
+                    literal.append(token)
+                except ValueError:
+                    handle_literal()
+                    items.append( ('op', token) )
+
+            elif token in ['+', '-', '/', '*', '~']:
+                handle_literal()
+                items.append( ('op', token) )
+
+            elif token in ['>','=','<','!']:
+                handle_literal()
+
+                if text[self.index+1] in ['=','!']:
+                    token += '='
+                    self.index += 1
+                elif text[self.index+1] in ['~']:
+                    token += '~'
+                    self.index += 1
+
+                items.append( ('op', token) )
+
+            elif token in ["'"]:
+                state['literal_mode'] = True
+
+            elif token in [' ', '\t', '\n']:
+                handle_literal()
+
+            elif token in [';']:
+                # only the last statement is the result
+                items.append( ('reset', None) )
+
+            else:
+                literal.append(token)
+
+        self._loop(start, parse)
+        handle_literal()
+        return ExpressionNode(items)
+
+
+
+    def compile_method(self, start):
+        method_name = []
+        state = {'brackets': 0, 'args': None}
+
+        def parse(token):
+            if token == '}':
+                return
+
+            elif token == '(':
+                state['brackets'] += 1
+                state['args'] = self.compile_arg_list(self.index + 1)
+                return 'exit'
+
+            elif token == ')':
+                state['brackets'] -= 1
+                if state['brackets'] == 0:
+                    return 'exit'
+                else:
+                    method_name.append(token)
+
+            elif token == ' ':
+                raise SyntaxError('Syntax Error: found extra space in [%s]' % self.get_display())
+
+            else:
+                method_name.append(token)
+
+        self._loop(start, parse)
+        return MethodNode("".join(method_name), state['args'])
+
+
+
+    def compile_arg_list(self, start):
+        text = self.text
+        args = []
+
+        def parse(token):
+            if token in [' ','\n','\t']:
+                return
+
+            elif token == ')':
+                return 'exit'
+
+            else:
+                arg = self.compile_arg(self.index)
+                args.append(arg)
+
+            if self.index == len(text):
+                raise SyntaxError('No closing bracket around arguments for [%s]' % self.get_display())
+            # if the next character is ), then exit
+            try:
+                if text[self.index] == ')':
+                    return 'exit'
+            except IndexError:
+                raise SyntaxError('Incorrect syntax found for %s' % self.get_display())
+
+        self._loop(start, parse)
+        return args
+
+
+
+    def compile_arg(self, start):
+        result = []
+        literal = []
+        state = {
+            'brackets': 0,
+            'literal_mode': False,
+            'is_only_literal': True,
+            'is_closed': False,
+        }
+
+        def parse(token):
+            # handle literals
+            if token == "'":
+                if state['literal_mode']:
+                    state['literal_mode'] = False
+                    if not literal:
+                        result.append("''")
+                    else:
+                        if state['is_only_literal']:
+                            value = "".join(literal)
+                        else:
+                            value = "'%s'" % "".join(literal)
+                        result.append(value)
+                    del literal[:]
+                else:
+                    state['literal_mode'] = True
+
+            elif state['literal_mode']:
+                literal.append(token)
+
+            # ignore spaces
+            elif token == ' ':
+                return
+
+            elif token in [',', ')']:
+                if token == ')':
+                    state['brackets'] -= 1
+                    if state['brackets'] < 0:
+                        state['is_closed'] = True
+                        return "exit"
+                    else:
+                        result.append(token)
+
+                # , found. Ensure it is a arg separator using bracket counts
+                elif state['brackets'] < 1:
+                    state['is_closed'] = True
+                    return "exit"
+                else:
+                    result.append(token)
+
+            # start a filter
+            elif token == '[':
+                filter = self.compile_filter(self.index)
+                result.append(filter)
+
+            elif token == '(':
+                state['brackets'] += 1
+                result.append(token)
+
+            else:
+                result.append(token)
+                state['is_only_literal'] = False
+
+        self._loop(start, parse)
+        if not state['is_closed']:
+            return result
+        return "".join(result).strip()
+
+
+
+    def compile_filter(self, start):
+        result = []
+        state = {'brackets': 0}
+
+        def parse(token):
+            if token == ']':
+                result.append(token)
+                if state['brackets'] == 0:
+                    return 'exit'
+
+            else:
+                if token == '(':
+                    state['brackets'] += 1
+                elif token == ')':
+                    state['brackets'] -= 1
+                result.append(token)
+
+        self._loop(start, parse)
+        return "".join(result)
+
+
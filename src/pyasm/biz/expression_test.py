@@ -134,6 +134,9 @@ class ExpressionTest(unittest.TestCase):
             self._test_loop()
 
             self._test_var()
+            self._test_compile()
+            self._test_eval_many()
+            self._test_env_vars()
             self._test_new_parser()
             self._test_simple()
             self._test_single()
@@ -2761,6 +2764,95 @@ class ExpressionTest(unittest.TestCase):
 
 
 
+    def _test_compile(self):
+        from .expression import EXPRESSION_CACHE, StringMode
+
+        # the same expression is compiled once for different values
+        expr = "@GET(unittest/person['name_first',$NAME].nationality)"
+        result = self.parser.eval(expr, vars={'NAME': 'person0'}, single=True)
+        self.assertEqual("Smith0", result)
+
+        hits = EXPRESSION_CACHE.get_stats().get("hits")
+        result = self.parser.eval(expr, vars={'NAME': 'person1'}, single=True)
+        self.assertEqual("Smith1", result)
+        self.assertEqual(hits+1, EXPRESSION_CACHE.get_stats().get("hits"))
+
+        # values are bound as data and are not parsed
+        result = self.parser.eval("{$VALUE}", vars={'VALUE': "a}b{@c"})
+        self.assertEqual("a}b{@c", result)
+
+        result = self.parser.eval("@IF($VALUE == 'yes', 'on', 'off')", vars={'VALUE': 'yes'}, single=True)
+        self.assertEqual("on", result)
+        result = self.parser.eval("@IF($VALUE == 'yes', 'on', 'off')", vars={'VALUE': 'no'}, single=True)
+        self.assertEqual("off", result)
+
+        node = ExpressionCompiler.get(StringMode(), "Name: {@GET(.name_first),%s}")
+        self.assertEqual("Name: ", node.parts[0])
+        self.assertEqual("%s", node.parts[1][1])
+        method = node.parts[1][0].items[0][1]
+        self.assertEqual("GET", method.name)
+        self.assertEqual([".name_first"], method.args)
+
+
+
+    def _test_eval_many(self):
+        # the results are the same as evaluating each sobject
+        expressions = [
+            "@GET(unittest/city.code)",
+            "@COUNT(unittest/city.sthpw/task)",
+            "@GET(unittest/city.unittest/country.code)",
+            "{@GET(.name_first)} {$SOBJECT_CODE}",
+            "@COUNT(sthpw/task['status','LA'])",
+        ]
+        for expression in expressions:
+            expected = []
+            for person in self.persons:
+                vars = {'SOBJECT_CODE': person.get_code()}
+                expected.append( self.parser.eval(expression, person, vars=vars, single=True) )
+
+            row_vars = [{'SOBJECT_CODE': x.get_code()} for x in self.persons]
+            results = self.parser.eval_many(expression, self.persons, row_vars=row_vars, single=True)
+            self.assertEqual(expected, results)
+
+        tasks = [self.country_task, self.city_task, self.city_task2]
+        expected = [self.parser.eval("@GET(parent.code)", x, single=True) for x in tasks]
+        results = self.parser.eval_many("@GET(parent.code)", tasks, single=True)
+        self.assertEqual(["USA", "los_angeles", "los_angeles"], results)
+        self.assertEqual(expected, results)
+
+        # the batch is only used inside of eval_many()
+        self.assertEqual(None, self.parser.batch)
+
+
+
+    def _test_env_vars(self):
+        ExpressionVars.clear()
+        env_vars = ExpressionVars.get()
+
+        # only the variables used are computed
+        result = self.parser.eval("$PROJECT")
+        self.assertEqual(Project.get_project_code(), result)
+        self.assertEqual(set(['project']), env_vars.loaded)
+
+        login = Environment.get_login().get_value("login")
+        result = self.parser.eval("{$LOGIN}")
+        self.assertEqual(login, result)
+        self.assertEqual(set(['project', 'login']), env_vars.loaded)
+
+        result = self.parser.eval("@GET(.name_first)", self.persons[0])
+        self.assertEqual(set(['project', 'login']), env_vars.loaded)
+
+        result = self.parser.eval("$LOGINS_IN_GROUP")
+        self.assertEqual(True, 'login_group' in env_vars.loaded)
+
+        # variables passed in are still replaced by the environment
+        result = self.parser.eval("$PROJECT", vars={'PROJECT': 'other'})
+        self.assertEqual(Project.get_project_code(), result)
+        result = self.parser.eval("$OTHER", vars={'OTHER': 'other'})
+        self.assertEqual('other', result)
+
+
+
     def _test_cache(self):
         expr = '@COUNT(unittest/person)'
         parser = ExpressionParser()
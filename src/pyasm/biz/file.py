@@ -12,7 +12,7 @@
 
 __all__ = ["FileException", "File", "FileAccess", "IconCreator", "FileGroup", "FileRange"]
 
-from pyasm.common import Common, Xml, TacticException, Environment, System, Config, jsonloads
+from pyasm.common import Common, Xml, TacticException, Environment, System, Checksum, jsonloads
 from pyasm.search import *
 from .project import Project
 
@@ -404,24 +404,12 @@ class File(SObject):
 
 
     def get_md5(path):
-        '''get md5 checksum'''
-        py_exec = Config.get_value("services", "python")
-        if not py_exec:
-            py_exec = "python"
-
-        if not Common.IS_Pv3 and isinstance(path, unicode):
-            path = path.encode('utf-8')
-        popen =  subprocess.Popen([py_exec, '%s/src/bin/get_md5.py'%Environment.get_install_dir(), path], shell=False, stdout=subprocess.PIPE)
-        popen.wait()
-        output = ''
-        value = popen.communicate()
-        if value:
-            output = value[0].strip()
-            if not output:
-                err = value[1]
-                print(err)
-
-        return output.decode()
+        '''get the checksum of a file with the algorithm of the check-in
+        config, which is md5 by default'''
+        checksum = Checksum.get_checksum(path)
+        if not checksum:
+            return ''
+        return checksum
 
     get_md5 = staticmethod(get_md5)
 
@@ -12,9 +12,9 @@
 
 __all__ = ["Naming", "NamingUtil", "NamingException"]
 
-import os, re
+import os, re, threading
 
-from pyasm.common import Xml, TacticException, Container, Environment, Common, Config
+from pyasm.common import Xml, TacticException, Container, Environment, Common, Config, LRUCache
 from pyasm.search import *
 
 from .project import Project
@@ -25,10 +25,29 @@ class NamingException(TacticException):
     pass
 
 
+# parsed naming templates shared by all threads
+TEMPLATE_CACHE = LRUCache(size=1000)
+
+
 class Naming(SObject):
 
     SEARCH_TYPE = "config/naming"
 
+    # key of the cache of the naming index of each site and project
+    INDEX_KEY = "Naming:index"
+
+    # marks a naming that has not been looked up yet
+    UNRESOLVED = object()
+
+    VERSIONLESS_MODES = ['', 'latest', 'current']
+
+    STATS = {
+        'lookups': 0,
+        'resolved': 0,
+        'builds': 0,
+    }
+    STATS_LOCK = threading.Lock()
+
     # Commenting this out.  File names can be anything.  We cannot and should
     # not enforce what people think are correct file names for whatever
     # purpose they happen to need it for.
@@ -75,6 +94,124 @@ class Naming(SObject):
     get_by_search_type = staticmethod(get_by_search_type)
 
 
+    def _get_index(cls):
+        '''get the index of the namings of the current site and project.
+        The namings are grouped by the search type, snapshot type, context
+        and versionless mode that they match.  The index is shared by all
+        of the threads of this process.  It is cleared when a naming
+        changes and again when that transaction ends, so that an index
+        built by another thread in the meantime is not kept'''
+        from pyasm.biz import CacheContainer, CustomCache
+        from pyasm.security import Site
+
+        index_cache = CacheContainer.get(cls.INDEX_KEY)
+        if index_cache == None:
+            index_cache = CustomCache(key=cls.INDEX_KEY, action=dict)
+            from pyasm.command import ClearCacheTrigger
+            ClearCacheTrigger.register(cls.INDEX_KEY, ['config/naming'])
+
+        key = (Site.get_site(), Project.get_project_code())
+
+        # hold on to the dictionary.  If the index is invalidated while it
+        # is built, the stale index is stored in the discarded dictionary
+        caches = index_cache.caches
+        index = caches.get(key)
+        if index != None:
+            return index
+
+        cls._add_stats('builds')
+
+        try:
+            search = Search(Naming)
+            namings = search.get_sobjects()
+        except SearchException as e:
+            # it is possible that there is no naming table
+            # in this project.  This is possible if the datbase
+            # is just a resource
+            if str(e).find("does not exist for database"):
+                namings = []
+            else:
+                raise
+
+        index = cls._build_index(namings)
+        caches[key] = index
+        return index
+    _get_index = classmethod(_get_index)
+
+
+    def _build_index(cls, namings):
+        return {
+            'keys': dict( [(x, cls._build_keys(namings, x)) for x in cls.VERSIONLESS_MODES] ),
+            # the namings found for each lookup which had no conditions
+            'resolved': {},
+        }
+    _build_index = classmethod(_build_index)
+
+
+    def _build_keys(cls, namings, versionless):
+        naming_dict = {}
+        for naming in namings:
+            # depending on whether the snapshot is latest or current
+            # switch which column we are looking at
+            n_versionless = ''
+            latest = naming.get_value("latest_versionless",no_exception=True)
+            current = naming.get_value("current_versionless",no_exception=True)
+
+            if versionless == 'latest':
+                if latest == True:
+                    n_versionless = 'latest'
+            elif versionless == 'current':
+                if current == True:
+                    n_versionless = 'current'
+            else:
+                if latest == True or current == True:
+                    n_versionless = "XXX"
+            
+            n_search_type = naming.get_value("search_type")
+            n_snapshot_type = naming.get_value("snapshot_type")
+            n_context = naming.get_value("context")
+            key = "|".join( [n_search_type.strip(), n_snapshot_type.strip(), n_context.strip(), str(n_versionless)])
+            naming_list = naming_dict.get(key)
+            if naming_list == None:
+                naming_list = []
+                naming_dict[key] = naming_list
+
+            naming_list.append(naming)
+
+        return naming_dict
+    _build_keys = classmethod(_build_keys)
+
+
+    def clear_index(cls, notify=False):
+        '''clear the naming index of this process.  If notify is True,
+        the other processes clear their index as well'''
+        from pyasm.command import ClearCacheTrigger
+        ClearCacheTrigger.clear_cache(cls.INDEX_KEY, notify=notify)
+    clear_index = classmethod(clear_index)
+
+
+    def get_stats(cls):
+        '''get the number of lookups that scanned the index, the lookups
+        which were already resolved and the number of times the index
+        was built'''
+        cls.STATS_LOCK.acquire()
+        try:
+            return cls.STATS.copy()
+        finally:
+            cls.STATS_LOCK.release()
+    get_stats = classmethod(get_stats)
+
+
+    def _add_stats(cls, name):
+        cls.STATS_LOCK.acquire()
+        try:
+            cls.STATS[name] += 1
+        finally:
+            cls.STATS_LOCK.release()
+    _add_stats = classmethod(_add_stats)
+
+
+
     def has_versionless(cls, sobject, snapshot, versionless=''):
         '''check to see if a naming is defined''' 
         return cls.get(sobject, snapshot, versionless, mode='check') != None
@@ -100,65 +237,9 @@ class Naming(SObject):
             else:
                 versionless = ''
 
-        # get the project of the sobject
-        project_code = sobject.get_project_code()
-
-        if versionless:
-            cache_key = "Naming:cache:%s:%s" % (project_code, versionless)
-        else:
-            cache_key = "Naming:cache:%s" % project_code
-
-        naming_dict = Container.get(cache_key)
-        if naming_dict == None:
-
-            naming_dict = {}
-            Container.put(cache_key, naming_dict)
-            namings = Container.get("Naming:namings")
-            if namings == None:
-                try:
-                    search = Search(Naming)
-                    namings = search.get_sobjects()
-                except SearchException as e:
-                    # it is possible that there is no naming table
-                    # in this project.  This is possible if the datbase
-                    # is just a resource
-                    if str(e).find("does not exist for database"):
-                        namings = {}
-                    else:
-                        raise
-                Container.put("Naming:namings", namings)
+        index = Naming._get_index()
+        naming_dict = index.get('keys').get(versionless) or {}
 
-            for naming in namings:
-                # depending on whether the snapshot is latest or current
-                # switch which column we are looking at
-                n_versionless = ''
-                latest = naming.get_value("latest_versionless",no_exception=True)
-                current = naming.get_value("current_versionless",no_exception=True)
-
-                if versionless == 'latest':
-                    if latest == True:
-                        n_versionless = 'latest'
-                elif versionless == 'current':
-                    if current == True:
-                        n_versionless = 'current'
-                else:
-                    if latest == True or current == True:
-                        n_versionless = "XXX"
-                
-                n_search_type = naming.get_value("search_type")
-                n_snapshot_type = naming.get_value("snapshot_type")
-                n_context = naming.get_value("context")
-                key = "|".join( [n_search_type.strip(), n_snapshot_type.strip(), n_context.strip(), str(n_versionless)])
-                #key = "|".join( [n_search_type.strip(), n_snapshot_type.strip(), n_context.strip()])
-                naming_list = naming_dict.get(key)
-                if naming_list == None:
-                    naming_list = []
-                    naming_dict[key] = naming_list
-
-                naming_list.append(naming)
-
-                #naming_dict[key] = naming
-        
         # build the key
         search_type = sobject.get_base_search_type()
         snapshot_type = 'file'
@@ -187,9 +268,24 @@ class Naming(SObject):
             context_list.append('')
 
 
+        # namings without conditions are the same for every sobject, so
+        # they are only found once
+        if mode == 'check' or snapshot_version in [-1, 0]:
+            keys_mode = 'check'
+        else:
+            keys_mode = 'find'
+        resolved_key = (search_type, snapshot_type, tuple(context_list), versionless, keys_mode)
+        resolved = index.get('resolved')
+        naming = resolved.get(resolved_key, Naming.UNRESOLVED)
+        if naming is not Naming.UNRESOLVED:
+            Naming._add_stats('resolved')
+            return naming
+
+        Naming._add_stats('lookups')
+
         # get the keys to look for
         keys = []
-        if mode == 'check' or snapshot_version in [-1, 0]:
+        if keys_mode == 'check':
             for context in context_list:
                 keys.append("%s|%s|%s|%s" % (search_type, snapshot_type, context, versionless ) )
                 keys.append("%s||%s|%s" % (search_type,  context, versionless ) )
@@ -219,6 +315,8 @@ class Naming(SObject):
             keys.append("")
 
         naming = None
+        # set when the naming depends on the sobject
+        has_condition = False
         
         from pyasm.biz import ExpressionParser
         xp = ExpressionParser()
@@ -249,9 +347,11 @@ class Naming(SObject):
                     if not expr:
                         default_naming = tmp_naming
                    
-                    elif xp.eval(expr, sobject, env_sobjects=env_sobjects, vars=vars):
-                        naming = tmp_naming
-                        break
+                    else:
+                        has_condition = True
+                        if xp.eval(expr, sobject, env_sobjects=env_sobjects, vars=vars):
+                            naming = tmp_naming
+                            break
 
                 else:
                     # this extra check of not naming is for precaution 
@@ -259,6 +359,9 @@ class Naming(SObject):
                         naming = default_naming
                         break
 
+        if not has_condition:
+            resolved[resolved_key] = naming
+
         return naming
 
     get = staticmethod(get)
@@ -271,6 +374,41 @@ class Naming(SObject):
 class NamingUtil(object):
     '''Interface to simply specifying naming convention'''
 
+    TEMPLATE_PATTERN = re.compile(r'{(.*?)}')
+
+    def compile_template(cls, template):
+        '''parse the parts of a template.  Each part is returned as a tuple
+        of (part, object, attr, index).  The object is "@" for expressions
+        and None for implicit declarations'''
+        parts = TEMPLATE_CACHE.get(template)
+        if parts != None:
+            return parts
+
+        parts = []
+        for part in cls.TEMPLATE_PATTERN.findall(template):
+            index = -1
+            if part.startswith(("@","$")):
+                parts.append( (part, "@", None, index) )
+                continue
+
+            if part.find(".") != -1:
+                # explict declarations
+                object, attr = part.split(".")
+            else:
+                # use implicit declarations
+                object, attr = None, part
+
+            if attr.endswith(']'):
+                # ugly, but it works
+                attr, index = attr.split("[")
+                index = int(index.rstrip("]"))
+
+            parts.append( (part, object, attr, index) )
+
+        TEMPLATE_CACHE.put(template, parts)
+        return parts
+    compile_template = classmethod(compile_template)
+
 
     #
     # try a new naming language which makes use of simple expression language
@@ -293,9 +431,7 @@ class NamingUtil(object):
         project = sobject.get_project()
 
         # parse the pattern string
-        expression = re.compile(r'{(.*?)}')
-        #expression = re.compile(r'{([\w|\.|\#]+\[?\d?\]?)}')
-        temp_list = expression.findall(template)
+        temp_list = self.compile_template(template)
 
         result = template
         from pyasm.biz import ExpressionParser
@@ -360,23 +496,15 @@ class NamingUtil(object):
         vars = {'EXT': value, 'BASEFILE': base}
 
 
-        for part in temp_list:
-            index = -1
-            if part.startswith(("@","$")):
+        for part, object, attr, index in temp_list:
+            if object == "@":
                 env_sobjects = {
                     'snapshot': snapshot,
                     'file': file
                 }
                 value = xp.eval("{%s}" % part, sobject, env_sobjects=env_sobjects, vars=vars, single=True)
-            elif part.find(".") != -1:
+            elif object != None:
                 # explict declarations
-                object, attr = part.split(".")
-                
-                if attr.endswith(']'):
-                    # ugly, but it works
-                    attr, index = attr.split("[")
-                    index = int(index.rstrip("]"))
-
                 if object == "sobject":
                     value = sobject.get_value(attr)
                 elif object == "snapshot":
@@ -415,14 +543,6 @@ class NamingUtil(object):
 
             else:
                 # use implicit declarations
-                attr = part
-
-                
-                if attr.endswith(']'):
-                    # ugly, but it works
-                    attr, index = attr.split("[")
-                    index = int(index.rstrip("]"))    
-
                 if attr in ["context","process","snapshot_type"]:
                     value = snapshot.get_value(attr)
                 elif attr == "version":
@@ -541,8 +661,7 @@ class NamingUtil(object):
         project = sobject.get_project()
 
         # parse the pattern string
-        expression = re.compile(r'{(.*?)}')
-        temp_list = expression.findall(template)
+        temp_list = self.compile_template(template)
 
 
         from pyasm.biz import ExpressionParser
@@ -579,25 +698,16 @@ class NamingUtil(object):
         # use simplified expressions
         result = template
 
-        for part in temp_list:
-             
-            index = -1
-
-            if part.startswith(("@","$")):
+        for part, object, attr, index in temp_list:
+            if object == "@":
                 env_sobjects = {
                     'snapshot': snapshot,
                     'file': file
                 }
                 value = xp.eval("{%s}" % part, sobject, env_sobjects=env_sobjects, single=True, use_cache=False)
             
-            elif part.find(".") != -1:
+            elif object != None:
                 # explict declarasions
-                object, attr = part.split(".")
-                
-                if attr.endswith(']'):
-                    # ugly, but it works
-                    attr, index = attr.split("[")
-                    index = int(index.rstrip("]"))
                 if object == "sobject":
                     if attr == "timestamp":
                         value = self._get_timestamp(sobject)
@@ -648,12 +758,6 @@ class NamingUtil(object):
 
             else:
                 # use implicit declarations
-                attr = part
-                if attr.endswith(']'):
-                    # ugly, but it works
-                    attr, index = attr.split("[")
-                    index = int(index.rstrip("]"))
-                
                 if attr in ['context','process','snapshot_type','version','revision'] \
                     and not snapshot:
                     continue
@@ -186,6 +186,7 @@ class NamingTest(unittest.TestCase):
             self._test_get_naming()
             self._test_checkin_type()
             self._test_naming_util()
+            self._test_naming_index()
         finally:
             self.transaction.rollback()
             Project.set_project('unittest')
@@ -219,6 +220,80 @@ class NamingTest(unittest.TestCase):
         Container.put("Naming:cache:unittest:current", None)
         Container.put("Naming:cache:unittest", None)
         Container.put("Naming:namings", None)
+        Naming.clear_index()
+
+    def _test_naming_index(self):
+        # templates are parsed once
+        naming_util = NamingUtil()
+        parts = naming_util.compile_template("{$PROJECT}/{context[0]}/{sobject.code}_{snapshot.version}")
+        self.assertEqual(("$PROJECT", "@", None, -1), parts[0])
+        self.assertEqual(("context[0]", None, "context", 0), parts[1])
+        self.assertEqual(("sobject.code", "sobject", "code", -1), parts[2])
+        self.assertEqual(parts, naming_util.compile_template("{$PROJECT}/{context[0]}/{sobject.code}_{snapshot.version}"))
+
+        self.clear_naming()
+
+        naming = SearchType.create('config/naming')
+        naming.set_value('search_type', 'unittest/person')
+        naming.set_value('snapshot_type', 'file')
+        naming.set_value('context', 'index_test')
+        naming.set_value('dir_naming', '{project.code}/index_test/{sobject.code}')
+        naming.set_value('file_naming', '{sobject.code}_v{version}.{ext}')
+        naming.commit()
+
+        naming2 = SearchType.create('config/naming')
+        naming2.set_value('search_type', 'unittest/person')
+        naming2.set_value('snapshot_type', 'file')
+        naming2.set_value('context', 'index_cond_test')
+        naming2.set_value('condition', "@GET(.name_first) == 'Philip'")
+        naming2.set_value('dir_naming', '{project.code}/index_cond_test/{sobject.code}')
+        naming2.set_value('file_naming', '{sobject.code}_v{version}.{ext}')
+        naming2.commit()
+
+        # the index is cleared again once the transaction ends
+        buffer = self.transaction.commit_buffers.get("ClearCacheTrigger") or []
+        self.assertEqual(True, Naming.INDEX_KEY in buffer)
+        buffer = self.transaction.rollback_buffers.get("ClearCacheTrigger") or []
+        self.assertEqual(True, Naming.INDEX_KEY in buffer)
+
+        self.clear_naming()
+
+        virtual_snapshot = Snapshot.create_new()
+        virtual_snapshot.set_value("context", "index_test")
+        virtual_snapshot.set_value("snapshot_type", 'file')
+        virtual_snapshot.set_sobject(self.person)
+        virtual_snapshot.set_value("version", 3)
+
+        # the second lookup without a condition is already resolved
+        stats = Naming.get_stats()
+        found = Naming.get(self.person, virtual_snapshot)
+        self.assertEqual(naming.get_code(), found.get_code())
+        found = Naming.get(self.person, virtual_snapshot)
+        self.assertEqual(naming.get_code(), found.get_code())
+        self.assertEqual(stats.get('resolved') + 1, Naming.get_stats().get('resolved'))
+
+        # conditions are evaluated for each sobject
+        virtual_snapshot.set_value("context", "index_cond_test")
+        for i in range(2):
+            found = Naming.get(self.person, virtual_snapshot)
+            self.assertEqual(naming2.get_code(), found.get_code())
+
+        person2 = SearchType.create('unittest/person')
+        person2.set_value("name_first", "Other")
+        found = Naming.get(person2, virtual_snapshot)
+        self.assertNotEqual(naming2.get_code(), found and found.get_code())
+
+        # the index is rebuilt after it is cleared
+        naming.delete()
+        self.clear_naming()
+        virtual_snapshot.set_value("context", "index_test")
+        found = Naming.get(self.person, virtual_snapshot)
+        self.assertNotEqual(naming.get_code(), found and found.get_code())
+
+        naming2.delete()
+        self.clear_naming()
+
+
 
     def _test_naming_util(self):
        
@@ -817,6 +892,7 @@ class NamingTest(unittest.TestCase):
         Container.put("Naming:cache:latest", None)
         Container.put("Naming:cache:current", None)
         Container.put("Naming:namings", None)
+        Naming.clear_index()
         name = Naming.get(sobject, virtual_snapshot)
         self.assertEqual(name.get_value('dir_naming'), '{project.code}/cut/{sobject.code}')
 
@@ -0,0 +1,299 @@
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['SnapshotPathResolver']
+
+import os
+
+import six
+
+from pyasm.common import Xml
+from pyasm.search import Search
+from .project import Project
+from .dir_naming import DirNaming
+from .snapshot import Snapshot
+
+
+class SnapshotPathResolver(object):
+    '''Finds the paths of the files of many snapshots at once.
+
+    The file objects of all of the snapshots are found with one search and
+    the parents with one search for each search type.  Files which have a
+    recorded relative dir only need the base dir of the repository, which
+    is found once for each protocol, alias and search type.  Everything
+    else goes through the dir naming of the project, as it does for a
+    single snapshot.
+
+    The paths are the same as the ones from Snapshot.get_all_lib_paths()
+    and Snapshot.get_all_paths_dict().
+    '''
+
+    # snapshot mode: dir naming protocol
+    PROTOCOLS = {
+        'lib': 'file',
+        'repo': 'file',
+        'client_repo': 'client_lib',
+        'sandbox': 'sandbox',
+        'local_repo': 'local_repo',
+        'web': 'http',
+        'browser': 'http',
+        'relative': 'relative',
+    }
+
+    def __init__(self, snapshots):
+        self.snapshots = [x for x in snapshots if x]
+
+        self.files_dict = None
+        self.parents = None
+        self.base_dirs = {}
+
+
+    def get_file_objects(self):
+        '''get all of the file objects of the snapshots by code'''
+        if self.files_dict != None:
+            return self.files_dict
+
+        file_codes = set()
+        for snapshot in self.snapshots:
+            xml = snapshot.get_snapshot_xml()
+            for node in xml.get_nodes("snapshot//file"):
+                file_code = Xml.get_attribute(node, "file_code")
+                if file_code:
+                    file_codes.add(file_code)
+
+        self.files_dict = {}
+        if file_codes:
+            search = Search("sthpw/file")
+            search.add_filters("code", list(file_codes))
+            for file_object in search.get_sobjects():
+                self.files_dict[file_object.get_value("code")] = file_object
+
+        # each snapshot keeps the file objects it has, so that the methods
+        # of the snapshot do not search again
+        for snapshot in self.snapshots:
+            if snapshot.files_dict == None:
+                snapshot.files_dict = self.files_dict
+
+        return self.files_dict
+
+
+    def get_parent(self, snapshot):
+        '''get the sobject of a snapshot.  Returns None if it does not exist'''
+        if self.parents == None:
+            self._find_parents()
+        return self.parents.get(self._get_parent_key(snapshot))
+
+
+    def _get_parent_key(self, snapshot):
+        search_code = snapshot.get_value("search_code", no_exception=True)
+        if search_code and isinstance(search_code, six.string_types):
+            return (snapshot.get_value("search_type"), 'code', search_code)
+        return (snapshot.get_value("search_type"), 'id', snapshot.get_value("search_id", no_exception=True))
+
+
+    def _find_parents(self):
+        self.parents = {}
+
+        keys_by_type = {}
+        for snapshot in self.snapshots:
+            key = self._get_parent_key(snapshot)
+            if not key[0]:
+                continue
+            keys_by_type.setdefault(key[0], set()).add(key)
+
+        for search_type, keys in keys_by_type.items():
+            codes = [x[2] for x in keys if x[1] == 'code']
+            ids = [x[2] for x in keys if x[1] == 'id' and x[2]]
+            if not codes and not ids:
+                continue
+
+            try:
+                search = Search(search_type)
+            except Exception as e:
+                print("WARNING: cannot search [%s]: %s" % (search_type, e))
+                continue
+
+            search.set_show_retired(True)
+            if codes and ids:
+                search.add_op("begin")
+                search.add_filters("code", codes)
+                search.add_filters("id", ids)
+                search.add_op("or")
+            elif codes:
+                search.add_filters("code", codes)
+            else:
+                search.add_filters("id", ids)
+
+            for parent in search.get_sobjects():
+                if parent.has_value("code"):
+                    self.parents[(search_type, 'code', parent.get_value("code"))] = parent
+                self.parents[(search_type, 'id', parent.get_id())] = parent
+
+
+
+    def get_dir(self, snapshot, mode, file_type='main', file_object=None, use_naming=True):
+        '''get the dir of a file in the snapshot for a given mode'''
+        protocol = self.PROTOCOLS.get(mode)
+        if not protocol:
+            return ''
+
+        parent = self.get_parent(snapshot)
+        if not parent:
+            # let the snapshot report the missing sobject
+            return snapshot.get_dir(mode, file_type=file_type, file_object=file_object)
+
+        # the recorded dir of the file makes the naming unnecessary.  This
+        # follows DirNaming._get_recorded_dir()
+        if file_object:
+            relative_dir = file_object.get_value("relative_dir")
+            if relative_dir and (protocol != 'sandbox' or not use_naming):
+                base_dir = self.get_base_dir(parent, snapshot, protocol, file_object)
+                if base_dir != None:
+                    return '/'.join(base_dir + [relative_dir])
+            elif not use_naming:
+                checkin_dir = file_object.get_value("checkin_dir")
+                if checkin_dir:
+                    return checkin_dir
+
+        # the sandbox is always found with the naming
+        if protocol == 'sandbox':
+            file_object = None
+
+        return Project._get_dir(protocol, parent, snapshot, file_type, file_object=file_object)
+
+
+    def get_base_dir(self, parent, snapshot, protocol, file_object):
+        '''get the base dir of the repository for a protocol.  Returns None
+        if the dir naming of the project has its own way of finding dirs'''
+        alias = None
+        if protocol in ['file', 'http']:
+            alias = file_object.get_value("base_dir_alias")
+        if not alias:
+            alias = "default"
+
+        search_type = parent.get_search_type()
+        key = (protocol, alias, search_type)
+        if key in self.base_dirs:
+            return self.base_dirs.get(key)
+
+        dir_naming = Project.get_dir_naming(parent)
+        get_dir = six.get_unbound_function(dir_naming.__class__.get_dir)
+        if get_dir is not six.get_unbound_function(DirNaming.get_dir):
+            base_dir = None
+        else:
+            dir_naming.set_sobject(parent)
+            dir_naming.set_snapshot(snapshot)
+            dir_naming.set_protocol(protocol)
+            base_dir = dir_naming.get_base_dir(alias=alias)
+
+        self.base_dirs[key] = base_dir
+        return base_dir
+
+
+
+    def get_all_lib_paths(self, snapshot, mode='lib', expand_paths=False, filename_mode=None, exclude_file_types=[]):
+        '''get the paths of a snapshot.  See Snapshot.get_all_lib_paths()'''
+        assert mode in ['lib', 'client_repo', 'sandbox', 'local_repo', 'web', 'relative', 'browser']
+
+        files_dict = self.get_file_objects()
+        xml = snapshot.get_snapshot_xml()
+
+        paths = []
+        for node in xml.get_nodes("snapshot/file"):
+            file_type = Xml.get_attribute(node, "type")
+            file_code = Xml.get_attribute(node, "file_code")
+            if not file_type:
+                file_type = 'main'
+
+            if file_type in exclude_file_types:
+                continue
+
+            file_object = files_dict.get(file_code)
+            # may have been deleted
+            if not file_object:
+                continue
+
+            use_naming = Xml.get_attribute(node, "use_naming") not in ["false"]
+            dir = self.get_dir(snapshot, mode, file_type=file_type, file_object=file_object, use_naming=use_naming)
+
+            base_type = file_object.get_value("base_type")
+            if expand_paths and base_type == "sequence":
+                file_names = snapshot.get_expanded_file_names(file_type)
+
+            elif expand_paths and base_type == 'directory':
+                repo_dir = self.get_dir(snapshot, "repo", file_type=file_type, file_object=file_object, use_naming=use_naming)
+                file_name = Snapshot._get_file_name(node)
+                repo_dir = "%s/%s" % (repo_dir, file_name)
+                file_names = [file_name]
+                if os.path.isdir(repo_dir):
+                    for new_name in os.listdir(repo_dir):
+                        file_names.append("%s/%s" % (file_name, new_name))
+
+            elif filename_mode == 'source':
+                basename = os.path.basename(file_object.get_value("source_path"))
+                parts = snapshot.get_value("context").split("/")
+                rel_dir = "/".join(parts[1:-1])
+                file_names = ["%s/%s" % (rel_dir, basename)]
+
+            else:
+                file_names = [Snapshot._get_file_name(node)]
+
+            for file_name in file_names:
+                paths.append("%s/%s" % (dir, file_name))
+
+        return paths
+
+
+    def get_all_paths_dict(self, snapshot, mode='lib'):
+        '''get the paths of a snapshot by file type.  See
+        Snapshot.get_all_paths_dict()'''
+        files_dict = self.get_file_objects()
+        xml = snapshot.get_snapshot_xml()
+        nodes = xml.get_nodes("snapshot/file")
+
+        file_objects = []
+        for node in nodes:
+            file_object = files_dict.get(Xml.get_attribute(node, "file_code"))
+            if not file_object:
+                print("ERROR: number of nodes does not match number of file objects for snapshot[%s]" % snapshot.get_code())
+                return {}
+            file_objects.append(file_object)
+
+        paths = {}
+        for node, file_object in zip(nodes, file_objects):
+            file_type = Xml.get_attribute(node, "type")
+            if not file_type:
+                file_type = 'main'
+
+            use_naming = Xml.get_attribute(node, "use_naming") not in ["false"]
+            dir = self.get_dir(snapshot, mode, file_type=file_type, file_object=file_object, use_naming=use_naming)
+            file_name = Snapshot._get_file_name(node)
+
+            paths.setdefault(file_type, []).append("%s/%s" % (dir, file_name))
+
+        return paths
+
+
+    def get_paths_dicts(self, modes=['lib']):
+        '''get the paths dict of every snapshot for each of the modes:
+            { snapshot_code: { mode: { file_type: [paths] } } }
+        '''
+        results = {}
+        for snapshot in self.snapshots:
+            snapshot_paths = {}
+            for mode in modes:
+                snapshot_paths[mode] = self.get_all_paths_dict(snapshot, mode)
+            results[snapshot.get_code()] = snapshot_paths
+        return results
+
+
+
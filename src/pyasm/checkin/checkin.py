@@ -116,6 +116,9 @@ class BaseCheckin(Command):
         # check lock
         self.check_lock()
 
+        # add up the time spent calculating checksums of this check-in
+        Checksum.reset_stats()
+
         # create files to be checked in
         self.files = self.create_files()
 
@@ -151,6 +154,8 @@ class BaseCheckin(Command):
         # handle all system commands
         self.handle_system_commands(self.files, self.file_objects)
 
+        self.info['checksum'] = Checksum.get_stats()
+
 
         # make sure everything is commited
         if self.ingest_mode == "ingestX":
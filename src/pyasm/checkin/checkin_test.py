@@ -22,7 +22,7 @@ from pyasm.command import Command, UndoCmd
 from pyasm.search import Transaction, SearchType, Search
 from pyasm.security import Batch
 from pyasm.checkin import *
-from pyasm.biz import File, FileGroup, Project, FileRange, Snapshot, Naming
+from pyasm.biz import File, FileGroup, Project, FileRange, Snapshot, Naming, SnapshotPathResolver
 
 from pyasm.unittest import UnittestEnvironment
 
@@ -80,6 +80,7 @@ class CheckinTest(unittest.TestCase, Command):
         self._test_groupcheckin()
         self._test_inplace_checkin()
         self._test_preallocation_checkin()
+        self._test_path_resolver()
         self._test_get_children()
         self._test_file_owner()
 
@@ -106,6 +107,7 @@ class CheckinTest(unittest.TestCase, Command):
         Container.put("Naming:cache:unittest:current", None)
         Container.put("Naming:cache:unittest", None)
         Container.put("Naming:namings", None)
+        Naming.clear_index()
 
     def _test_copycheckin(self):
 
@@ -348,6 +350,26 @@ class CheckinTest(unittest.TestCase, Command):
         
 
 
+    def _test_path_resolver(self):
+        '''the paths found for many snapshots at once are the same as the
+        ones found for each snapshot'''
+        search = Search("sthpw/snapshot")
+        search.add_parent_filter(self.person)
+        snapshots = search.get_sobjects()
+        self.assertEqual(True, len(snapshots) > 0)
+
+        resolver = SnapshotPathResolver(snapshots)
+        for snapshot in snapshots:
+            for mode in ['lib', 'client_repo', 'web', 'relative']:
+                self.assertEqual(snapshot.get_all_lib_paths(mode=mode), resolver.get_all_lib_paths(snapshot, mode=mode))
+                self.assertEqual(snapshot.get_all_paths_dict(mode=mode), resolver.get_all_paths_dict(snapshot, mode=mode))
+
+        paths_dicts = resolver.get_paths_dicts(['lib', 'web'])
+        snapshot = snapshots[0]
+        self.assertEqual(snapshot.get_all_paths_dict(mode='web'), paths_dicts.get(snapshot.get_code()).get('web'))
+
+
+
     def _test_get_children(self):
         '''
         Test to make sure get_all_children is able to get all the snapshots
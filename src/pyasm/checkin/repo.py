@@ -14,9 +14,8 @@ __all__ = ["BaseRepo", "TacticRepo"]
 
 import os, sys, re
 
-from pyasm.common import Environment, System
-from pyasm.biz import File
-from pyasm.search import FileUndo
+from pyasm.common import Environment, System, Config, Checksum
+from pyasm.search import FileUndo, Search
 from .checkin import CheckinException
 
 class BaseRepo(object):
@@ -33,6 +32,9 @@ class BaseRepo(object):
 
 class TacticRepo(BaseRepo):
 
+    # number of files with the same checksum and size that are checked
+    DEDUP_CANDIDATES = 5
+
     def handle_system_commands(self, snapshot, files, file_objects, mode, md5s, source_paths=[], file_sizes=[], commit=False):
         '''move the tmp files in the appropriate directory'''
 
@@ -49,6 +51,7 @@ class TacticRepo(BaseRepo):
         # inplace mode does not move the file.  It just registers the file
         # object
         if mode == 'inplace':
+            to_paths = []
             for i, file in enumerate(files):
                 file_object = file_objects[i]
                 to_name = file_object.get_full_file_name()
@@ -58,22 +61,25 @@ class TacticRepo(BaseRepo):
                 #file_type = snapshot.get_type_by_file_name(to_name)
                 #file_object.set_value('type', file_type)
 
+                to_paths.append(to_path)
 
-                if not os.path.isdir(to_path):
-                    md5_checksum = None
-                    if md5s:
-                        md5_checksum = md5s[i]
-                    if not md5_checksum:
-                        md5_checksum = File.get_md5(to_path)
-
-                    if md5_checksum:
-                        file_object.set_value("md5", md5_checksum)
+            self.set_checksums(file_objects, to_paths, md5s)
 
-                if commit:
+            if commit:
+                for file_object in file_objects:
                     file_object.commit(triggers="none")
             return
             
    
+        # files which are already in the repository are linked instead
+        # of copied.  This needs the checksums of all the files
+        dedup_mode = self.get_dedup_mode()
+        if dedup_mode and md5s == "ignore":
+            md5s = []
+
+        to_paths = []
+        # checksums calculated while copying the files
+        copy_checksums = {}
         for i, file in enumerate(files):
 
             file_object = file_objects[i]
@@ -108,8 +114,26 @@ class TacticRepo(BaseRepo):
                 if mode in ['preallocate']:
                     io_action = False
 
+                checksum = None
+                if dedup_mode and mode in ['move', 'copy', 'create']:
+                    if mode == 'create':
+                        src_path = files[i]
+                    else:
+                        src_path = source_paths[i]
+                    md5 = None
+                    if md5s:
+                        md5 = md5s[i]
+                    checksum = self.link_duplicate(src_path, to_path, md5, dedup_mode)
+
+                if checksum:
+                    copy_checksums[i] = checksum
+                    # the source is used up as it would be by a move
+                    if mode == 'move':
+                        FileUndo.remove( source_paths[i] )
+                    elif mode == 'create':
+                        FileUndo.remove( files[i] )
                 
-                if mode == 'move':
+                elif mode == 'move':
                     FileUndo.move( source_paths[i], to_path )
                 #elif mode == 'copy': # was free_copy
                    
@@ -130,7 +154,9 @@ class TacticRepo(BaseRepo):
                     file_name = to_name
                     rel_path = "%s/%s" % (rel_dir, file_name)
 
-                    FileUndo.create( src_path, to_path, io_action=io_action, extra={ "md5": md5, "st_size": st_size, "rel_path": rel_path } )
+                    checksum = FileUndo.create( src_path, to_path, io_action=io_action, extra={ "md5": md5, "st_size": st_size, "rel_path": rel_path } )
+                    if checksum:
+                        copy_checksums[i] = checksum
 
 
             except IOError as e:
@@ -145,18 +171,117 @@ class TacticRepo(BaseRepo):
                 (files[i], to_path) )
 
             file_object.set_value('type', file_type)
-            if md5s != "ignore" and not os.path.isdir(to_path):
-                md5_checksum = None
-                if md5s:
-                    md5_checksum = md5s[i]
-                if not md5_checksum:
-                    md5_checksum = File.get_md5(to_path)
-                    #md5_checksum = ""
+            to_paths.append(to_path)
 
-                if md5_checksum:
-                    file_object.set_value("md5", md5_checksum)
 
-            if commit:
+        if md5s != "ignore":
+            self.set_checksums(file_objects, to_paths, md5s, copy_checksums)
+
+        if commit:
+            for file_object in file_objects:
                 file_object.commit(triggers="none")
-            
+
+
+
+    def set_checksums(self, file_objects, to_paths, md5s, copy_checksums={}):
+        '''set the checksums of the files in the repo.  The checksums given
+        by the client are used first, then the ones calculated while copying.
+        The rest are calculated in parallel'''
+        checksums = [None] * len(file_objects)
+        missing = []
+        for i, to_path in enumerate(to_paths):
+            if os.path.isdir(to_path):
+                continue
+
+            checksum = None
+            if md5s:
+                checksum = md5s[i]
+            if not checksum:
+                checksum = copy_checksums.get(i)
+            if checksum:
+                checksums[i] = checksum
+            else:
+                missing.append(i)
+
+        if missing:
+            values = Checksum.get_checksums([to_paths[i] for i in missing])
+            for i, checksum in zip(missing, values):
+                checksums[i] = checksum
+
+        for i, checksum in enumerate(checksums):
+            if checksum:
+                file_objects[i].set_value("md5", checksum)
+
+
+
+    def get_dedup_mode(self):
+        '''get how files which are already in the repository are added:
+            "" - copied or moved (default)
+            hardlink - hardlinked to the existing file
+            reflink - cloned from the existing file (btrfs, xfs)
+        This is the "dedup_mode" value of the "checkin" config'''
+        dedup_mode = Config.get_value("checkin", "dedup_mode")
+        if dedup_mode not in ['hardlink', 'reflink']:
+            return ""
+        return dedup_mode
+
+
+
+    def link_duplicate(self, src_path, to_path, checksum=None, dedup_mode='hardlink'):
+        '''link the to path to a file in the repository with the same
+        checksum and size as the src path.  Returns the checksum if the
+        link was made'''
+        if os.path.islink(src_path) or not os.path.isfile(src_path):
+            return None
+
+        size = os.path.getsize(src_path)
+        if not size:
+            return None
+
+        if not checksum:
+            checksum = Checksum.get_checksum(src_path)
+            if not checksum:
+                return None
+
+        path = self.find_duplicate(checksum, size)
+        if not path:
+            return None
+
+        FileUndo.link(path, to_path, dedup_mode)
+        return checksum
+
+
+
+    def find_duplicate(self, checksum, size):
+        '''find a file in the repository with this checksum and size.  This
+        uses the index on the md5 and st_size columns of sthpw/file'''
+        search = Search("sthpw/file")
+        search.add_filter("md5", checksum)
+        search.add_filter("st_size", size)
+        search.add_order_by("id")
+        search.set_limit(self.DEDUP_CANDIDATES)
+        file_objects = search.get_sobjects()
+
+        asset_dir = Environment.get_asset_dir()
+        if not asset_dir.endswith("/"):
+            asset_dir = "%s/" % asset_dir
+
+        for file_object in file_objects:
+            checkin_dir = file_object.get_value("checkin_dir")
+            if not checkin_dir:
+                continue
+
+            # inplace files can be changed outside of the repository
+            path = "%s/%s" % (checkin_dir, file_object.get_value("file_name"))
+            if not path.startswith(asset_dir):
+                continue
+
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            if os.path.getsize(path) != size:
+                continue
+            return path
+
+        return None
+
 
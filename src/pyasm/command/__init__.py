@@ -12,6 +12,7 @@
 
 
 from .file_upload import *
+from .upload_session import *
 from .command import *
 from .delete_cmd import *
 from .sign_out_cmd import *
@@ -36,6 +37,7 @@ from .database_cmd import *
 from .workflow import *
 
 from .subprocess_trigger import *
+from .async_trigger import *
 
 from .site_upgrade import *
 
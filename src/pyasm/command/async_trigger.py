@@ -0,0 +1,355 @@
+############################################################
+#
+#    Copyright (c) 2008, Southpaw Technology
+#                        All Rights Reserved
+#
+#    PROPRIETARY INFORMATION.  This software is proprietary to
+#    Southpaw Technology, and is not to be reproduced, transmitted,
+#    or disclosed in any way without written permission.
+#
+#
+'''Executes non-blocking triggers in a pool of threads of this process
+instead of starting a new interpreter for each trigger.'''
+
+__all__ = ['AsyncTriggerExecutor']
+
+import tacticenv
+
+import sys, time, threading, traceback
+
+from pyasm.common import Config, jsonloads, jsondumps
+from pyasm.security import Site
+
+from six.moves import queue as six_queue
+
+
+
+class AsyncTriggerExecutor(object):
+    '''Bounded pool of threads which run non-blocking triggers.
+
+    Triggers waiting to run for the same class and sobject are coalesced
+    into one call.  When the queue is full, the trigger is added to the
+    sthpw/queue table instead so that it is not lost.
+
+    The pool is configured in the "services" config:
+        trigger_executor - "thread" (default) or "subprocess"
+        trigger_workers - number of threads.  Default 4
+        trigger_queue_size - number of waiting triggers.  Default 1000
+    '''
+
+    INSTANCE = None
+    LOCK = threading.Lock()
+
+    # number of times a trigger is run if its environment cannot be set up
+    MAX_ATTEMPTS = 3
+    RETRY_INTERVAL = 2
+
+    def __init__(self, workers=None, queue_size=None):
+        if not workers:
+            workers = Config.get_value("services", "trigger_workers") or 4
+        if not queue_size:
+            queue_size = Config.get_value("services", "trigger_queue_size") or 1000
+
+        self.num_workers = int(workers)
+        self.queue_size = int(queue_size)
+
+        self.queue = six_queue.Queue()
+
+        # entries waiting to be run by coalesce key
+        self.pending = {}
+        # entries waiting for a retry
+        self.delayed = []
+        self.lock = threading.Lock()
+
+        self.threads = []
+
+        self.stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'completed': 0,
+            'errors': 0,
+            'retries': 0,
+            'spilled': 0,
+        }
+
+
+    def get(cls):
+        '''get the executor of this process'''
+        if cls.INSTANCE:
+            return cls.INSTANCE
+
+        cls.LOCK.acquire()
+        try:
+            if not cls.INSTANCE:
+                cls.INSTANCE = cls()
+        finally:
+            cls.LOCK.release()
+        return cls.INSTANCE
+    get = classmethod(get)
+
+
+    def is_enabled(cls):
+        mode = Config.get_value("services", "trigger_executor")
+        return mode != "subprocess"
+    is_enabled = classmethod(is_enabled)
+
+
+    def get_size(self):
+        return len(self.pending) + len(self.delayed)
+
+
+    def get_coalesce_key(self, data, input_data):
+        '''get the key used to combine waiting calls of the same trigger.
+        Returns None if the call cannot be combined with others'''
+        kwargs = data.get("kwargs") or {}
+        if kwargs.get("coalesce") in [False, 'false']:
+            return None
+
+        sobject = input_data.get("sobject")
+        if not sobject:
+            return None
+        search_key = sobject.get("__search_key__")
+        if not search_key:
+            return None
+
+        # inserts and deletes always run
+        mode = input_data.get("mode")
+        if mode in ['insert', 'delete', 'retire']:
+            return None
+
+        return (data.get("class_name"), jsondumps(kwargs), input_data.get("event"), input_data.get("process"), mode, search_key)
+
+
+    def submit(self, data, input_data):
+        '''add a trigger to be run.  The data and input data are the same
+        as the ones sent to a separate process by the SubprocessTrigger'''
+        self.start()
+
+        # copy the data so that it is not changed after it is submitted
+        data = jsonloads(jsondumps(data))
+        input_data = jsonloads(jsondumps(input_data))
+
+        if not data.get("site"):
+            site = Site.get_site()
+            if site:
+                data['site'] = site
+
+        entry = {
+            'data': data,
+            'input_data': input_data,
+            'attempts': 0,
+            'ready_time': 0,
+        }
+
+        key = self.get_coalesce_key(data, input_data)
+
+        self.lock.acquire()
+        try:
+            self.stats['submitted'] += 1
+
+            if key:
+                waiting = self.pending.get(key)
+                if waiting:
+                    self._coalesce(waiting, entry)
+                    self.stats['coalesced'] += 1
+                    return True
+
+            if self.get_size() >= self.queue_size:
+                spill = True
+            else:
+                spill = False
+                entry['key'] = key
+                if key:
+                    self.pending[key] = entry
+                else:
+                    self.pending[id(entry)] = entry
+        finally:
+            self.lock.release()
+
+        if spill:
+            # too many triggers waiting, so store it in the database
+            self.spill(entry)
+            return False
+
+        self.queue.put(entry)
+        return True
+
+
+    def _coalesce(self, waiting, entry):
+        '''combine a new call with a waiting one.  The latest sobject is used
+        and the changed values of both calls are kept'''
+        old_input = waiting['input_data']
+        new_input = entry['input_data']
+
+        update_data = old_input.get("update_data")
+        if isinstance(update_data, dict) and isinstance(new_input.get("update_data"), dict):
+            update_data = update_data.copy()
+            update_data.update(new_input.get("update_data"))
+            new_input['update_data'] = update_data
+
+        # keep the values from before the first change
+        if "prev_data" in old_input:
+            new_input['prev_data'] = old_input.get("prev_data")
+
+        waiting['input_data'] = new_input
+        waiting['data'] = entry['data']
+
+
+    def spill(self, entry):
+        '''add the trigger to the sthpw/queue table'''
+        self.lock.acquire()
+        try:
+            self.stats['spilled'] += 1
+        finally:
+            self.lock.release()
+
+        data = entry['data']
+        kwargs = data.get("kwargs") or {}
+
+        from tactic.command import Queue
+        Queue.add("pyasm.command.QueueTrigger", {
+                'input_data': entry['input_data'],
+                'data': data,
+            },
+            queue_type=kwargs.get("trigger") or "trigger",
+            priority=kwargs.get("priority") or 99999,
+            description=kwargs.get("description") or "Trigger",
+        )
+
+
+    def start(self):
+        '''start the threads of the pool if they are not running'''
+        if len(self.threads) >= self.num_workers:
+            return
+
+        self.lock.acquire()
+        try:
+            self.threads = [x for x in self.threads if x.is_alive()]
+            while len(self.threads) < self.num_workers:
+                thread = threading.Thread(target=self.run_worker)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        finally:
+            self.lock.release()
+
+
+    def run_worker(self):
+        '''main loop of a thread of the pool'''
+        while True:
+            try:
+                entry = self.queue.get(timeout=1)
+            except six_queue.Empty:
+                self._requeue_delayed()
+                continue
+
+            self._requeue_delayed()
+
+            # no longer waiting, so calls from here on are not combined
+            self.lock.acquire()
+            try:
+                key = entry.get('key') or id(entry)
+                if self.pending.get(key) is entry:
+                    del(self.pending[key])
+            finally:
+                self.lock.release()
+
+            try:
+                self.execute(entry)
+
+            except Exception as e:
+                self._retry(entry, e)
+
+            finally:
+                from pyasm.search import DbContainer
+                DbContainer.release_thread_sql()
+
+
+    def execute(self, entry):
+        '''run a single trigger in this thread'''
+        from pyasm.security import Batch
+        from pyasm.biz import Project
+        from .workflow import Workflow
+        from .subprocess_trigger import ScriptTrigger
+
+        # each trigger starts with a clean environment and runs as the
+        # batch user, as it would in a new process
+        data = entry['data']
+        Batch(site=data.get("site"), project_code=data.get("project"))
+        Project.set_project(data.get("project"))
+        Workflow().init(quiet=True)
+
+        trigger = ScriptTrigger()
+        trigger.set_data(data)
+        trigger.set_input(entry['input_data'])
+        trigger.execute()
+
+        # errors in the trigger itself are reported to the pipeline
+        # by the ScriptTrigger and are not retried
+        info = trigger.get_info()
+        self.lock.acquire()
+        try:
+            if info.get("result") == "error":
+                self.stats['errors'] += 1
+            else:
+                self.stats['completed'] += 1
+        finally:
+            self.lock.release()
+
+
+    def _retry(self, entry, e):
+        '''the environment of the trigger could not be set up'''
+        entry['attempts'] += 1
+
+        tb = sys.exc_info()[2]
+        stacktrace = traceback.format_tb(tb)
+        stacktrace_str = "".join(stacktrace)
+        print("-"*50)
+        print(stacktrace_str)
+        print(str(e))
+        print("-"*50)
+
+        self.lock.acquire()
+        try:
+            if entry['attempts'] < self.MAX_ATTEMPTS:
+                delay = self.RETRY_INTERVAL * (2 ** (entry['attempts'] - 1))
+                print("WARNING: trigger [%s] failed.  Retrying in %s seconds" % (entry['data'].get("class_name"), delay))
+                entry['ready_time'] = time.time() + delay
+                self.delayed.append(entry)
+                self.stats['retries'] += 1
+            else:
+                print("ERROR: reached max attempts for trigger [%s]" % entry['data'].get("class_name"))
+                self.stats['errors'] += 1
+        finally:
+            self.lock.release()
+
+
+    def _requeue_delayed(self):
+        if not self.delayed:
+            return
+
+        now = time.time()
+        self.lock.acquire()
+        try:
+            ready = [x for x in self.delayed if x['ready_time'] <= now]
+            self.delayed = [x for x in self.delayed if x['ready_time'] > now]
+        finally:
+            self.lock.release()
+
+        for entry in ready:
+            entry['key'] = None
+            self.queue.put(entry)
+
+
+    def get_stats(self):
+        self.lock.acquire()
+        try:
+            stats = self.stats.copy()
+            stats['waiting'] = self.get_size()
+            stats['threads'] = len([x for x in self.threads if x.is_alive()])
+        finally:
+            self.lock.release()
+        return stats
+
+
+
@@ -214,6 +214,8 @@ class CommandTest(unittest.TestCase):
 
         self._test_command()
         self._test_trigger()
+        self._test_trigger_index()
+        self._test_async_trigger()
         trigger_key = "triggers:cache"
         Container.put(trigger_key, None)
 
@@ -326,6 +328,69 @@ class CommandTest(unittest.TestCase):
 
 
 
+    def _test_trigger_index(self):
+        transaction = Transaction.get(create=True)
+        try:
+            Trigger.call(self, "test_trigger_index")
+            stats = Trigger.get_stats()
+
+            # the index is reused for the next event
+            Trigger.call(self, "test_trigger_index")
+            stats2 = Trigger.get_stats()
+            self.assertEqual(stats['hits'] + 1, stats2['hits'])
+            self.assertEqual(stats['builds'], stats2['builds'])
+
+            # a new trigger is found right away
+            trigger_sobj = SearchType.create("sthpw/trigger")
+            trigger_sobj.set_value("event", "test_trigger_index")
+            trigger_sobj.set_value("class_name", "pyasm.command.command_test.TestTrigger")
+            trigger_sobj.set_value("mode", "same process,same transaction")
+            trigger_sobj.commit()
+
+            triggers = Trigger._get_triggers( {'event': 'test_trigger_index'} )
+            self.assertEqual(1, len(triggers))
+            self.assertEqual(True, Trigger.get_stats()['builds'] > stats2['builds'])
+
+            triggers = Trigger._get_triggers( {'event': 'test_trigger_index', 'process': 'xyz'} )
+            self.assertEqual(0, len(triggers))
+
+        finally:
+            transaction = Transaction.get()
+            transaction.rollback()
+            Trigger.clear_db_cache()
+
+
+
+    def _test_async_trigger(self):
+        from .async_trigger import AsyncTriggerExecutor
+        executor = AsyncTriggerExecutor(workers=1, queue_size=10)
+
+        data = {'class_name': 'pyasm.command.command_test.TestTrigger', 'kwargs': {}}
+        input_data = {
+            'mode': 'update',
+            'sobject': {'__search_key__': 'unittest/person?project=unittest&code=p1'},
+            'update_data': {'name_first': 'a'},
+            'prev_data': {'name_first': 'x'},
+        }
+        key = executor.get_coalesce_key(data, input_data)
+        self.assertNotEqual(None, key)
+
+        # inserts are never combined
+        insert_data = input_data.copy()
+        insert_data['mode'] = 'insert'
+        self.assertEqual(None, executor.get_coalesce_key(data, insert_data))
+
+        # the changes of both calls are kept
+        waiting = {'data': data, 'input_data': input_data}
+        new_input = input_data.copy()
+        new_input['update_data'] = {'name_last': 'b'}
+        new_input['prev_data'] = {'name_first': 'a'}
+        executor._coalesce(waiting, {'data': data, 'input_data': new_input})
+        self.assertEqual({'name_first': 'a', 'name_last': 'b'}, waiting['input_data']['update_data'])
+        self.assertEqual({'name_first': 'x'}, waiting['input_data']['prev_data'])
+
+
+
     def _test_api_trigger(self):
         """
         Tests the api trigger by creating a db insert trigger and checking that api handler was executed.
@@ -16,7 +16,7 @@ import os, csv
 import re
 import unicodedata
 
-from pyasm.search import SObjectFactory, SearchType, Search, SqlException
+from pyasm.search import SObjectFactory, SObject, SearchType, Search, SqlException
 from pyasm.biz import CsvParser
 from pyasm.common import UserException, Common
 
@@ -196,6 +196,10 @@ class CsvImportCmd(Command):
         statements = []
         chunk = 100
 
+        # entries waiting to be committed in bulk
+        entries = []
+        entry_ids = set()
+
         # create entries or update values
         for row_count, row in enumerate(csv_data):
             if self.start_index and row_count < self.start_index:
@@ -211,6 +215,13 @@ class CsvImportCmd(Command):
             else:
                 id = row[id_col]
                 if id:
+                    # a previous row refers to the same entry, so it has
+                    # to be in the database before looking it up
+                    if id.strip() in entry_ids:
+                        self._commit_entries(entries, new_entries, updated_entries, error_entries)
+                        entries = []
+                        entry_ids = set()
+
                     # this essentially updates the current sobject in db
                     if self.id_col=='code':
                         sobject = Search.get_by_code(self.search_type, id.strip())
@@ -306,32 +317,28 @@ class CsvImportCmd(Command):
 
 
             else:
-                try:
-                    sobject.commit(triggers=self.triggers_mode)
-
-                    if note:
-                        note_obj = SearchType.create("sthpw/note")
-                        note_obj.set_value("note", note)
-                        note_process = self.note_processes[i]
-                        if not note_process:
-                            note_process = "publish"
-                        note_obj.set_value("process", note_process)
-                        note_obj.set_value("context", note_process)
-                        note_obj.set_user()
-                        note_obj.set_parent(sobject)
-                        note_obj.commit()
-
-                except SqlException as e:
-                    msg = "%s [%s]: %s, %s" % (self.ENTRY_ERROR_MSG, row_count, str(row), e.__str__() )
-                    if self.test_run:
-                        error = True
-                        error_entries.append(sobject.get_code())
-                    raise SqlException(msg)
-                else:
-                    if is_new_entry:
-                        new_entries.append(sobject.get_code())
-                    else:
-                        updated_entries.append(sobject.get_code())
+                note_obj = None
+                if note:
+                    note_obj = SearchType.create("sthpw/note")
+                    note_obj.set_value("note", note)
+                    note_process = self.note_processes[i]
+                    if not note_process:
+                        note_process = "publish"
+                    note_obj.set_value("process", note_process)
+                    note_obj.set_value("context", note_process)
+                    note_obj.set_user()
+
+                entries.append( (row_count, row, sobject, note_obj, is_new_entry) )
+                if id_col != -1:
+                    entry_ids.add( row[id_col].strip() )
+
+                if len(entries) >= chunk:
+                    self._commit_entries(entries, new_entries, updated_entries, error_entries)
+                    entries = []
+                    entry_ids = set()
+
+        if entries:
+            self._commit_entries(entries, new_entries, updated_entries, error_entries)
 
 
         #show 30 max
@@ -343,6 +350,40 @@ class CsvImportCmd(Command):
             self.description = "%s.\n  Updated %s %s existing entries." %(self.description,  len(updated_entries), self.search_type)
         
 
+    def _commit_entries(self, entries, new_entries, updated_entries, error_entries):
+        '''commit a chunk of imported entries in bulk'''
+        if not entries:
+            return
+
+        sobjects = [x[2] for x in entries]
+        try:
+            SObject.commit_many(sobjects, triggers=self.triggers_mode)
+
+            # notes can only be parented once the sobjects exist
+            notes = []
+            for row_count, row, sobject, note_obj, is_new_entry in entries:
+                if note_obj:
+                    note_obj.set_parent(sobject)
+                    notes.append(note_obj)
+            if notes:
+                SObject.commit_many(notes)
+
+        except SqlException as e:
+            first_row = entries[0][0]
+            last_row = entries[-1][0]
+            msg = "%s [%s-%s]: %s" % (self.ENTRY_ERROR_MSG, first_row, last_row, e.__str__() )
+            if self.test_run:
+                for sobject in sobjects:
+                    error_entries.append(sobject.get_code())
+            raise SqlException(msg)
+
+        for row_count, row, sobject, note_obj, is_new_entry in entries:
+            if is_new_entry:
+                new_entries.append(sobject.get_code())
+            else:
+                updated_entries.append(sobject.get_code())
+
+
 class SimpleCsvImportCmd(Command):
     '''This Import does not require web values'''
 
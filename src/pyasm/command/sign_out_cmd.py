@@ -75,6 +75,10 @@ class SignOutCmd(Command):
             if site:
                 Site.pop_site()
 
+        # remove the ticket from the ticket cache of all processes
+        from pyasm.biz import TicketCache
+        TicketCache.get().remove_ticket(ticket.get_value("ticket"))
+
 
 
     def check_security(self):
@@ -24,6 +24,7 @@ from tactic_client_lib.interpreter import Handler
 
 from .trigger import Trigger
 from .command import Command
+from .async_trigger import AsyncTriggerExecutor
 
 
 
@@ -85,6 +86,12 @@ class SubprocessTrigger(Handler):
 
 
 
+        elif self.mode == 'separate process,non-blocking' and AsyncTriggerExecutor.is_enabled():
+            # run in a thread of this process instead of a new interpreter
+            AsyncTriggerExecutor.get().submit(data, input_data)
+
+            result = "wait"
+
         elif self.mode == 'separate process,non-blocking':
             input_data_str = jsondumps(input_data)
             data_str = jsondumps(data)
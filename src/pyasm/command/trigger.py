@@ -15,7 +15,7 @@ from __future__ import print_function
 
 __all__ = ["TriggerException", "Trigger", "SampleTrigger", "TimedTrigger", "SampleTimedTrigger"]
 
-import sys, traceback
+import sys, time, traceback, threading
 
 from pyasm.common import *
 from pyasm.search import ExceptionLog, SearchKey
@@ -39,6 +39,15 @@ class Trigger(Command):
     NOTIFICATION_KEY = "Trigger:notifications"
     TRIGGER_EVENT_KEY = "triggers:cache"
     NOTIFICATION_EVENT_KEY = "notifications:cache"
+    INDEX_KEY = "Trigger:index"
+
+    STATS = {
+        'lookups': 0,
+        'hits': 0,
+        'builds': 0,
+    }
+    EVENT_STATS = {}
+    STATS_LOCK = threading.Lock()
 
     def __init__(self, **kwargs):
         self.caller = None
@@ -214,7 +223,11 @@ class Trigger(Command):
 
                     # triggers need to run in their own transaction when
                     # they get here.
-                    Trigger.execute_cmd(trigger, call_trigger=False)
+                    start = time.time()
+                    try:
+                        Trigger.execute_cmd(trigger, call_trigger=False)
+                    finally:
+                        cls._add_event_time(event, time.time() - start)
 
                 except Exception as e:
                     # if there is an error in calling this trigger for some
@@ -236,6 +249,137 @@ class Trigger(Command):
 
 
 
+    def _get_event_key(cls, listen_event):
+        '''get the key of an event in the dispatch index'''
+        return (
+            listen_event.get("event"),
+            listen_event.get("search_type") or None,
+            listen_event.get("process") or None,
+            listen_event.get("project_code") or None,
+        )
+    _get_event_key = classmethod(_get_event_key)
+
+
+    def _build_event_dict(cls, trigger_sobjs, use_project=False):
+        '''build a dictionary of the event key to the triggers listening
+        to that event'''
+        event_dict = {}
+        for trigger_sobj in trigger_sobjs:
+            # The value in the process column can also be the process_code.
+            listen_event = {
+                'event': trigger_sobj.get_value("event"),
+                'process': trigger_sobj.get_value("process", no_exception=True),
+                'search_type': trigger_sobj.get_value("search_type", no_exception=True),
+            }
+            # notification specific
+            if use_project:
+                listen_event['project_code'] = trigger_sobj.get_value("project_code", no_exception=True)
+
+            event_key = cls._get_event_key(listen_event)
+            trigger_list = event_dict.get(event_key)
+            if trigger_list == None:
+                trigger_list = []
+                event_dict[event_key] = trigger_list
+            trigger_list.append(trigger_sobj)
+
+        return event_dict
+    _build_event_dict = classmethod(_build_event_dict)
+
+
+    def _get_index(cls):
+        '''get the dispatch index of the triggers and notifications stored in
+        the database for the current site and project.  The index is shared by
+        all the threads of this process and is rebuilt when a trigger or a
+        notification changes'''
+        from pyasm.biz import CacheContainer, CustomCache
+        index_cache = CacheContainer.get(cls.INDEX_KEY)
+        if index_cache == None:
+            index_cache = CustomCache(key=cls.INDEX_KEY, action=dict)
+            ClearCacheTrigger.register(cls.INDEX_KEY, ['sthpw/trigger', 'config/trigger', 'sthpw/notification'])
+
+        from pyasm.biz import Project
+        site = Site.get_site()
+        project_code = Project.get_project_code()
+        key = (site, project_code)
+
+        # hold on to the dictionary.  If the index is invalidated while it
+        # is built, the stale index is stored in the discarded dictionary
+        caches = index_cache.caches
+        index = caches.get(key)
+        cls._add_stats('lookups')
+        if index != None:
+            cls._add_stats('hits')
+            return index
+
+        cls._add_stats('builds')
+
+        # make sure the triggers are searched again
+        cls._clear_db_triggers()
+        Container.put(cls.NOTIFICATION_KEY, None)
+
+        # NOTE: get_db_triggers only get triggers for this project ...
+        # need to update so that triggers from other projects
+        # are also executed
+        index = {
+            'triggers': cls._build_event_dict( cls.get_db_triggers() ),
+            'notifications': cls._build_event_dict( cls.get_notifications_by_event(), use_project=True ),
+        }
+        caches[key] = index
+        return index
+    _get_index = classmethod(_get_index)
+
+
+    def clear_index(cls, notify=False):
+        '''clear the dispatch index of this process.  If notify is True,
+        the other processes clear their index as well'''
+        ClearCacheTrigger.clear_cache(cls.INDEX_KEY, notify=notify)
+    clear_index = classmethod(clear_index)
+
+
+    def get_stats(cls):
+        '''get the counters of the dispatch index and, for each event, the
+        number of triggers executed and the time spent executing them'''
+        cls.STATS_LOCK.acquire()
+        try:
+            stats = cls.STATS.copy()
+            events = {}
+            for event, event_stats in cls.EVENT_STATS.items():
+                event_stats = event_stats.copy()
+                event_stats['avg_time'] = event_stats['time'] / event_stats['count']
+                events[event] = event_stats
+        finally:
+            cls.STATS_LOCK.release()
+        stats['events'] = events
+        return stats
+    get_stats = classmethod(get_stats)
+
+
+    def _add_stats(cls, name):
+        cls.STATS_LOCK.acquire()
+        try:
+            cls.STATS[name] += 1
+        finally:
+            cls.STATS_LOCK.release()
+    _add_stats = classmethod(_add_stats)
+
+
+    def _add_event_time(cls, event, seconds):
+        cls.STATS_LOCK.acquire()
+        try:
+            event_stats = cls.EVENT_STATS.get(event)
+            if event_stats == None:
+                event_stats = {'count': 0, 'time': 0.0, 'max_time': 0.0}
+                cls.EVENT_STATS[event] = event_stats
+            event_stats['count'] += 1
+            event_stats['time'] += seconds
+            if seconds > event_stats['max_time']:
+                event_stats['max_time'] = seconds
+        finally:
+            cls.STATS_LOCK.release()
+    _add_event_time = classmethod(_add_event_time)
+
+
+
     def _get_triggers(cls, call_event, integral_only=False, project_code=None):
 
         if integral_only:
@@ -243,152 +387,75 @@ class Trigger(Command):
         else:
             trigger_key = cls.TRIGGER_EVENT_KEY
 
-        notification_key = cls.NOTIFICATION_EVENT_KEY 
-        trigger_dict = Container.get(trigger_key)
-        notification_dict = Container.get(notification_key)
-      
-        call_event_key = jsondumps(call_event)
+        index = cls._get_index()
 
-        # NOTE: get_db_triggers only get triggers for this project ...
-        # need to update so that triggers from other projects
-        # are also executed
+        call_event_key = cls._get_event_key(call_event)
 
-        # static triggers could grow when more sTypes are searched
+        # static triggers could grow when more sTypes are searched.  These
+        # and the integral triggers are indexed for each request
+        trigger_dict = Container.get(trigger_key)
         last_static_count = Container.get(cls.STATIC_TRIGGER_COUNT)
         static_trigger_sobjs = cls.get_static_triggers()
         current_static_count = len(static_trigger_sobjs)
         renew = last_static_count != current_static_count and not integral_only
 
         if trigger_dict == None or renew:
-            # assign keys to each trigger
-            trigger_dict = {}
-            Container.put(trigger_key, trigger_dict)
-            
             if integral_only:
                 # just get all the integral triggers
                 trigger_sobjs = cls.get_integral_triggers()
             else:
-
-                # build a list of site and db of the triggers for current
-                # project
-                trigger_sobjs = cls.get_db_triggers()
+                trigger_sobjs = []
 
                 # append all static triggers
                 if static_trigger_sobjs:
                     Container.put(cls.STATIC_TRIGGER_COUNT, current_static_count)
                     trigger_sobjs.extend(static_trigger_sobjs)
-                
-            
+
                 # append all integral triggers
                 integral_trigger_sobjs = cls.get_integral_triggers()
                 if integral_trigger_sobjs:
                     trigger_sobjs.extend(integral_trigger_sobjs)
 
+            trigger_dict = cls._build_event_dict(trigger_sobjs)
+            Container.put(trigger_key, trigger_dict)
 
-                # append all notifications
-                
-                #notification_sobjs = cls.get_notifications_by_event()
-                #trigger_sobjs.extend(notification_sobjs)
-
-
-            for trigger_sobj in trigger_sobjs:
-                trigger_event = trigger_sobj.get_value("event")
-
-                # The value in the process column can also be the process_code.
-                trigger_process = trigger_sobj.get_value("process")
-                trigger_stype = trigger_sobj.get_value("search_type", no_exception=True)
-
-                listen_event = {}
-                listen_event['event'] = trigger_event
-                if trigger_process:
-                    listen_event['process'] = trigger_process
-                if trigger_stype:
-                    listen_event['search_type'] = trigger_stype
-
-                listen_key = jsondumps(listen_event)
-
-                trigger_list = trigger_dict.get(listen_key)
-                if trigger_list == None:
-                    trigger_list = []
-                    trigger_dict[listen_key] = trigger_list
 
-                trigger_list.append(trigger_sobj)
+        combined_triggers = []
+        if not integral_only:
+            called_triggers = index['triggers'].get(call_event_key)
+            if called_triggers:
+                combined_triggers.extend(called_triggers)
 
         called_triggers = trigger_dict.get(call_event_key)
+        if called_triggers:
+            combined_triggers.extend(called_triggers)
 
 
-        # assign keys to each notification
-        if notification_dict == None:
-            notification_dict = {}
-            Container.put(notification_key, notification_dict)
-
-            # append all notifications without going thru all the logics with project_code
-            notification_sobjs = cls.get_notifications_by_event()
-            
-            for trigger_sobj in notification_sobjs:
-                trigger_event = trigger_sobj.get_value("event")
-                trigger_process = trigger_sobj.get_value("process")
-                trigger_stype = trigger_sobj.get_value("search_type", no_exception=True)
-                trigger_project = trigger_sobj.get_value("project_code", no_exception=True)
-
-                listen_event = {}
-                listen_event['event'] = trigger_event
-                if trigger_process:
-                    listen_event['process'] = trigger_process
-                if trigger_stype:
-                    listen_event['search_type'] = trigger_stype
-                # notification specific
-                if trigger_project:
-                    listen_event['project_code'] = trigger_project
-
-                listen_key = jsondumps(listen_event)
-
-                notification_list = notification_dict.get(listen_key)
-                if notification_list == None:
-                    notification_list = []
-                    notification_dict[listen_key] = notification_list
-
-                notification_list.append(trigger_sobj)
-       
-       
-       
         # we have to call with and without project_code to cover both cases
-        key2 = call_event.copy()
-       
         if not project_code:
             from pyasm.biz import Project
             project_code = Project.get_project_code()
 
-        key2['project_code'] =  project_code
-      
-        
-        
-
+        call_event_key2 = call_event_key[:3] + (project_code,)
 
-        call_event_key2 = jsondumps(key2)
-        matched_notifications = []
-        for call_event_key in [call_event_key, call_event_key2]:
-            matched = notification_dict.get(call_event_key)
+        notification_dict = index['notifications']
+        for event_key in [call_event_key, call_event_key2]:
+            matched = notification_dict.get(event_key)
             if matched:
-                matched_notifications.extend(matched)
-
-      
-      
+                combined_triggers.extend(matched)
 
-
-        combined_triggers = []
-        if called_triggers:
-            combined_triggers.extend(called_triggers)
-        if matched_notifications:
-            combined_triggers.extend(matched_notifications)
-        
-        
         return combined_triggers
 
     _get_triggers = classmethod(_get_triggers)
 
 
     def clear_db_cache(cls):
+        cls._clear_db_triggers()
+        cls.clear_index()
+    clear_db_cache = classmethod(clear_db_cache)
+
+
+    def _clear_db_triggers(cls):
         Container.put(cls.KEY, None)
 
         site = Site.get_site()
@@ -397,7 +464,7 @@ class Trigger(Command):
         project_code = Project.get_project_code()
         key = "%s:%s:%s" % (cls.KEY, project_code, site)
         Container.put(key, None)
-    clear_db_cache = classmethod(clear_db_cache)
+    _clear_db_triggers = classmethod(_clear_db_triggers)
 
     def get_db_triggers(cls):
 
@@ -592,6 +659,7 @@ class Trigger(Command):
                 continue
 
             # otherwise call the trigger immediately
+            start = time.time()
             try:
                 ret_val = trigger.execute()
                 trigger.set_ret_val(ret_val)
@@ -616,6 +684,8 @@ class Trigger(Command):
 
                     Container.put("Trigger:error_reported", True)
                 raise
+            finally:
+                cls._add_event_time(event, time.time() - start)
            
 
         return triggers
@@ -925,17 +995,113 @@ class SnapshotIsLatestTrigger(Trigger):
 
 
 
+__all__.append('ClearCacheTrigger')
+class ClearCacheTrigger(Trigger):
+    '''clears a process wide CustomCache when the sobjects it is built from
+    change.  The key of the cache is the "cache_key" in the data of the
+    trigger.  The other processes clear their cache through the cache bus'''
+
+    REGISTERED = set()
+    REGISTER_LOCK = threading.Lock()
+
+    def get_title(self):
+        return "Clear Cache"
+
+    def execute(self):
+        data = self.get_trigger_sobj().get_value("data")
+        if isinstance(data, six.string_types):
+            data = jsonloads(data)
+        key = data.get("cache_key")
+
+        # the cache is cleared now so that this thread sees its own changes
+        self.clear_cache(key)
+
+        # other threads may rebuild the cache from the rows committed
+        # before this transaction, so it is cleared again once the
+        # transaction ends and the other processes are only told if it
+        # is committed
+        from pyasm.search import Transaction
+        transaction = Transaction.get()
+        if transaction and transaction.is_in_transaction():
+            buffer = transaction.get_commit_buffer(self.__class__.__name__, self._clear_committed)
+            if key not in buffer:
+                buffer.append(key)
+            buffer = transaction.get_rollback_buffer(self.__class__.__name__, self._clear_rolled_back)
+            if key not in buffer:
+                buffer.append(key)
+        else:
+            self.clear_cache(key, notify=True)
+
+
+    def _clear_committed(cls, keys):
+        for key in keys:
+            cls.clear_cache(key, notify=True)
+    _clear_committed = classmethod(_clear_committed)
+
+
+    def _clear_rolled_back(cls, keys):
+        for key in keys:
+            cls.clear_cache(key)
+    _clear_rolled_back = classmethod(_clear_rolled_back)
+
+
+    def clear_cache(cls, key, notify=False):
+        '''clear the cache of this process.  If notify is True, the other
+        processes clear their cache as well'''
+        from pyasm.biz import CacheContainer
+        cache = CacheContainer.get(key)
+        if cache == None:
+            return
+
+        cache.init_cache()
+        if notify:
+            cache.make_dirty()
+    clear_cache = classmethod(clear_cache)
+
+
+    def register(cls, key, search_types):
+        '''add integral triggers which clear the cache when any of the
+        search types change.  The triggers of a cache are only added once'''
+        cls.REGISTER_LOCK.acquire()
+        try:
+            if key in cls.REGISTERED:
+                return
+            cls.REGISTERED.add(key)
+        finally:
+            cls.REGISTER_LOCK.release()
+
+        from pyasm.search import SearchType
+        for search_type in search_types:
+            trigger = SearchType.create("sthpw/trigger")
+            trigger.set_value("event", "change|%s" % search_type)
+            trigger.set_value("class_name", "pyasm.command.trigger.ClearCacheTrigger")
+            trigger.set_value("mode", "same process,same transaction")
+            trigger.set_value("data", jsondumps({'cache_key': key}))
+            Trigger.append_integral_trigger(trigger, startup=True)
+    register = classmethod(register)
+
+
+
 __all__.append('SearchTypeCacheTrigger')
 from tactic_client_lib.interpreter import Handler
 class SearchTypeCacheTrigger(Handler):
 
     def execute(self):
-        from pyasm.biz import CacheContainer
-        print("running cache trigger")
+        from pyasm.biz import CacheContainer, SearchTypeCache
         search_type = self.input.get("search_type")
         assert search_type
         cache = CacheContainer.get(search_type)
-        cache.make_dirty()
+        if not cache:
+            return
+
+        # only the changed row has to be refreshed
+        id = self.input.get("id")
+        if id:
+            if isinstance(cache, SearchTypeCache):
+                cache.update_sobjects([id])
+            cache.make_dirty(ids=[id])
+        else:
+            cache.make_dirty()
 
 
 
@@ -953,8 +1119,6 @@ class SampleTrigger(Trigger):
     
 
 
-import time
-
 class TimedTrigger(Base):
 
     def __init__(self):
@@ -0,0 +1,269 @@
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ["UploadSession", "UploadSessionException"]
+
+import os, re, shutil
+
+from pyasm.common import Environment, TacticException, Common, Checksum, jsonloads, jsondumps
+
+
+class UploadSessionException(TacticException):
+    pass
+
+
+class UploadSession(object):
+    '''A resumable upload of a single file sent in chunks.
+
+    The server assigns an upload id when the session is started.  Each
+    chunk is sent with the offset it is written at and the checksum of its
+    data, so chunks can arrive in any order and from many connections at
+    once.  A chunk is only recorded once its checksum has been verified and
+    the received ranges can be asked for at any time, so an interrupted
+    upload only needs to send the ranges which are missing.  When all of
+    the data has arrived, the checksum of the whole file is verified and
+    the file is moved into the upload dir, where it is found by the
+    checkin commands as any other uploaded file.
+
+    A session is kept on disk in the upload dir of the ticket:
+        .sessions/<upload_id>/session.json - file name, size and algorithm
+        .sessions/<upload_id>/data - the file, allocated to its full size
+        .sessions/<upload_id>/chunks/<offset> - size and checksum of a chunk
+    '''
+
+    SESSION_DIR = ".sessions"
+
+    # suggested chunk size for clients
+    CHUNK_SIZE = 8*1024*1024
+
+    # a chunk is held in memory while it is verified
+    MAX_CHUNK_SIZE = 64*1024*1024
+
+    ALGORITHMS = ['md5', 'blake2b', 'xxh128', 'sha1', 'sha256']
+
+    ID_PATTERN = re.compile(r'^[0-9a-zA-Z]+$')
+
+
+    def __init__(self, upload_id, ticket=None):
+        if not upload_id or not self.ID_PATTERN.match(upload_id):
+            raise UploadSessionException("Invalid upload id [%s]" % upload_id)
+
+        self.upload_id = upload_id
+        self.upload_dir = Environment.get_upload_dir(ticket)
+        self.session_dir = "%s/%s/%s" % (self.upload_dir, self.SESSION_DIR, upload_id)
+        self.info = None
+
+
+    def get_upload_id(self):
+        return self.upload_id
+
+    def get_data_path(self):
+        return "%s/data" % self.session_dir
+
+    def get_chunk_dir(self):
+        return "%s/chunks" % self.session_dir
+
+    def get_info_path(self):
+        return "%s/session.json" % self.session_dir
+
+
+    def get_info(self):
+        if self.info == None:
+            path = self.get_info_path()
+            if not os.path.exists(path):
+                raise UploadSessionException("Upload [%s] does not exist" % self.upload_id)
+            f = open(path, 'r')
+            try:
+                self.info = jsonloads(f.read())
+            finally:
+                f.close()
+        return self.info
+
+
+
+    def create(cls, file_name, size, subdir=None, algorithm=None, ticket=None):
+        '''start a new upload session for a file of a given size'''
+        file_name = file_name.replace("\\", "/")
+        file_name = os.path.basename(file_name)
+        if not file_name or file_name in ['.', '..']:
+            raise UploadSessionException("Invalid file name [%s]" % file_name)
+
+        size = int(size)
+        if size < 0:
+            raise UploadSessionException("Invalid size [%s]" % size)
+
+        if subdir:
+            subdir = subdir.replace("\\", "/").strip("/")
+            if '..' in subdir.split("/"):
+                raise UploadSessionException("Invalid subdir [%s]" % subdir)
+
+        if not algorithm:
+            algorithm = Checksum.get_algorithm()
+        if algorithm not in cls.ALGORITHMS:
+            raise UploadSessionException("Checksum algorithm [%s] not supported" % algorithm)
+        # make sure the algorithm is available in this process
+        Checksum.get_hash(algorithm)
+
+        upload_id = Common.generate_random_key(digits=32)
+        session = cls(upload_id, ticket=ticket)
+        os.makedirs(session.get_chunk_dir())
+
+        # allocate the file so that chunks can be written at any offset
+        f = open(session.get_data_path(), 'wb')
+        try:
+            f.truncate(size)
+        finally:
+            f.close()
+
+        session.info = {
+            'upload_id': upload_id,
+            'file_name': file_name,
+            'subdir': subdir or '',
+            'size': size,
+            'algorithm': algorithm,
+        }
+        f = open(session.get_info_path(), 'w')
+        try:
+            f.write(jsondumps(session.info))
+        finally:
+            f.close()
+
+        return session
+    create = classmethod(create)
+
+
+
+    def write_chunk(self, offset, data, checksum=None):
+        '''write a chunk of data at an offset.  The data can be a string
+        or a file object.  If a checksum is given, the chunk is only
+        written if the checksum of the data matches'''
+        info = self.get_info()
+        offset = int(offset)
+
+        if not isinstance(data, bytes):
+            data = data.read(self.MAX_CHUNK_SIZE + 1)
+        length = len(data)
+
+        if length > self.MAX_CHUNK_SIZE:
+            raise UploadSessionException("Chunk of upload [%s] is larger than [%s] bytes" % (self.upload_id, self.MAX_CHUNK_SIZE))
+        if offset < 0 or offset + length > info.get('size'):
+            raise UploadSessionException("Chunk at [%s] with [%s] bytes is outside of upload [%s]" % (offset, length, self.upload_id))
+
+        m = Checksum.get_hash(info.get('algorithm'))
+        m.update(data)
+        data_checksum = m.hexdigest()
+        if checksum and checksum != data_checksum:
+            raise UploadSessionException("Checksum of chunk at [%s] of upload [%s] does not match" % (offset, self.upload_id))
+
+        f = open(self.get_data_path(), 'r+b')
+        try:
+            f.seek(offset)
+            f.write(data)
+        finally:
+            f.close()
+
+        # record the chunk in one rename so that a status request never
+        # sees a partial record
+        chunk_path = "%s/%s" % (self.get_chunk_dir(), offset)
+        tmp_path = "%s.%s" % (chunk_path, Common.generate_random_key())
+        f = open(tmp_path, 'w')
+        try:
+            f.write("%s %s" % (length, data_checksum))
+        finally:
+            f.close()
+        os.rename(tmp_path, chunk_path)
+
+        return data_checksum
+
+
+
+    def get_received(self):
+        '''get the ranges of data which have been received as a sorted
+        list of [start, end]'''
+        chunks = []
+        for name in os.listdir(self.get_chunk_dir()):
+            if not name.isdigit():
+                continue
+            f = open("%s/%s" % (self.get_chunk_dir(), name), 'r')
+            try:
+                length = int(f.read().split(" ")[0])
+            finally:
+                f.close()
+            chunks.append( (int(name), length) )
+        chunks.sort()
+
+        ranges = []
+        for offset, length in chunks:
+            end = offset + length
+            if ranges and offset <= ranges[-1][1]:
+                if end > ranges[-1][1]:
+                    ranges[-1][1] = end
+            else:
+                ranges.append([offset, end])
+        return ranges
+
+
+    def get_status(self):
+        info = self.get_info()
+        received = self.get_received()
+        received_size = sum([x[1] - x[0] for x in received])
+        return {
+            'upload_id': self.upload_id,
+            'file_name': info.get('file_name'),
+            'size': info.get('size'),
+            'algorithm': info.get('algorithm'),
+            'chunk_size': self.CHUNK_SIZE,
+            'received': received,
+            'received_size': received_size,
+            'complete': received_size == info.get('size'),
+        }
+
+
+
+    def finish(self, checksum=None):
+        '''verify the file and move it into the upload dir.  Returns the
+        path of the uploaded file'''
+        info = self.get_info()
+        status = self.get_status()
+        if not status.get('complete'):
+            raise UploadSessionException("Upload [%s] is incomplete: [%s] of [%s] bytes received" % (self.upload_id, status.get('received_size'), info.get('size')))
+
+        data_path = self.get_data_path()
+        if checksum:
+            data_checksum = Checksum.get_checksum(data_path, info.get('algorithm'))
+            if checksum != data_checksum:
+                raise UploadSessionException("Checksum of upload [%s] does not match" % self.upload_id)
+
+        if info.get('subdir'):
+            to_dir = "%s/%s" % (self.upload_dir, info.get('subdir'))
+        else:
+            to_dir = self.upload_dir
+        if not os.path.exists(to_dir):
+            os.makedirs(to_dir)
+
+        to_path = "%s/%s" % (to_dir, info.get('file_name'))
+        if os.path.exists(to_path):
+            os.unlink(to_path)
+        shutil.move(data_path, to_path)
+
+        self.abort()
+        return to_path
+
+
+    def abort(self):
+        '''remove the session and all of the data received'''
+        if os.path.exists(self.session_dir):
+            shutil.rmtree(self.session_dir)
+
+
+
+
@@ -34,6 +34,7 @@ except:
 
 
 from .system import *
+from .checksum import *
 from .watch_folder import *
 
 from .js_wrapper import *
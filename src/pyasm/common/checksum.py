@@ -0,0 +1,238 @@
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['Checksum']
+
+import os, shutil, hashlib, threading, time
+
+from .container import Container
+from .config import Config
+
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+
+class Checksum(object):
+    '''Calculates the checksums of files in this process.
+
+    The algorithm is set with the "checksum_algorithm" value of the
+    "checkin" config:
+        md5 - default
+        blake2b - 128 bit blake2b, faster than md5 on 64 bit machines
+        xxh128 - 128 bit xxhash, much faster.  Requires the xxhash module
+    All of them produce 32 characters so that they fit in the md5 column
+    of sthpw/file.  Clients that compare checksums with the server must
+    use the same algorithm.
+
+    The time spent and the bytes read are added up for the current request
+    and can be read with get_stats().
+    '''
+
+    CHUNK_SIZE = 1024*1024
+
+    # files smaller than this are not worth a thread
+    MIN_PARALLEL_SIZE = 4*1024*1024
+
+    STATS_KEY = "Checksum:stats"
+
+
+    def get_algorithm(cls):
+        algorithm = Config.get_value("checkin", "checksum_algorithm")
+        if not algorithm:
+            algorithm = "md5"
+        return algorithm
+    get_algorithm = classmethod(get_algorithm)
+
+
+    def get_hash(cls, algorithm=None):
+        '''get a new hash object for an algorithm'''
+        if not algorithm:
+            algorithm = cls.get_algorithm()
+
+        if algorithm == "md5":
+            return hashlib.md5()
+        elif algorithm == "blake2b":
+            return hashlib.blake2b(digest_size=16)
+        elif algorithm == "xxh128":
+            if not HAS_XXHASH:
+                raise Exception("The xxhash module is required for checksum algorithm [xxh128]")
+            return xxhash.xxh3_128()
+        else:
+            return hashlib.new(algorithm)
+    get_hash = classmethod(get_hash)
+
+
+    def get_checksum(cls, path, algorithm=None):
+        '''get the checksum of a file.  Returns None if it cannot be read'''
+        start = time.time()
+        m = cls.get_hash(algorithm)
+        try:
+            size = cls._read(path, m)
+        except IOError as e:
+            print("WARNING: error getting checksum on [%s]: %s" % (path, e))
+            return None
+
+        cls._add_stats(1, size, time.time() - start)
+        return m.hexdigest()
+    get_checksum = classmethod(get_checksum)
+
+
+    def copy_file(cls, from_path, to_path, algorithm=None):
+        '''copy a file and return the checksum of the data, reading the
+        file only once.  The permissions are copied as with shutil.copy'''
+        if os.path.isdir(to_path):
+            to_path = os.path.join(to_path, os.path.basename(from_path))
+
+        start = time.time()
+        size = 0
+        m = cls.get_hash(algorithm)
+
+        fsrc = open(from_path, 'rb')
+        try:
+            fdst = open(to_path, 'wb')
+            try:
+                while True:
+                    chunk = fsrc.read(cls.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    m.update(chunk)
+                    fdst.write(chunk)
+            finally:
+                fdst.close()
+        finally:
+            fsrc.close()
+
+        shutil.copymode(from_path, to_path)
+
+        cls._add_stats(1, size, time.time() - start)
+        return m.hexdigest()
+    copy_file = classmethod(copy_file)
+
+
+    def get_checksums(cls, paths, algorithm=None, workers=None):
+        '''get the checksums of a list of files using a pool of threads.
+        Returns a list of checksums in the same order as the paths'''
+        if not algorithm:
+            algorithm = cls.get_algorithm()
+
+        checksums = [None] * len(paths)
+
+        # only large groups of files are worth the threads
+        total_size = 0
+        for path in paths:
+            try:
+                total_size += os.path.getsize(path)
+            except OSError:
+                pass
+
+        if not workers:
+            workers = Config.get_value("checkin", "checksum_workers") or 4
+        workers = min(int(workers), len(paths))
+
+        if workers <= 1 or total_size < cls.MIN_PARALLEL_SIZE:
+            for i, path in enumerate(paths):
+                checksums[i] = cls.get_checksum(path, algorithm)
+            return checksums
+
+        # the stats are stored per thread, so they are added up here
+        start = time.time()
+        lock = threading.Lock()
+        state = {'index': 0, 'bytes': 0}
+
+        def run():
+            while True:
+                lock.acquire()
+                try:
+                    i = state['index']
+                    state['index'] += 1
+                finally:
+                    lock.release()
+                if i >= len(paths):
+                    break
+
+                path = paths[i]
+                m = cls.get_hash(algorithm)
+                try:
+                    size = cls._read(path, m)
+                except IOError as e:
+                    print("WARNING: error getting checksum on [%s]: %s" % (path, e))
+                    continue
+                checksums[i] = m.hexdigest()
+
+                lock.acquire()
+                try:
+                    state['bytes'] += size
+                finally:
+                    lock.release()
+
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        cls._add_stats(len(paths), state['bytes'], time.time() - start)
+        return checksums
+    get_checksums = classmethod(get_checksums)
+
+
+    def _read(cls, path, m):
+        '''add the contents of a file to a hash.  Returns the size read'''
+        size = 0
+        f = open(path, 'rb')
+        try:
+            while True:
+                chunk = f.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                m.update(chunk)
+        finally:
+            f.close()
+        return size
+    _read = classmethod(_read)
+
+
+    def _add_stats(cls, files, size, duration):
+        stats = Container.get(cls.STATS_KEY)
+        if stats == None:
+            stats = cls.reset_stats()
+        stats['files'] += files
+        stats['bytes'] += size
+        stats['time'] += duration
+    _add_stats = classmethod(_add_stats)
+
+
+    def reset_stats(cls):
+        stats = {'files': 0, 'bytes': 0, 'time': 0.0}
+        Container.put(cls.STATS_KEY, stats)
+        return stats
+    reset_stats = classmethod(reset_stats)
+
+
+    def get_stats(cls):
+        '''get the number of files and bytes hashed and the time spent in
+        the current request'''
+        stats = Container.get(cls.STATS_KEY)
+        if stats == None:
+            stats = cls.reset_stats()
+        return stats.copy()
+    get_stats = classmethod(get_stats)
+
+
@@ -25,6 +25,8 @@ class CommonTest(unittest.TestCase):
         self._test_keyword_extract()
         self._test_filesystem_name()
         self._test_container()
+        self._test_lru_cache()
+        self._test_checksum()
         self._test_counter()
         self._test_xpath()
         self._test_marshalling()
@@ -136,6 +138,68 @@ class CommonTest(unittest.TestCase):
 
         self.assertEqual(value,value2)
 
+    def _test_lru_cache(self):
+        cache = LRUCache(size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+
+        # using a makes b the least recently used
+        self.assertEqual(1, cache.get("a"))
+        cache.put("c", 3)
+        self.assertEqual(None, cache.get("b"))
+        self.assertEqual(1, cache.get("a"))
+        self.assertEqual(3, cache.get("c"))
+
+        stats = cache.get_stats()
+        self.assertEqual(3, stats.get("hits"))
+        self.assertEqual(1, stats.get("misses"))
+        self.assertEqual(2, stats.get("size"))
+
+    def _test_checksum(self):
+        import hashlib, shutil, tempfile
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i in range(3):
+                path = "%s/file%s.txt" % (tmp_dir, i)
+                f = open(path, 'wb')
+                f.write(b"test" * (i+1) * 100000)
+                f.close()
+                paths.append(path)
+
+            expected = []
+            for path in paths:
+                f = open(path, 'rb')
+                expected.append(hashlib.md5(f.read()).hexdigest())
+                f.close()
+
+            Checksum.reset_stats()
+            self.assertEqual(expected[0], Checksum.get_checksum(paths[0], "md5"))
+
+            # the checksum is calculated while copying
+            copy_path = "%s/copy.txt" % tmp_dir
+            self.assertEqual(expected[1], Checksum.copy_file(paths[1], copy_path, "md5"))
+            self.assertEqual(expected[1], Checksum.get_checksum(copy_path, "md5"))
+
+            self.assertEqual(expected, Checksum.get_checksums(paths, "md5", workers=2))
+
+            # force the threads
+            min_size = Checksum.MIN_PARALLEL_SIZE
+            Checksum.MIN_PARALLEL_SIZE = 0
+            try:
+                self.assertEqual(expected, Checksum.get_checksums(paths, "md5", workers=2))
+            finally:
+                Checksum.MIN_PARALLEL_SIZE = min_size
+
+            stats = Checksum.get_stats()
+            self.assertEqual(9, stats.get("files"))
+            self.assertEqual(True, stats.get("bytes") > 0)
+
+            self.assertEqual(None, Checksum.get_checksum("%s/missing.txt" % tmp_dir))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
     def _test_counter(self):
 
         KEY = "CoreTest:counter"
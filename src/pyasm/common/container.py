@@ -11,13 +11,16 @@
 #
 
 
-__all__ = ["Container", "GlobalContainer"]
+__all__ = ["Container", "GlobalContainer", "LRUCache"]
 
 try:
     import _thread as thread
 except:
     import thread
 
+import threading
+from collections import OrderedDict
+
 
 # Get the container instance
 INSTANCES = {}              # containers separated by thread
@@ -273,3 +276,68 @@ class GlobalContainer(object):
 
 
 
+class LRUCache(object):
+    '''Process wide cache which holds at most size entries.  When full,
+    the least recently used entry is dropped.  This is shared by all
+    threads'''
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            value = self.data.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+
+            # move to the most recently used end
+            self.data[key] = value
+            self.hits += 1
+            return value
+        finally:
+            self.lock.release()
+
+
+    def put(self, key, value):
+        self.lock.acquire()
+        try:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+        finally:
+            self.lock.release()
+
+
+    def remove(self, key):
+        self.lock.acquire()
+        try:
+            self.data.pop(key, None)
+        finally:
+            self.lock.release()
+
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.data.clear()
+        finally:
+            self.lock.release()
+
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.data),
+        }
+
+
+
@@ -30,15 +30,16 @@ basestring = six.string_types
 from pyasm.common import jsonloads, jsondumps
 
 from pyasm.common import Environment, Xml, Common, Config, Container, SecurityException, SObjectSecurityException, TacticException, System
-from pyasm.command import Command, UndoCmd, RedoCmd, Trigger, CommandExitException
+from pyasm.command import Command, UndoCmd, RedoCmd, Trigger, CommandExitException, UploadSession
 from pyasm.checkin import FileCheckin, FileGroupCheckin, SnapshotBuilder, FileAppendCheckin, FileGroupAppendCheckin
-from pyasm.biz import IconCreator, Project, FileRange, Pipeline, Snapshot, DebugLog, File, FileGroup, Schema, ExpressionParser
+from pyasm.biz import IconCreator, Project, FileRange, Pipeline, Snapshot, DebugLog, File, FileGroup, Schema, ExpressionParser, SnapshotPathResolver
 from pyasm.search import *
 from pyasm.security import XmlRpcInit, XmlRpcLogin, Ticket, LicenseException, Security, Sudo
 
 from pyasm.web import WebContainer, Palette, Widget
 from pyasm.widget import WidgetConfigView
 from pyasm.web.app_server import XmlrpcServer
+from tactic_client_lib.common import ResultEncoding
 
 MAXINT = 2**31-1
 
@@ -347,6 +348,8 @@ QUERY_METHODS = {
     #'get_related_relationship': 0,
     'test_speed': 0,
     'get_upload_file_size': 0,
+    'start_upload': 0, 'upload_chunk': 0, 'get_upload_status': 0,
+    'finish_upload': 0, 'abort_upload': 0,
     'get_doc_link': 0,
     'get_interaction_count': 0,
     'get_plugin_dir': 0,
@@ -354,10 +357,19 @@ QUERY_METHODS = {
 }
 
 TRANS_OPTIONAL_METHODS = {
-    'execute_cmd': 3
+    'execute_cmd': 3,
+    'batch': 1,
 }
 
 
+# methods which cannot be called in a batch because they manage the
+# ticket or the transaction of the session
+BATCH_EXCLUDED_METHODS = set([
+    'batch', 'get_ticket', 'start', 'finish', 'abort', 'undo', 'redo',
+    'set_state', 'set_project', 'missing_method',
+])
+
+
 
 API_MODE = {
     "closed": {
@@ -372,6 +384,9 @@ API_MODE = {
 
         "simple_checkin",
         #"execute_python_script", # should this be allowed?
+
+        # each call in the batch is checked separately
+        "batch",
     },
     "query": {
         "get_by_search_key",
@@ -387,6 +402,23 @@ API_MODE = {
 } 
 
 
+def is_api_mode_allowed(method_name):
+    '''determines if the current user can call an API method in the
+    api_mode of the server'''
+    security = Environment.get_security()
+    if security.get_user_name() == "admin":
+        return True
+
+    api_mode = Environment.get_api_mode()
+    if api_mode == "open":
+        return True
+    elif api_mode == "closed":
+        return method_name in API_MODE.get("closed")
+    elif api_mode == "query":
+        return method_name in API_MODE.get("query") or method_name in API_MODE.get("closed")
+    return False
+
+
 def decode_security_key(key, security_method="api"):
     key = key.lstrip("$")
     tmp_dir = Environment.get_tmp_dir(include_ticket=True)
@@ -481,26 +513,9 @@ def xmlrpc_decorator(meth):
             if self.get_protocol() != 'local':
                 api_mode = Environment.get_api_mode()
 
-                allowed = False
-
-                security = Environment.get_security()
-                user_name = security.get_user_name()
-                
-                if user_name == "admin":
-                    allowed = True
-
-                meth_name = meth.__name__
-                if api_mode == "open":
-                    allowed = True
+                allowed = is_api_mode_allowed(meth.__name__)
 
                 if api_mode in ["closed", "query"]:
-                    if api_mode == "closed":
-                        if meth_name in API_MODE.get("closed"):
-                            allowed = True
-                    elif api_mode == "query":
-                        if meth_name in API_MODE.get("query") or meth_name in API_MODE.get("closed"):
-                            allowed = True
-
                     if not allowed:
                         if api_key:
                             if isinstance(api_key, basestring):
@@ -656,6 +671,8 @@ def xmlrpc_decorator(meth):
         return results
 
     new.exposed = True
+    # the undecorated method is used to run calls in a batch
+    new.meth = meth
     return new
 
 
@@ -753,6 +770,7 @@ class BaseApiXMLRPC(XmlrpcServer):
                 "protocol": "xmlrpc",
                 "language": "python",
                 "is_in_transaction": False,
+                "encoding": None,
                 "sobjects": [],
                 "info": {}
             }
@@ -789,6 +807,53 @@ class BaseApiXMLRPC(XmlrpcServer):
         self.set_value("sobjects", sobjects)
         #self.sobjects = sobjects
 
+
+    def set_encoding(self, encoding):
+        if encoding not in ResultEncoding.ENCODINGS:
+            encoding = None
+        self.set_value("encoding", encoding)
+
+    def get_encoding(self):
+        return self.get_value("encoding")
+
+
+    def _encode_results(self, results):
+        '''encode results for python clients which asked for an encoding
+        in the ticket.  Results with values the encoding does not support
+        are returned as they are and are sent the default way'''
+        if self.get_language() != 'python' or self.get_protocol() == 'local':
+            return results
+
+        encoding = self.get_encoding()
+        if not encoding:
+            return results
+
+        try:
+            return ResultEncoding.encode(results, encoding)
+        except (TypeError, ValueError) as e:
+            print("WARNING: cannot encode results: %s" % e)
+            return results
+
+
+    def _get_python_results(self, results):
+        '''convert results to be sent to a python client'''
+        if self.get_protocol() == 'local':
+            return results
+
+        if self.get_encoding():
+            encoded = self._encode_results(results)
+            if encoded is not results:
+                return encoded
+
+        if not Common.IS_Pv3:
+            if isinstance(results, unicode):
+                return results.encode('utf-8')
+            elif isinstance(results, basestring):
+                return unicode(results, errors='ignore').encode('utf-8')
+        # could be a list or dictionary, for quick operation, str conversion is the best
+        # for xmlrpc transfer
+        return str(results)
+
     def set_sobject(self, sobject):
         self.set_value("sobjects", [sobject])
         ##self.set_sobjects([sobject])
@@ -860,6 +925,7 @@ class BaseApiXMLRPC(XmlrpcServer):
             project_code = ticket.get("project")
             language = ticket.get("language")
             palette = ticket.get("palette")
+            encoding = ticket.get("encoding")
             ticket = ticket.get("ticket")
 
         else:
@@ -871,6 +937,7 @@ class BaseApiXMLRPC(XmlrpcServer):
             language = "python"
             palette = None
             site = None
+            encoding = None
 
 
 
@@ -903,6 +970,7 @@ class BaseApiXMLRPC(XmlrpcServer):
 
         # now that we have a container, set up the information
         self.set_language(language)
+        self.set_encoding(encoding)
         #self.set_protocol(protocol)
 
         if palette:
@@ -1176,6 +1244,9 @@ class CustomApi(BaseApiXMLRPC):
 class ApiXMLRPC(BaseApiXMLRPC):
     '''Client Api'''
 
+    # size of a page of a query using a cursor when no limit is given
+    CURSOR_PAGE_SIZE = 1000
+
     #@trace_decorator
     def get_ticket(self, login_name, password, site=None):
         '''simple test to verify that the xmlrpc connection is working
@@ -1778,6 +1849,13 @@ class ApiXMLRPC(BaseApiXMLRPC):
 
 
         data['num_database_connections'] = num_db_connections
+
+        # statistics of the global connection pools
+        data['pool_stats'] = DbContainer.get_pool_stats()
+
+        # statistics of the table metadata caches
+        from pyasm.biz import TableInfoCache
+        data['table_cache_stats'] = TableInfoCache.get_all_stats()
         data['databases'] = databases
 
         print(data)
@@ -1829,9 +1907,91 @@ class ApiXMLRPC(BaseApiXMLRPC):
 
 
     @xmlrpc_decorator
-    def query(self, ticket, search_type, filters=None, columns=None, order_bys=None, show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False, parent_key=None):
-        return self._query(search_type, filters, columns, order_bys, show_retired, limit, offset, single, distinct, return_sobjects, parent_key)
-    def _query(self, search_type, filters=None, columns=None, order_bys=None, show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False, parent_key=None):
+    def batch(self, ticket, calls, kwargs={}):
+        '''Execute a list of calls in a single request.  The calls share
+        the authentication and project of the ticket
+
+        @params
+        ticket - authentication ticket
+        calls - list of dictionaries with the "method" to call and its
+            "args", not including the ticket
+        kwargs - options:
+            use_transaction - if True (default), all the calls run in one
+                transaction which is aborted if any call fails.  If False,
+                calls which change data each run in their own transaction
+                and the errors of calls are returned with the results
+
+        @return
+        list - a dictionary for each call with a "status" of "OK" and the
+            "result" of the call, or a "status" of "ERROR" and the "error"
+        '''
+        use_transaction = kwargs.get("use_transaction") != False
+
+        # calls which change data are sent to the master server when
+        # multi-site is enabled, which cannot be done for the calls of a
+        # batch, so only queries are allowed
+        if Config.get_value("master", "enabled"):
+            for call in calls:
+                if call.get("method") not in QUERY_METHODS:
+                    raise ApiException("Method [%s] cannot be called in a batch when master is enabled" % call.get("method"))
+
+        results = []
+        for call in calls:
+            method_name = call.get("method")
+            args = call.get("args") or []
+            try:
+                meth = self._get_batch_method(method_name)
+
+                if use_transaction or method_name in QUERY_METHODS:
+                    result = exec_meth(self, ticket, meth, args)
+                else:
+                    cmd = get_full_cmd(self, meth, ticket, args)
+                    cmd.execute_cmd(cmd)
+                    result = cmd.results
+
+                results.append( {'status': 'OK', 'result': result} )
+
+            except Exception as e:
+                if use_transaction:
+                    raise
+
+                if not self.get_protocol() == "local":
+                    DbContainer.abort_thread_sql(force=True)
+
+                print("Error in batch call [%s]: %s" % (method_name, e))
+                results.append( {'status': 'ERROR', 'error': str(e)} )
+
+        return results
+
+
+    def _get_batch_method(self, method_name):
+        '''get the undecorated method for a call in a batch, checking that
+        the user is allowed to call it'''
+        if not method_name or not re.match(r"^\w+$", method_name) or method_name in BATCH_EXCLUDED_METHODS:
+            raise ApiException("Method [%s] cannot be called in a batch" % method_name)
+
+        method = getattr(self, method_name, None)
+        meth = getattr(method, "meth", None)
+        if not meth:
+            raise ApiException("Method [%s] does not exist" % method_name)
+
+        if self.get_protocol() != 'local' and not is_api_mode_allowed(method_name):
+            raise ApiException("Permission Denied [%s]" % method_name)
+
+        security = Environment.get_security()
+        if Config.get_value("security", "api_method_restricted") == "true":
+            access = security.check_access("api_method", method_name, "allow", default="allow")
+            if not access:
+                raise ApiException("Access denied")
+
+        return meth
+
+
+
+    @xmlrpc_decorator
+    def query(self, ticket, search_type, filters=None, columns=None, order_bys=None, show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False, parent_key=None, cursor=None):
+        return self._query(search_type, filters, columns, order_bys, show_retired, limit, offset, single, distinct, return_sobjects, parent_key, cursor)
+    def _query(self, search_type, filters=None, columns=None, order_bys=None, show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False, parent_key=None, cursor=None):
         '''
         General query for sobject information
 
@@ -1851,10 +2011,16 @@ class ApiXMLRPC(BaseApiXMLRPC):
         return_sobjects - return sobjects instead of dictionary.  This
                 works only when using the API on the server.
         parent_key - parent filter
+        cursor - page through the results using the position of the last
+                page instead of an offset.  Use an empty string for the
+                first page.  The limit sets the size of the page
 
         @return
         data - an array of dictionaries.  Each array item represents an sobject
                and is a dictionary of name/value pairs
+               If a cursor is given, a dictionary with the "results" of the
+               page and the "cursor" of the next page, which is None after
+               the last page
 
         @usage:
             filters = []
@@ -1888,7 +2054,16 @@ class ApiXMLRPC(BaseApiXMLRPC):
         if distinct:
             search.add_column(distinct, distinct=True)
 
-        if order_bys:
+        if cursor != None:
+            if offset or distinct or single:
+                raise ApiException("A cursor cannot be used with offset, distinct or single")
+            if not limit:
+                limit = self.CURSOR_PAGE_SIZE
+
+            search_cursor = SearchCursor(search, order_bys, filters=[filters, parent_key, show_retired])
+            search_cursor.apply(cursor)
+
+        elif order_bys:
             if isinstance(order_bys, basestring):
                 order_bys = [order_bys]
             for order_by in order_bys:
@@ -1906,9 +2081,19 @@ class ApiXMLRPC(BaseApiXMLRPC):
         if parent_key:
             search.add_parent_filter(parent_key)
 
+        # the sobjects are only read to build the dictionaries
+        if not return_sobjects:
+            search.set_compact_mode(True)
+
         #import time
         #start = time.time()
         sobjects = search.get_sobjects()
+
+        if cursor != None:
+            next_cursor = search_cursor.get_next_token(sobjects, limit)
+            if return_sobjects:
+                return {'results': sobjects, 'cursor': next_cursor}
+
         if return_sobjects:
             if single:
                 if sobjects:
@@ -1937,6 +2122,11 @@ class ApiXMLRPC(BaseApiXMLRPC):
                 result['__search_key__'] = search_keys[i]
             results.append(result)
 
+        if cursor != None:
+            if self.get_language() == 'python':
+                results = self._get_python_results(results)
+            return {'results': results, 'cursor': next_cursor}
+
         if not single:
             ret_results = results
         else:
@@ -1947,17 +2137,7 @@ class ApiXMLRPC(BaseApiXMLRPC):
                 ret_results = {}
 
         if self.get_language() == 'python':
-            if self.get_protocol() == 'local':
-                return ret_results
-            else:
-                if not Common.IS_Pv3:
-                    if isinstance(ret_results, unicode):
-                        return ret_results.encode('utf-8')
-                    elif isinstance(ret_results, basestring):
-                        return unicode(ret_results, errors='ignore').encode('utf-8')
-                # could be a list or dictionary, for quick operation, str conversion is the best
-                # for xmlrpc transfer
-                return str(ret_results)
+            return self._get_python_results(ret_results)
         else:
             return ret_results
 
@@ -2118,6 +2298,8 @@ class ApiXMLRPC(BaseApiXMLRPC):
 
         results = []
 
+        updated = []
+        updated_use_ids = []
         for idx, sobject in enumerate(sobjects):
             search_key = sobject.get_search_key(use_id=use_id_list[idx])
             sobject_data = data.get(search_key)
@@ -2126,9 +2308,14 @@ class ApiXMLRPC(BaseApiXMLRPC):
                 continue
             for key, value in sobject_data.items():
                 sobject.set_value(key, value)
-            sobject.commit(triggers=triggers)
+            updated.append(sobject)
+            updated_use_ids.append(use_id_list[idx])
+
+        # write all of the changes in bulk
+        SObject.commit_many(updated, triggers=triggers)
 
-            sobject_dict = self._get_sobject_dict(sobject, use_id=use_id_list[idx])
+        for sobject, use_id in zip(updated, updated_use_ids):
+            sobject_dict = self._get_sobject_dict(sobject, use_id=use_id)
             results.append(sobject_dict)
 
         return results
@@ -2188,13 +2375,22 @@ class ApiXMLRPC(BaseApiXMLRPC):
         results = []
         metadata_item = {}
 
+        sobjects = []
 
         # they all share the same parent_key if exists
         for idx,  data_item in enumerate(data):
             if metadata:
                 metadata_item = metadata[idx]
-                
-            result = self._insert(search_type, data_item, metadata=metadata_item, parent_key=parent_key, use_id=use_id, triggers=triggers)
+
+            sobject = self._create_insert_sobject(search_type, data_item, metadata=metadata_item, parent_key=parent_key)
+            sobjects.append(sobject)
+
+        # write all of the new sobjects in bulk
+        SObject.commit_many(sobjects, triggers=triggers)
+        self.set_sobjects(sobjects)
+
+        for sobject in sobjects:
+            result = self._get_sobject_dict(sobject, use_id=use_id)
             results.append(result)
 
         return results
@@ -2225,6 +2421,23 @@ class ApiXMLRPC(BaseApiXMLRPC):
         a single dictionary representing the sobject with it's current data
         ''' 
 
+        sobject = self._create_insert_sobject(search_type, data, metadata, parent_key)
+
+        sobject.commit(triggers=triggers)
+        self.set_sobject(sobject)
+        self.update_info(info)
+
+        if collection_key:
+            collection = Search.get_by_search_key(collection_key)
+            sobject.add_to_collection(collection)
+
+        # return the data for this sobject
+        sobject_dict = self._get_sobject_dict(sobject, use_id=use_id)
+        return sobject_dict
+
+    def _create_insert_sobject(self, search_type, data, metadata={}, parent_key=None):
+        '''create a new uncommitted sobject filled with the given data'''
+
         # set the values
         sobject = SearchType.create(search_type)
         for name, value in data.items():
@@ -2246,17 +2459,8 @@ class ApiXMLRPC(BaseApiXMLRPC):
                 raise ApiException("Parent [%s] does not exist" % parent_key)
             sobject.set_parent(parent)
 
-        sobject.commit(triggers=triggers)
-        self.set_sobject(sobject)
-        self.update_info(info)
-
-        if collection_key:
-            collection = Search.get_by_search_key(collection_key)
-            sobject.add_to_collection(collection)
+        return sobject
 
-        # return the data for this sobject
-        sobject_dict = self._get_sobject_dict(sobject, use_id=use_id)
-        return sobject_dict
 
     @xmlrpc_decorator
     def insert_update(self, ticket, search_key, data={}, metadata={}, parent_key=None, info={}, use_id=False, triggers=True):
@@ -2509,17 +2713,7 @@ class ApiXMLRPC(BaseApiXMLRPC):
                 results = self._get_sobject_dict(results)
 
         if self.get_language() == 'python':
-            if self.get_protocol() == 'local':
-                return results
-            else:
-                if not Common.IS_Pv3:
-                    if isinstance(results, unicode):
-                        return results.encode('utf-8')
-                    elif isinstance(results, basestring):
-                        return unicode(results, errors='ignore').encode('utf-8')
-                # could be a list or dictionary, for quick operation, str conversion is the best
-                # for xmlrpc transfer
-                return str(results)
+            return self._get_python_results(results)
         else:
             return results
 
@@ -2878,7 +3072,7 @@ class ApiXMLRPC(BaseApiXMLRPC):
         for child in children:
             results.append( self._get_sobject_dict(child, columns))
 
-        return results
+        return self._encode_results(results)
 
 
 
@@ -3754,6 +3948,108 @@ class ApiXMLRPC(BaseApiXMLRPC):
         return os.path.getsize(upload_path)
 
 
+    @xmlrpc_decorator
+    def start_upload(self, ticket, filename, size, kwargs={}):
+        '''starts a resumable upload of a file.  The chunks of the file can
+        be sent in any order with upload_chunk() or to the upload server
+        with the upload_id and offset fields.
+
+        @params
+        ticket - authentication ticket
+        filename - the name of the file that will be uploaded
+        size - the size of the file in bytes.  Sizes and offsets of uploads
+            are sent as strings because XML-RPC integers are 32 bit
+        kwargs - subdir: sub directory of the upload dir
+                 algorithm: checksum algorithm of the chunks and the file
+
+        @return
+        dictionary - upload_id, chunk_size and algorithm of the upload
+        '''
+        session = UploadSession.create(filename, size, subdir=kwargs.get("subdir"), algorithm=kwargs.get("algorithm"))
+        status = session.get_status()
+        return {
+            'upload_id': session.get_upload_id(),
+            'chunk_size': status.get("chunk_size"),
+            'algorithm': status.get("algorithm"),
+        }
+
+
+
+    @xmlrpc_decorator
+    def upload_chunk(self, ticket, upload_id, offset, data, checksum=None):
+        '''writes a chunk of a resumable upload at an offset
+
+        @params
+        ticket - authentication ticket
+        upload_id - the id returned by start_upload()
+        offset - the position of the chunk in the file
+        data - binary form of the data
+        checksum - checksum of the data
+
+        @return
+        string - the checksum of the chunk
+        '''
+        if hasattr(data, "data"):
+            data = data.data
+        session = UploadSession(upload_id)
+        return session.write_chunk(offset, data, checksum)
+
+
+
+    @xmlrpc_decorator
+    def get_upload_status(self, ticket, upload_id):
+        '''gets the status of a resumable upload
+
+        @params
+        ticket - authentication ticket
+        upload_id - the id returned by start_upload()
+
+        @return
+        dictionary - size, received: list of [start, end] ranges which have
+            been received, received_size and complete
+        '''
+        session = UploadSession(upload_id)
+        status = session.get_status()
+        status['size'] = str(status.get('size'))
+        status['received_size'] = str(status.get('received_size'))
+        status['received'] = [[str(x[0]), str(x[1])] for x in status.get('received')]
+        return status
+
+
+
+    @xmlrpc_decorator
+    def finish_upload(self, ticket, upload_id, checksum=None):
+        '''finishes a resumable upload.  The file is moved into the upload
+        dir once all of the data has been received and the checksum of the
+        file matches
+
+        @params
+        ticket - authentication ticket
+        upload_id - the id returned by start_upload()
+        checksum - checksum of the whole file
+
+        @return
+        string - the name of the uploaded file
+        '''
+        session = UploadSession(upload_id)
+        path = session.finish(checksum)
+        return os.path.basename(path)
+
+
+
+    @xmlrpc_decorator
+    def abort_upload(self, ticket, upload_id):
+        '''removes a resumable upload and the data received
+
+        @params
+        ticket - authentication ticket
+        upload_id - the id returned by start_upload()
+        '''
+        session = UploadSession(upload_id)
+        session.abort()
+        return True
+
+
     #
     # Checkin/checkout methods / snapshot methods
     #
@@ -4513,7 +4809,7 @@ class ApiXMLRPC(BaseApiXMLRPC):
 
 
     @xmlrpc_decorator
-    def query_snapshots(self, ticket, filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False):
+    def query_snapshots(self, ticket, filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False, cursor=None):
         '''thin wrapper around query, but is specific to querying snapshots
         with some useful included flags that are specific to snapshots
 
@@ -4540,14 +4836,23 @@ class ApiXMLRPC(BaseApiXMLRPC):
         include_parent - includes all of the parent attributes in a __parent__ dictionary
         include_files - includes all of the file objects referenced in the
             snapshots
+        cursor - page through the snapshots as with query()
 
         @return
         list of snapshots
+        If a cursor is given, a dictionary with the "results" of the page
+        and the "cursor" of the next page
         '''
         search_type = "sthpw/snapshot"
-        snapshots = self._query(search_type=search_type, filters=filters, columns=columns, order_bys=order_bys, show_retired=show_retired, limit=limit, offset=offset, single=single, return_sobjects=True)
+        snapshots = self._query(search_type=search_type, filters=filters, columns=columns, order_bys=order_bys, show_retired=show_retired, limit=limit, offset=offset, single=single, return_sobjects=True, cursor=cursor)
 
-        if not snapshots:
+        if cursor != None:
+            next_cursor = snapshots.get('cursor')
+            snapshots = snapshots.get('results')
+            if not snapshots:
+                return {'results': [], 'cursor': next_cursor}
+
+        elif not snapshots:
             return []
 
 
@@ -4600,12 +4905,16 @@ class ApiXMLRPC(BaseApiXMLRPC):
         if include_files:
             all_files = Snapshot.get_files_dict_by_snapshots(snapshots)
 
+        # find the paths of all the snapshots together
+        if include_paths or include_paths_dict or include_web_paths_dict:
+            resolver = SnapshotPathResolver(snapshots)
+
         results = []
         for snapshot in snapshots:
             snapshot_dict = self._get_sobject_dict(snapshot, columns)
             # include a paths attribute
             if include_paths:
-                paths = snapshot.get_all_client_lib_paths()
+                paths = resolver.get_all_lib_paths(snapshot, mode='client_repo')
                 snapshot_dict['__paths__'] = paths
 
             # include a full xml attribute
@@ -4614,11 +4923,11 @@ class ApiXMLRPC(BaseApiXMLRPC):
                 snapshot_dict['__full_snapshot_xml__'] = full_snapshot_xml
 
             if include_paths_dict:
-                paths = snapshot.get_all_client_lib_paths_dict()
+                paths = resolver.get_all_paths_dict(snapshot, mode='client_repo')
                 snapshot_dict['__paths_dict__'] = paths
 
             if include_web_paths_dict:
-                paths = snapshot.get_all_web_paths_dict()
+                paths = resolver.get_all_paths_dict(snapshot, mode='web')
                 snapshot_dict['__web_paths_dict__'] = paths
 
             if include_parent:
@@ -4642,7 +4951,10 @@ class ApiXMLRPC(BaseApiXMLRPC):
 
 
             results.append(snapshot_dict)
-        return results
+
+        if cursor != None:
+            return {'results': self._encode_results(results), 'cursor': next_cursor}
+        return self._encode_results(results)
 
 
 
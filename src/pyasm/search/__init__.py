@@ -21,6 +21,7 @@ from .exception_log import *
 
 
 from .search import *
+from .search_cursor import *
 from .sobject_mapping import *
 from .sobject_config import *
 from .db_introspect import *
@@ -71,6 +71,12 @@ class DatabaseImpl(DatabaseImplInterface):
         return None
 
 
+    def is_null_largest(self):
+        '''determines if NULL values are sorted after all other values
+        in ascending order'''
+        return False
+
+
     def get_version(self):
         return (0,0,0)
 
@@ -310,7 +316,10 @@ class DatabaseImpl(DatabaseImplInterface):
             return True
 
 
-    def clear_table_cache(cls):
+    def clear_table_cache(cls, db_resource=None, table=None):
+        '''clear the cached table information.  The process wide cache of
+        the database resource (or of all databases) is cleared as well and
+        other processes are notified'''
         # this relies on the __str__ method of db_resource
         key = "DatabaseImpl:table_exists"
         Container.remove(key)
@@ -318,6 +327,9 @@ class DatabaseImpl(DatabaseImplInterface):
         Container.remove(key)
         key = "DatabaseImpl:column_info"
         Container.remove(key)
+
+        from pyasm.biz import TableInfoCache
+        TableInfoCache.clear_by_db_resource(db_resource, table=table, notify=True)
     clear_table_cache = classmethod(clear_table_cache)
 
 
@@ -336,6 +348,17 @@ class DatabaseImpl(DatabaseImplInterface):
         if cached != None:
             return cached
 
+        # look in the process wide cache
+        from .sql import Sql
+        from pyasm.biz import TableInfoCache
+        if isinstance(db_resource, Sql):
+            db_resource = db_resource.get_db_resource()
+        cache = TableInfoCache.get_by_db_resource(db_resource)
+        exists = cache.table_exists(table)
+        if exists != None:
+            cached_dict[key2] = exists
+            return exists
+
         table_info = self.get_table_info(db_resource)
         if table in table_info:
             exists = True
@@ -343,6 +366,7 @@ class DatabaseImpl(DatabaseImplInterface):
             exists = False
 
         cached_dict[key2] = exists
+        cache.set_table_exists(table, exists)
 
         return exists
 
@@ -666,9 +690,33 @@ class DatabaseImpl(DatabaseImplInterface):
         return ""
 
 
+    def get_validate_statement(self):
+        '''statement used to check that a pooled connection is alive.
+        None means no statement is issued'''
+        return None
+
+
+    def has_multi_row_insert(self):
+        '''determines whether several rows can be inserted with a single
+        INSERT ... VALUES (...), (...) statement'''
+        return False
+
+
+    def get_nextvals_select(self, sequence, count):
+        '''statement which reserves a number of sequence values at once.
+        None means that ids have to be retrieved one at a time'''
+        return None
+
+
 
 class BaseSQLDatabaseImpl(DatabaseImpl):
 
+    def get_validate_statement(self):
+        return "SELECT 1"
+
+    def has_multi_row_insert(self):
+        return True
+
     def is_column_sortable(self, db_resource, table, column):
 
         # support -> operator
@@ -1610,6 +1658,9 @@ class PostgresImpl(BaseSQLDatabaseImpl):
     def get_database_type(self):
         return "PostgreSQL"
 
+    def is_null_largest(self):
+        return True
+
     def get_version(self):
         from .sql import DbContainer
         sql = DbContainer.get("sthpw")
@@ -1773,6 +1824,9 @@ class PostgresImpl(BaseSQLDatabaseImpl):
     def get_nextval_select(self, sequence):
         return "select nextval('\"%s\"')" % sequence
 
+    def get_nextvals_select(self, sequence, count):
+        return "select nextval('\"%s\"') from generate_series(1, %s)" % (sequence, count)
+
     def get_setval_select(self, sequence, num):
         return "select setval('\"%s\"', %s)" % (sequence, num)
 
@@ -2145,7 +2199,7 @@ class PostgresImpl(BaseSQLDatabaseImpl):
                 kwargs = {
                     "db_resource": db_resource,
                 }
-                from pyasm.web import TableInfoCache
+                from pyasm.biz import TableInfoCache
                 cache_container = TableInfoCache( **kwargs )
 
             else:
@@ -2254,6 +2308,14 @@ class OracleImpl(PostgresImpl):
         return "Oracle"
 
 
+    def get_validate_statement(self):
+        return "SELECT 1 FROM DUAL"
+
+
+    def has_multi_row_insert(self):
+        return False
+
+
     def create_database(self, database):
         '''create a database.  This is done by a system command'''
         # get the system user
@@ -2450,6 +2512,9 @@ class OracleImpl(PostgresImpl):
     def get_nextval_select(self, sequence):
         return 'select %s.nextval from dual' % sequence
 
+    def get_nextvals_select(self, sequence, count):
+        return None
+
     def get_setval_select(self, sequence):
         return None
         #return 'select %s.setval from dual' % sequence
@@ -2798,6 +2863,9 @@ class SqliteImpl(PostgresImpl):
     def get_database_type(self):
         return "Sqlite"
 
+    def is_null_largest(self):
+        return False
+
     """
     def get_version(self):
         from .sql import DbContainer
@@ -3198,6 +3266,9 @@ class MySQLImpl(PostgresImpl):
     def get_database_type(self):
         return "MySQL"
 
+    def is_null_largest(self):
+        return False
+
 
     def get_version(self):
         from .sql import DbContainer
@@ -3777,6 +3848,14 @@ class TacticImpl(PostgresImpl):
         return "TACTIC"
 
 
+    def get_validate_statement(self):
+        return None
+
+
+    def has_multi_row_insert(self):
+        return False
+
+
 
     def get_table_info(self, db_resource):
         search_type = "table/whatever?project=fifi"
@@ -30,7 +30,7 @@ basestring = six.string_types
 IS_Pv3 = sys.version_info[0] > 2
 
 # Need to import this way because of how DbResource needs to get imported
-from pyasm.search.sql import SqlException, DatabaseException, Sql, DbResource, DbContainer, DbPasswordUtil, Select, Insert, Update, CreateTable, DropTable, AlterTable
+from pyasm.search.sql import SqlException, DatabaseException, Sql, DbResource, DbContainer, DbPasswordUtil, Select, Insert, MultiInsert, Update, CreateTable, DropTable, AlterTable
 
 import datetime
 from dateutil import parser
@@ -58,6 +58,9 @@ class SObjectValueException(SObjectException):
 gl = globals()
 lc = locals()
 
+# process-wide cache of sobject classes resolved from their class path
+SOBJECT_CLASS_CACHE = {}
+
 
 
 
@@ -86,6 +89,9 @@ class Search(Base):
         self.null_filter = False
         self.security_filter = False
 
+        # build sobjects with compact row data
+        self.compact_mode = False
+
         protocol = 'local'
         if isinstance(search_type, basestring):
             # project is *always* local.  This prevents an infinite loop
@@ -1775,6 +1781,13 @@ class Search(Base):
         self.show_retired_flag = flag
 
 
+    def set_compact_mode(self, flag=True):
+        '''when set, the sobjects of this search store their data as
+        compact rows which convert values on first access.  This uses
+        considerably less memory and cpu for large read-only searches'''
+        self.compact_mode = flag
+
+
 
     def do_search(self, redo=False, statement=None):
 
@@ -1789,6 +1802,120 @@ class Search(Base):
         if not redo and self.is_search_done:
             return self.sobjects
 
+        search_type = self.get_base_search_type()
+        info = self._prepare_search()
+        sql = info['sql']
+        db_resource = self.db_resource
+
+        vendor = db_resource.get_vendor()
+        if vendor == "MongoDb":
+            #statement = self.select.get_statement()
+            #print('statement: ', statement)
+            results = sql.do_query(self.select)
+            # TODO:
+            # Not really used because results is already a dictionary
+            # and the column data is dynamic
+            columns = ['_id']
+            result_is_dict = True
+
+
+
+        elif vendor in ["Salesforce"] or search_type.startswith("salesforce/"):
+
+            impl = db_resource.get_database_impl()
+            self.sobjects = impl.execute_query(sql, self.select)
+
+            # remember that the search has been done
+            self.is_search_done = True
+
+            return self.sobjects
+
+
+        else:
+            # get the select statement and do the query
+            if not statement:
+                statement = self.select.get_statement()
+
+            #print("QUERY: ", statement)
+
+            from pyasm.security import Site
+            results = sql.do_query(statement)
+
+            # this gets the actual order of columns in this SQL
+            columns = sql.get_columns_from_description()
+
+            result_is_dict = False
+
+
+        Container.increment('Search:sql_query') 
+
+        # Count number of sobjects
+        num_sobjects = Container.get("NUM_SOBJECTS")
+        if not num_sobjects:
+            num_sobjects = 0
+        num_sobjects = num_sobjects + len(results)
+        if len(results) > 10000:
+            print("WARNING query: (%s) sobjects found: %s" % (len(results), statement.encode('utf-8','ignore')))
+        Container.put("NUM_SOBJECTS", num_sobjects)
+
+        # create a list of objects
+        self.sobjects = self._create_sobjects(info, columns, results, result_is_dict)
+
+        # remember that the search has been done
+        self.is_search_done = True
+
+        return self.sobjects
+
+
+
+    def iter_sobjects(self, batch_size=1000, statement=None, compact=True):
+        '''Generator which yields the sobjects of this search one at a
+        time.  The results are fetched from the database in batches of
+        batch_size rows using a server-side cursor where the database
+        supports it, so memory use does not grow with the number of rows.
+
+        The sobjects are not stored in the search and this does not mark
+        the search as done.  By default, the sobjects are built in compact
+        mode (see set_compact_mode()).  Databases without a cursor (MongoDb,
+        Salesforce, remote searches) fall back to a regular search.
+        '''
+        if self.null_filter:
+            return
+
+        search_type = self.get_base_search_type()
+        vendor = self.db_resource.get_vendor()
+        if isinstance(self.select, RemoteSearch) or vendor in ["MongoDb", "Salesforce"] or search_type.startswith("salesforce/"):
+            for sobject in self.do_search(redo=True, statement=statement):
+                yield sobject
+            return
+
+        info = self._prepare_search()
+        sql = info['sql']
+
+        if not statement:
+            statement = self.select.get_statement()
+
+        Container.increment('Search:sql_query') 
+
+        columns = None
+        for results in sql.iter_query(statement, batch_size=batch_size):
+            if columns == None:
+                # this gets the actual order of columns in this SQL
+                columns = sql.get_columns_from_description()
+
+            sobjects = self._create_sobjects(info, columns, results, False, compact=compact)
+
+            # release the rows before the sobjects are handed out
+            results = None
+            for sobject in sobjects:
+                yield sobject
+
+
+
+    def _prepare_search(self):
+        '''apply all of the implicit filters and order bys to the search
+        and gather the information needed to build sobjects from the
+        results'''
         search_type = self.get_base_search_type()
         security = Environment.get_security()
 
@@ -1802,18 +1929,9 @@ class Search(Base):
         # DEPRECATED: not sure if this was ever used??
         #
         # allow the sobject to alter search
-        # A little convoluted, but it works
         class_path = self.search_type_obj.get_class()
-        (module_name, class_name) = \
-                Common.breakup_class_path(class_path)
-        try:
-            try:
-                exec("%s.alter_search(self)" % class_name )
-            except NameError:
-                exec("from %s import %s" % (module_name,class_name), gl, lc )
-                exec("%s.alter_search(self)" % class_name )
-        except ImportError:
-            raise SearchException("Class_path [%s] does not exist" % class_path)
+        sobject_class = SearchType.get_sobject_class(class_path)
+        sobject_class.alter_search(self)
 
         # allow security to alter the search if it hasn't been done in SearchLimitWdg
         if not self.security_filter:
@@ -1890,50 +2008,25 @@ class Search(Base):
             elif data_type in ['sqlserver_timestamp']:
                 skipped_cols.append(key)
 
-        vendor = db_resource.get_vendor()
-        if vendor == "MongoDb":
-            #statement = self.select.get_statement()
-            #print('statement: ', statement)
-            results = sql.do_query(self.select)
-            # TODO:
-            # Not really used because results is already a dictionary
-            # and the column data is dynamic
-            columns = ['_id']
-            result_is_dict = True
-
-
-
-        elif vendor in ["Salesforce"] or search_type.startswith("salesforce/"):
-
-            impl = db_resource.get_database_impl()
-            self.sobjects = impl.execute_query(sql, self.select)
-
-            # remember that the search has been done
-            self.is_search_done = True
-
-            return self.sobjects
-
-
-        else:
-            # get the select statement and do the query
-            if not statement:
-                statement = self.select.get_statement()
-
-            #print("QUERY: ", statement)
-
-            from pyasm.security import Site
-            results = sql.do_query(statement)
-
-            # this gets the actual order of columns in this SQL
-            columns = sql.get_columns_from_description()
+        return {
+            'sql': sql,
+            'sobject_class': sobject_class,
+            'datetime_cols': datetime_cols,
+            'boolean_cols': boolean_cols,
+            'skipped_cols': skipped_cols,
+        }
 
-            result_is_dict = False
 
 
-        Container.increment('Search:sql_query') 
+    def _create_sobjects(self, info, columns, results, result_is_dict, compact=None):
+        '''build sobjects from the rows of a query'''
+        db_resource = self.db_resource
+        skipped_cols = info['skipped_cols']
 
-        # create a list of objects
-        self.sobjects = []
+        if compact == None:
+            compact = self.compact_mode
+        if result_is_dict:
+            compact = False
 
         # precalculate some information
         from pyasm.biz import Project
@@ -1944,54 +2037,97 @@ class Search(Base):
             'search_type_obj': self.search_type_obj,
             'database': Project.extract_database(full_search_type),
             'db_resource': db_resource,
-            'datetime_cols': datetime_cols,
-            'boolean_cols': boolean_cols,
+            'datetime_cols': info['datetime_cols'],
+            'boolean_cols': info['boolean_cols'],
             'skipped_cols': skipped_cols,
         }
 
-        # Count number of sobjects
-        num_sobjects = Container.get("NUM_SOBJECTS")
-        if not num_sobjects:
-            num_sobjects = 0
-        num_sobjects = num_sobjects + len(results)
-        if len(results) > 10000:
-            print("WARNING query: (%s) sobjects found: %s" % (len(results), statement.encode('utf-8','ignore')))
-        Container.put("NUM_SOBJECTS", num_sobjects)
 
+        if compact:
+            # the sobjects share one column index and store the raw rows
+            self._add_compact_data(fast_data, columns, info)
+        else:
+            # assemble the data dictionaries to be distributed to the sobjects
+            data_list = []
+            for result in results:
+                if result_is_dict:
+                    data = result
+                else:
+                    data = dict(zip(columns, result))
+                if skipped_cols:
+                    for skipped_col in skipped_cols:
+                        # forcing this data empty because
+                        # otherwise the sobject does not have
+                        # a column it believes it should have
+                        #del data[skipped_col]
+                        data[skipped_col] = ""
+                data_list.append(data)
 
-        # assemble the data dictionaries to be distributed to the sobjects
-        data_list = []
-        for result in results:
-            if result_is_dict:
-                data = result
-            else:
-                data = dict(zip(columns, result))
-            if skipped_cols:
-                for skipped_col in skipped_cols:
-                    # forcing this data empty because
-                    # otherwise the sobject does not have
-                    # a column it believes it should have
-                    #del data[skipped_col]
-                    data[skipped_col] = ""
-            data_list.append(data)
-
-        fast_data['data'] = data_list
+            fast_data['data'] = data_list
+
+        sobject_class = info['sobject_class']
 
         # do this inline for performance
+        sobjects = []
         for i, result in enumerate(results):
             fast_data['count'] = i
 
-            sobject = SearchType.fast_create_from_class_path(class_name,
-                self.search_type_obj, columns, result, module_name=module_name,
-                fast_data=fast_data)
+            sobject = SearchType.fast_create_from_class(sobject_class,
+                self.search_type_obj, columns, result, fast_data=fast_data)
             # add this sobject to the list of sobjects for the search
-            self.sobjects.append(sobject)
+            sobjects.append(sobject)
 
+        return sobjects
 
-        # remember that the search has been done
-        self.is_search_done = True
 
-        return self.sobjects
+
+    def _add_compact_data(self, fast_data, columns, info):
+        '''add the column index and column converters shared by all of the
+        compact rows of a result set'''
+        column_index = {}
+        for i, column in enumerate(columns):
+            column_index[column] = i
+
+        converters = {}
+
+        # Sqlite stores the values in GMT when there is no timezone
+        # rather than the local timezone
+        is_gmt = self.db_resource.get_database_type() == 'Sqlite'
+        def convert_date(value):
+            return str(value) if value else value
+        def convert_datetime(value):
+            if value:
+                # convert to UTC
+                value = str( SPTDate.convert(value, is_gmt=is_gmt) )
+            return value
+        for col in info['datetime_cols']:
+            if col not in column_index:
+                continue
+            if SObject.is_day_column(col):
+                converters[col] = convert_date
+            else:
+                converters[col] = convert_datetime
+
+        def convert_boolean(value):
+            if value in ["false", "", 0, None]:
+                return False
+            return True
+        for col in info['boolean_cols']:
+            if col in column_index:
+                converters[col] = convert_boolean
+
+        # forcing this data empty because otherwise the sobject does not
+        # have a column it believes it should have.  Columns not in the
+        # result point at any index as the value is always replaced
+        def convert_skipped(value):
+            return ""
+        for col in info['skipped_cols']:
+            if col not in column_index:
+                column_index[col] = 0
+            converters[col] = convert_skipped
+
+        fast_data['column_index'] = column_index
+        fast_data['converters'] = converters
 
 
 
@@ -2506,6 +2642,133 @@ class RemoteSearch(Select):
 
 
 
+class SObjectRow(object):
+    '''Compact row storage for sobjects created by bulk searches.  All of
+    the rows of a result set share a single column index and a single set
+    of column converters and each row only stores the raw database tuple.
+    Converted values (datetimes, booleans) are computed on first access.
+
+    This behaves like a read-only dictionary.  Any modification materializes
+    the row into a plain dictionary held internally.  SObject replaces it
+    with a plain dictionary as soon as a value is set.
+    '''
+
+    __slots__ = ['columns', 'row', 'converters', 'cache']
+
+    def __init__(self, columns, row, converters=None):
+        # columns is a dictionary of column name to index in the row
+        self.columns = columns
+        self.row = row
+        self.converters = converters
+        # cache of converted values or the full data once materialized
+        self.cache = None
+
+
+    def _get(self, name):
+        if self.row == None:
+            return self.cache[name]
+
+        if self.cache != None and name in self.cache:
+            return self.cache[name]
+
+        value = self.row[self.columns[name]]
+        if self.converters:
+            converter = self.converters.get(name)
+            if converter:
+                value = converter(value)
+                if self.cache == None:
+                    self.cache = {}
+                self.cache[name] = value
+        return value
+
+
+    def to_dict(self):
+        '''get a plain dictionary of all of the converted values'''
+        if self.row == None:
+            return self.cache.copy()
+        return dict( [(name, self._get(name)) for name in self.columns] )
+
+
+    def _materialize(self):
+        if self.row != None:
+            self.cache = self.to_dict()
+            self.row = None
+            self.columns = None
+            self.converters = None
+
+
+    def __getitem__(self, name):
+        return self._get(name)
+
+    def get(self, name, default=None):
+        try:
+            return self._get(name)
+        except KeyError:
+            return default
+
+    def __contains__(self, name):
+        if self.row == None:
+            return name in self.cache
+        return name in self.columns
+
+    has_key = __contains__
+
+    def __len__(self):
+        if self.row == None:
+            return len(self.cache)
+        return len(self.columns)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        if self.row == None:
+            return list(self.cache.keys())
+        return list(self.columns.keys())
+
+    def values(self):
+        return [self._get(name) for name in self.keys()]
+
+    def items(self):
+        return [(name, self._get(name)) for name in self.keys()]
+
+    def copy(self):
+        return self.to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, SObjectRow):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __setitem__(self, name, value):
+        self._materialize()
+        self.cache[name] = value
+
+    def __delitem__(self, name):
+        self._materialize()
+        del self.cache[name]
+
+    def update(self, *args, **kwargs):
+        self._materialize()
+        self.cache.update(*args, **kwargs)
+
+    def pop(self, name, *args):
+        self._materialize()
+        return self.cache.pop(name, *args)
+
+    def setdefault(self, name, default=None):
+        self._materialize()
+        return self.cache.setdefault(name, default)
+
+
+
+
 class SObject(object):
     '''Base class of the object/relation mapper.  All results from the Search class come as derived class of SObject'''
     
@@ -2569,7 +2832,11 @@ class SObject(object):
             self.data = {}
             self.data[self.get_id_col()] = -1
         else:
-            if fast_data:
+            if fast_data and fast_data.get('column_index') != None:
+                # compact mode: conversions are done on access
+                self.data = SObjectRow(fast_data['column_index'], result, fast_data['converters'])
+
+            elif fast_data:
                 self.data = fast_data['data'][fast_data['count']]
 
                 # MongoDb
@@ -2788,8 +3055,15 @@ class SObject(object):
             data.update(self.update_data)
             return data
 
+        self._promote_data()
         return self.data
 
+
+    def _promote_data(self):
+        '''convert compact row data into a plain dictionary'''
+        if isinstance(self.data, SObjectRow):
+            self.data = self.data.to_dict()
+
     def set_data(self, data):
         data = data.copy()
         self.data = data
@@ -3486,6 +3760,8 @@ class SObject(object):
     def _set_value(self, name, value, quoted=True):
         '''called by set_value()'''
 
+        self._promote_data()
+
         if name in self.update_data or name not in self.data or value != self.data[name]:
 
             self.update_data[name] = value
@@ -3972,13 +4248,8 @@ class SObject(object):
     def commit(self, triggers=True, log_transaction=True, cache=True, return_sql=False):
         '''commit all of the changes to the database'''
 
-        is_insert = False 
+        is_insert = self._is_commit_insert()
         id = self.get_id()
-        if self.force_insert or id == -1:
-            is_insert = True
-        if id in ['-1', '']:
-            self.set_id(-1)
-            is_insert = True
 
 
         if not self.handle_commit_security():
@@ -4053,24 +4324,7 @@ class SObject(object):
 
 
 
-        # generate a code value for this sobject when triggers are set to "ingest".
-        # This is a special condition
-        if is_insert and triggers == "ingest":
-            if not self.update_data or not self.update_data.get("code"):
-                if SearchType.column_exists(self.full_search_type, "code"):
-                    temp_search_code = Common.generate_random_key()
-                    self.set_value("code", temp_search_code)
-
-        # if no update data is specified
-        if is_insert and not self.update_data:
-            # if there is no update data, an error will result, so give
-            # it a try with code as a random key ...
-            # this will work for most search types
-            if SearchType.column_exists(self.full_search_type, "code"):
-                self.set_value("code", "NULL", quoted=False)
-
-        # validate should raise an exception if data is not valid
-        self.validate()
+        self._prepare_commit_data(is_insert, triggers)
 
         sql = DbContainer.get(db_resource)
 
@@ -4078,61 +4332,7 @@ class SObject(object):
         column_info = SearchType.get_column_info(self.full_search_type)
 
         # fill in the updated values
-        is_postgres = impl.get_database_type() == 'PostgreSQL'
-        is_sqlite = impl.get_database_type() == 'Sqlite'
-        
-        #is_mysql = impl.get_database_type() == 'MySQL'
-
-        is_code_set = False
-        for key, value in self.update_data.items():
-            quoted = self.quoted_flag.get(key)
-            escape_quoted = False
-            changed = False
-
-            if key == "code" and value:
-                is_code_set = True
-
-            if isinstance(value, dict):
-                value = jsondumps(value)
-
-
-            # escape the backward slashes
-            if is_postgres and isinstance(value, basestring):
-                if value.find('\\') != -1:
-                    value = value.replace('\\', '\\\\')
-                    changed = True
-                    escape_quoted = True
-            if value and isinstance(value, datetimeclass):
-                changed = True
-
-            # if this is a timestamp, then add the a time zone.
-            # For SQLite, this should always be set to GMT
-            # For Postgres, if there is no time zone, then the value
-            # needs to be set to localtime
-            if column_types.get(key) in ['timestamp', 'datetime','datetime2']:
-                if value and not SObject.is_day_column(key):
-                    info = column_info.get(key) or {}
-                    if not is_sqlite and not info.get("time_zone"):
-                        # if it has no timezone, it assumes it is GMT
-                        value = SPTDate.convert_to_local(value)
-                    else:
-                        value = SPTDate.add_gmt_timezone(value)
-                    
-                # stringified it if it's a datetime obj
-                if value and not isinstance(value, basestring):
-                    value = value.strftime('%Y-%m-%d %H:%M:%S %z')
-           
-                changed = True
-
-            if changed:
-                self.update_data[key] = value
-            #impl.process_value(database, table, key, value)
-
-            # For SQLServer, do not set the value for the ID column
-            # when trying to do an sql UPDATE
-            if not is_insert and key == 'id' and sql.get_database_type() == 'SQLServer':
-                continue
-            update.set_value(key, value, quoted=quoted, escape_quoted=escape_quoted )
+        self._set_update_values(update, is_insert, sql, column_types, column_info)
 
 
 
@@ -4240,6 +4440,366 @@ class SObject(object):
                 self.data[key] = self.update_data[key]
 
 
+        self._finish_commit(sobject, id, is_insert, triggers, log_transaction, cache, column_info, db_resource, is_search_type)
+
+
+
+    def commit_many(sobjects, triggers=True, log_transaction=True, cache=True, chunk_size=500):
+        '''commit a list of sobjects in bulk.  Instead of a round trip per
+        sobject, rows are written with multi-row statements where the
+        database supports it and are read back with a single search per
+        search type.  Undo logging and triggers are processed for each
+        sobject once all of the rows have been written.
+
+        @params
+        sobjects - list of sobjects to commit
+        triggers - same as in commit()
+        log_transaction - same as in commit()
+        cache - same as in commit()
+        chunk_size - maximum number of rows written by a single statement
+
+        @return
+        the list of committed sobjects
+        '''
+        # remap triggers kwarg
+        if triggers == True:
+            triggers = "all"
+        elif triggers == False:
+            triggers = "integral"
+        assert(triggers in ["all", "integral", "ingest", "none"])
+
+        # group by search type, keeping the order
+        groups = {}
+        group_keys = []
+        for sobject in sobjects:
+            if isinstance(sobject, SearchType):
+                key = SearchType.SEARCH_TYPE
+            else:
+                key = sobject.get_search_type()
+            if key not in groups:
+                groups[key] = []
+                group_keys.append(key)
+            groups[key].append(sobject)
+
+        for key in group_keys:
+            SObject._commit_group(groups[key], triggers, log_transaction, cache, chunk_size)
+
+        return sobjects
+
+    commit_many = staticmethod(commit_many)
+
+
+
+    def _commit_group(sobjects, triggers, log_transaction, cache, chunk_size):
+        '''bulk commit a list of sobjects of the same search type'''
+        first = sobjects[0]
+        db_resource = first.get_db_resource()
+        vendor = db_resource.get_vendor()
+
+        # search types and non sql databases go through the regular commit
+        if len(sobjects) == 1 or isinstance(first, SearchType) or \
+                vendor in ['MongoDb', 'Salesforce']:
+            for sobject in sobjects:
+                sobject.commit(triggers=triggers, log_transaction=log_transaction, cache=cache)
+            return
+
+
+        impl = first.get_database_impl()
+        sql = DbContainer.get(db_resource)
+        is_postgres = impl.get_database_type() == 'PostgreSQL'
+
+        search_type = first.get_search_type()
+        search_type_obj = SearchType.get(search_type)
+        database = first.get_database()
+        table = first.get_table()
+        id_col = first.get_id_col()
+
+        column_types = SearchType.get_column_types(search_type)
+        column_info = SearchType.get_column_info(search_type)
+
+
+        inserts = []
+        updates = []
+        for sobject in sobjects:
+            # an explicit id override needs special handling for some
+            # databases, so it is committed on its own
+            if sobject.new_id != -1:
+                sobject.commit(triggers=triggers, log_transaction=log_transaction, cache=cache)
+                continue
+
+            is_insert = sobject._is_commit_insert()
+
+            if not sobject.handle_commit_security():
+                raise SecurityException("Security: Action not permitted")
+
+            if is_insert:
+                sobject.set_defaults()
+            else:
+                sobject.store_version()
+
+            sobject._prepare_commit_data(is_insert, triggers)
+
+            if is_insert:
+                insert = Insert()
+                insert.set_database(db_resource)
+                insert.set_table(table)
+                sobject._set_update_values(insert, True, sql, column_types, column_info)
+                inserts.append( (sobject, insert) )
+            else:
+                update = Update()
+                update.set_database(db_resource)
+                update.set_table(table)
+                update.add_filter(id_col, sobject.get_id())
+                sobject._set_update_values(update, False, sql, column_types, column_info)
+                statement = update.get_statement()
+                # nothing to update
+                if not statement:
+                    continue
+                sobject.last_statement = statement
+                updates.append( (sobject, statement) )
+
+
+        # write the new rows
+        insert_ids = []
+        if inserts:
+            sequence = None
+            if impl.has_sequences():
+                sequence = impl.get_sequence_name(search_type_obj, database=database)
+
+            nextvals_select = None
+            if sequence:
+                nextvals_select = impl.get_nextvals_select(sequence, len(inserts))
+
+            if nextvals_select and impl.has_multi_row_insert():
+                # reserve all of the ids up front, so that every row is
+                # known before it is written
+                results = sql.do_query(nextvals_select)
+                multi_insert = MultiInsert(chunk_size=chunk_size)
+                for (sobject, insert), result in zip(inserts, results):
+                    id = int(result[0])
+                    insert.set_value(id_col, id, quoted=False)
+                    multi_insert.add_insert(insert)
+                    insert_ids.append(id)
+
+                for statement in multi_insert.get_statements():
+                    sql.do_update(statement)
+                    Container.increment('Search:sql_commit')
+
+            elif not sequence:
+                statements = []
+                for sobject, insert in inserts:
+                    statement = insert.get_statement()
+                    sobject.last_statement = statement
+                    statements.append(statement)
+                insert_ids = sql.do_update_many(statements)
+                for statement in statements:
+                    Container.increment('Search:sql_commit')
+
+            else:
+                for sobject, insert in inserts:
+                    statement = insert.get_statement()
+                    sobject.last_statement = statement
+                    sql.do_update(statement)
+                    Container.increment('Search:sql_commit')
+                    id = sql.get_value( impl.get_currval_select(sequence) )
+                    insert_ids.append( int(id) )
+
+
+        # write the updates
+        if updates:
+            statements = [x[1] for x in updates]
+            if is_postgres:
+                for i in range(0, len(statements), chunk_size):
+                    sql.do_update(";\n".join(statements[i:i+chunk_size]))
+            else:
+                sql.do_update_many(statements)
+
+            for statement in statements:
+                Container.increment('Search:sql_commit')
+
+
+        committed = []
+        for (sobject, insert), id in zip(inserts, insert_ids):
+            committed.append( (sobject, True, id) )
+        for sobject, statement in updates:
+            committed.append( (sobject, False, sobject.get_id()) )
+
+        if triggers == "ingest":
+            for sobject, is_insert, id in committed:
+                sobject.set_id(id)
+            return
+
+
+        # get all of the updated values with as few searches as possible.
+        # This handles values auto updated by the database
+        from pyasm.security import Sudo
+        all_ids = [x[2] for x in committed]
+        results = {}
+        for i in range(0, len(all_ids), chunk_size):
+            sudo = Sudo()
+            try:
+                search = Search(search_type)
+            finally:
+                sudo.exit()
+            search.set_show_retired_flag(True)
+            # trick the search to believe that security filter has been applied
+            search.set_security_filter()
+            search.add_filters(id_col, all_ids[i:i+chunk_size])
+            for result in search.get_sobjects():
+                results[result.get_id()] = result
+
+
+        # auto generate the codes of the new rows in one go
+        code_statements = []
+        for sobject, is_insert, id in committed:
+            result = results.get(id)
+            if result == None:
+                raise SObjectException("Insert/Update of [%s] failed. The entry with id [%s] cannot be found." % (search_type, id))
+
+            # need to update the update data with new values if
+            # they are autogenerated
+            for key, value in sobject.update_data.items():
+                if not sobject.quoted_flag.get(key):
+                    sobject.update_data[key] = result.get_value(key)
+
+            if column_info.get("code") and not result.get_value("code", no_exception=True):
+                code = sobject.generate_code(id)
+
+                update = Update()
+                update.set_database(db_resource)
+                update.set_table(table)
+                update.add_filter(id_col, id)
+                update.set_value("code", code)
+                code_statements.append( update.get_statement() )
+
+                result._promote_data()
+                result.data['code'] = code
+
+        if code_statements:
+            if is_postgres:
+                for i in range(0, len(code_statements), chunk_size):
+                    sql.do_update(";\n".join(code_statements[i:i+chunk_size]))
+            else:
+                sql.do_update_many(code_statements)
+
+
+        # a single savepoint is set for all of the triggers
+        sql.set_savepoint()
+
+        for sobject, is_insert, id in committed:
+            result = results.get(id)
+            sobject._finish_commit(result, id, is_insert, triggers, log_transaction, cache, column_info, db_resource, False, savepoint=False)
+
+    _commit_group = staticmethod(_commit_group)
+
+
+
+    def _is_commit_insert(self):
+        '''determines whether a commit of this sobject is an insert'''
+        is_insert = False
+        id = self.get_id()
+        if self.force_insert or id == -1:
+            is_insert = True
+        if id in ['-1', '']:
+            self.set_id(-1)
+            is_insert = True
+        return is_insert
+
+
+
+    def _prepare_commit_data(self, is_insert, triggers):
+        '''fill in the data that the database requires before committing and
+        validate it'''
+
+        # generate a code value for this sobject when triggers are set to "ingest".
+        # This is a special condition
+        if is_insert and triggers == "ingest":
+            if not self.update_data or not self.update_data.get("code"):
+                if SearchType.column_exists(self.full_search_type, "code"):
+                    temp_search_code = Common.generate_random_key()
+                    self.set_value("code", temp_search_code)
+
+        # if no update data is specified
+        if is_insert and not self.update_data:
+            # if there is no update data, an error will result, so give
+            # it a try with code as a random key ...
+            # this will work for most search types
+            if SearchType.column_exists(self.full_search_type, "code"):
+                self.set_value("code", "NULL", quoted=False)
+
+        # validate should raise an exception if data is not valid
+        self.validate()
+
+
+
+    def _set_update_values(self, update, is_insert, sql, column_types, column_info):
+        '''fill the update data into the given Insert or Update statement,
+        converting the values to what the database expects'''
+        impl = self.get_database_impl()
+
+        is_postgres = impl.get_database_type() == 'PostgreSQL'
+        is_sqlite = impl.get_database_type() == 'Sqlite'
+        
+        #is_mysql = impl.get_database_type() == 'MySQL'
+
+        is_code_set = False
+        for key, value in self.update_data.items():
+            quoted = self.quoted_flag.get(key)
+            escape_quoted = False
+            changed = False
+
+            if key == "code" and value:
+                is_code_set = True
+
+            if isinstance(value, dict):
+                value = jsondumps(value)
+
+
+            # escape the backward slashes
+            if is_postgres and isinstance(value, basestring):
+                if value.find('\\') != -1:
+                    value = value.replace('\\', '\\\\')
+                    changed = True
+                    escape_quoted = True
+            if value and isinstance(value, datetimeclass):
+                changed = True
+
+            # if this is a timestamp, then add the a time zone.
+            # For SQLite, this should always be set to GMT
+            # For Postgres, if there is no time zone, then the value
+            # needs to be set to localtime
+            if column_types.get(key) in ['timestamp', 'datetime','datetime2']:
+                if value and not SObject.is_day_column(key):
+                    info = column_info.get(key) or {}
+                    if not is_sqlite and not info.get("time_zone"):
+                        # if it has no timezone, it assumes it is GMT
+                        value = SPTDate.convert_to_local(value)
+                    else:
+                        value = SPTDate.add_gmt_timezone(value)
+                    
+                # stringified it if it's a datetime obj
+                if value and not isinstance(value, basestring):
+                    value = value.strftime('%Y-%m-%d %H:%M:%S %z')
+           
+                changed = True
+
+            if changed:
+                self.update_data[key] = value
+            #impl.process_value(database, table, key, value)
+
+            # For SQLServer, do not set the value for the ID column
+            # when trying to do an sql UPDATE
+            if not is_insert and key == 'id' and sql.get_database_type() == 'SQLServer':
+                continue
+            update.set_value(key, value, quoted=quoted, escape_quoted=escape_quoted )
+
+
+
+    def _finish_commit(self, sobject, id, is_insert, triggers, log_transaction, cache, column_info, db_resource, is_search_type, savepoint=True):
+        '''handles everything that needs to happen once the values of this
+        sobject have been written to the database: change timestamps, undo
+        logging, triggers and caching'''
+
         # if the code has changed, then update dependencies automatically
         prev_code = None
         if not is_insert and self.update_data.get("code") and self.data.get("code") and self.update_data.get("code") != self.data.get("code"):
@@ -4344,8 +4904,9 @@ class SObject(object):
         
         # triggers are not executed when in undo or redo mode
         is_undo = Container.get("is_undo")
-        sql = DbContainer.get(db_resource)
-        sql.set_savepoint()
+        if savepoint:
+            sql = DbContainer.get(db_resource)
+            sql.set_savepoint()
 
         # NOTE: this is run even if triggers is false because of the need to
         # run integral triggers
@@ -4433,10 +4994,7 @@ class SObject(object):
         if is_insert:
             self.on_insert()
         else:
-           self.on_update()
-
-
-
+            self.on_update()
 
 
 
@@ -6096,18 +6654,17 @@ class SearchType(SObject):
         # this needs to be None to clear
         Container.put("SearchType:column_info:%s" % search_type, None)
 
+        Container.put("SearchType:type:%s" % search_type, None)
+
         from pyasm.biz import Project
         project = Project.get_by_search_type(search_type)
         db_resource = project.get_project_db_resource()
         sql = DbContainer.get(db_resource)
-        key = "DatabaseImpl:column_info"
-        cache_dict = Container.get(key)
-        if cache_dict:
-            search_type_obj = SearchType.get(search_type)
-            table = search_type_obj.get_table()
-            key2 = "%s:%s" % (db_resource, table)
-            #cache_dict[key2] = None
-            del(cache_dict[key2])
+        search_type_obj = SearchType.get(search_type)
+        table = search_type_obj.get_table()
+
+        # clears the per request and the process wide caches
+        sql.clear_table_cache(table=table)
 
 
     clear_column_cache = classmethod(clear_column_cache)
@@ -6544,19 +7101,51 @@ class SearchType(SObject):
     create = classmethod(create)
 
 
-    def fast_create_from_class_path(cls, class_name, search_type, columns, result, module_name=None, fast_data=None):
+    def get_sobject_class(cls, class_path):
+        '''get the class for a class path.  The class is resolved once per
+        process and cached until sthpw/search_object changes'''
+        sobject_class = SOBJECT_CLASS_CACHE.get(class_path)
+        if sobject_class:
+            return sobject_class
 
-        if not module_name:
-            (module_name, class_name) = Common.breakup_class_path(class_name)
+        (module_name, class_name) = Common.breakup_class_path(class_path)
 
-        #try:
-        module = sys.modules.get(module_name)
-        if not module:
-            __import__(module_name)
+        try:
             module = sys.modules.get(module_name)
+            if not module:
+                __import__(module_name)
+                module = sys.modules.get(module_name)
+            sobject_class = getattr(module, class_name)
+        except (ImportError, AttributeError) as e:
+            raise SearchException("Class_path [%s] does not exist" % class_path)
+
+        SOBJECT_CLASS_CACHE[class_path] = sobject_class
+        return sobject_class
+    get_sobject_class = classmethod(get_sobject_class)
+
+
+    def clear_sobject_class_cache(cls):
+        '''clear the resolved sobject classes'''
+        SOBJECT_CLASS_CACHE.clear()
+    clear_sobject_class_cache = classmethod(clear_sobject_class_cache)
+
+
+    def fast_create_from_class_path(cls, class_name, search_type, columns, result, module_name=None, fast_data=None):
+
+        if module_name:
+            class_path = "%s.%s" % (module_name, class_name)
+        else:
+            class_path = class_name
+
+        sobject_class = cls.get_sobject_class(class_path)
+        return cls.fast_create_from_class(sobject_class, search_type, columns, result, fast_data=fast_data)
+    fast_create_from_class_path = classmethod(fast_create_from_class_path)
+
+
+    def fast_create_from_class(cls, sobject_class, search_type, columns, result, fast_data=None):
 
         try:
-            object = getattr(module, class_name)(search_type, columns, result, fast_data=fast_data)
+            object = sobject_class(search_type, columns, result, fast_data=fast_data)
         except Exception as e:
             #if class_name == "SearchType":
             if True:
@@ -6571,11 +7160,11 @@ class SearchType(SObject):
                 print(str(e))
                 print("-"*50)
 
-            print("WARNING: class [%s] does not accept fast_data" % class_name)
-            object = getattr(module, class_name)(search_type, columns, result)
+            print("WARNING: class [%s] does not accept fast_data" % sobject_class.__name__)
+            object = sobject_class(search_type, columns, result)
 
         return object
-    fast_create_from_class_path = classmethod(fast_create_from_class_path)
+    fast_create_from_class = classmethod(fast_create_from_class)
 
 
 
@@ -0,0 +1,161 @@
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['SearchCursor']
+
+import base64, datetime, decimal, hashlib, re
+
+import six
+basestring = six.string_types
+
+from pyasm.common import jsonloads, jsondumps
+from .search import SearchException
+
+
+class SearchCursor(object):
+    '''Pages through the results of a search using the values of the
+    last sobject of the previous page (keyset pagination) instead of an
+    offset.  Each page is found with the index of the order by columns, so
+    later pages are as fast as the first and rows inserted or deleted
+    between pages do not shift the pages.
+
+    The position is kept in an opaque token.  An empty token starts at the
+    first page and a token of None is returned after the last page.  The
+    id column is always added as the last order by so that the order is
+    unique.  Rows with NULL values are placed where the database orders
+    them: PostgreSQL and Oracle sort NULL after all other values, while
+    SQLite, MySQL and SQL Server sort it before them.
+    '''
+
+    VERSION = 1
+
+    def __init__(self, search, order_bys=None, filters=None):
+        self.search = search
+
+        if not order_bys:
+            order_bys = []
+        elif isinstance(order_bys, basestring):
+            order_bys = [order_bys]
+
+        self.order_bys = []
+        for order_by in order_bys:
+            for item in order_by.split(","):
+                item = item.strip()
+                if not item:
+                    continue
+                parts = item.split()
+                column = parts[0]
+                direction = 'asc'
+                if len(parts) == 2:
+                    direction = parts[1].lower()
+                if len(parts) > 2 or direction not in ['asc', 'desc'] or not re.match(r"^\w+$", column):
+                    raise SearchException("Order by [%s] cannot be used with a cursor" % item)
+                self.order_bys.append( (column, direction) )
+
+        id_col = search.get_id_col()
+        if id_col not in [x[0] for x in self.order_bys]:
+            self.order_bys.append( (id_col, 'asc') )
+
+        # identifies the query so that a token is not used on another one
+        signature = jsondumps([search.get_search_type(), self.order_bys, filters])
+        self.signature = hashlib.md5(signature.encode()).hexdigest()[:16]
+
+
+    def apply(self, token=None):
+        '''add the order bys and the position of the token to the search'''
+        for column, direction in self.order_bys:
+            if self.search.add_order_by("%s %s" % (column, direction)) == False:
+                raise SearchException("Column [%s] cannot be used to order a cursor" % column)
+
+        if not token:
+            return
+
+        values = self.decode_token(token)
+        null_largest = self.search.get_database_impl().is_null_largest()
+
+        # find all the rows after the last one:
+        #   (a > x) or (a = x and b > y) or (a = x and b = y and id > z)
+        self.search.add_op("begin")
+        for i, (column, direction) in enumerate(self.order_bys):
+            value = values[i]
+            nulls_last = (direction == 'asc') == null_largest
+            if value is None and nulls_last:
+                # nothing comes after NULL
+                continue
+
+            self.search.add_op("begin")
+            for prev_column, prev_value in zip([x[0] for x in self.order_bys[:i]], values[:i]):
+                if prev_value is None:
+                    self.search.add_null_filter(prev_column)
+                else:
+                    self.search.add_filter(prev_column, prev_value)
+
+            if direction == 'asc':
+                op = ">"
+            else:
+                op = "<"
+
+            if value is None:
+                self.search.add_filter(column, "NULL", quoted=False, op="is not")
+            elif nulls_last:
+                self.search.add_op("begin")
+                self.search.add_filter(column, value, op=op)
+                self.search.add_null_filter(column)
+                self.search.add_op("or")
+            else:
+                self.search.add_filter(column, value, op=op)
+            self.search.add_op("and")
+        self.search.add_op("or")
+
+
+    def get_next_token(self, sobjects, limit):
+        '''get the token of the page after these sobjects.  Returns None if
+        this is the last page'''
+        if not sobjects or len(sobjects) < limit:
+            return None
+
+        last = sobjects[-1]
+        values = []
+        for column, direction in self.order_bys:
+            value = last.get_value(column, auto_convert=False)
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = str(value)
+            elif isinstance(value, decimal.Decimal):
+                value = str(value)
+            values.append(value)
+
+        data = {
+            'v': self.VERSION,
+            's': self.signature,
+            'k': values,
+        }
+        token = base64.urlsafe_b64encode(jsondumps(data).encode())
+        return token.decode()
+
+
+    def decode_token(self, token):
+        try:
+            if not isinstance(token, bytes):
+                token = token.encode()
+            data = jsonloads(base64.urlsafe_b64decode(token).decode())
+        except Exception:
+            raise SearchException("Invalid cursor")
+
+        if data.get('v') != self.VERSION or data.get('s') != self.signature:
+            raise SearchException("Cursor does not match the query")
+
+        values = data.get('k')
+        if len(values) != len(self.order_bys):
+            raise SearchException("Invalid cursor")
+        return values
+
+
@@ -92,6 +92,8 @@ class SearchTest(unittest.TestCase):
             self._test_order_by()
             self._test_search_key()
             self._test_search()
+            self._test_iter_sobjects()
+            self._test_compact_mode()
             self._test_multi_db_subselect()
 
             # FIXME: this requires sample3d project
@@ -106,6 +108,7 @@ class SearchTest(unittest.TestCase):
             self._test_parent_search()
             self._test_add_column_search()
             self._test_commit()
+            self._test_commit_many()
             self._test_set_value()
             self._test_search_set_value()
             self._test_get_by_statement()
@@ -459,6 +462,47 @@ class SearchTest(unittest.TestCase):
             login_sobject = search.add_relationship_filter(sobjects[0])
 
 
+    def _test_iter_sobjects(self):
+
+        search = Search("unittest/person")
+        search.add_order_by("name_first")
+        expected = [x.get_code() for x in search.get_sobjects()]
+
+        # use a small batch size to go through several batches
+        search = Search("unittest/person")
+        search.add_order_by("name_first")
+        codes = []
+        for sobject in search.iter_sobjects(batch_size=2):
+            self.assertEqual(True, isinstance(sobject, SObject))
+            codes.append(sobject.get_code())
+
+        self.assertEqual(expected, codes)
+        self.assertEqual(True, len(codes) > 2)
+
+
+    def _test_compact_mode(self):
+
+        search = Search("unittest/person")
+        search.add_order_by("code")
+        sobjects = search.get_sobjects()
+
+        search = Search("unittest/person")
+        search.add_order_by("code")
+        search.set_compact_mode(True)
+        compact_sobjects = search.get_sobjects()
+
+        self.assertEqual(len(sobjects), len(compact_sobjects))
+        for sobject, compact_sobject in zip(sobjects, compact_sobjects):
+            self.assertEqual(sobject.get_data(), compact_sobject.get_data())
+            self.assertEqual(sobject.get_value("timestamp"), compact_sobject.get_value("timestamp"))
+
+        # setting a value promotes the row to a dictionary
+        compact_sobject = compact_sobjects[0]
+        compact_sobject.set_value("name_first", "Compact")
+        self.assertEqual(dict, type(compact_sobject.data))
+        self.assertEqual("Compact", compact_sobject.get_value("name_first"))
+
+
     def _test_search_type(self):
         '''test that search types behave properly for templating'''
         SearchType.set_global_template("project", "unittest")
@@ -468,6 +512,17 @@ class SearchTest(unittest.TestCase):
         key = sobject.get_search_type()
         self.assertEqual(key, "unittest/person?project=unittest")
 
+        # sobject classes are resolved once and cached
+        sobject_class = SearchType.get_sobject_class("pyasm.search.SObject")
+        self.assertEqual(SObject, sobject_class)
+        self.assertEqual(sobject_class, SearchType.get_sobject_class("pyasm.search.SObject"))
+        try:
+            SearchType.get_sobject_class("pyasm.search.NoSuchSObject")
+        except SearchException:
+            pass
+        else:
+            self.fail("No exception for a non-existent class")
+
 
 
     def _test_metadata(self):
@@ -894,6 +949,40 @@ class SearchTest(unittest.TestCase):
         self.assertEqual(note.get_value('note'), "3 slashes \\\\\\")
 
 
+    def _test_commit_many(self):
+
+        persons = []
+        for i in range(0, 5):
+            person = SearchType.create("unittest/person")
+            person.set_value("name_first", "bulk%s" % i)
+            person.set_value("name_last", "commit")
+            persons.append(person)
+
+        SObject.commit_many(persons)
+
+        ids = [x.get_id() for x in persons]
+        self.assertEqual(5, len(set(ids)))
+        for person in persons:
+            self.assertNotEqual(-1, person.get_id())
+            self.assertNotEqual("", person.get_code())
+
+        search = Search("unittest/person")
+        search.add_filter("name_last", "commit")
+        search.add_order_by("name_first")
+        sobjects = search.get_sobjects()
+        self.assertEqual(["bulk%s" % i for i in range(0, 5)], [x.get_value("name_first") for x in sobjects])
+
+        # update them all in bulk
+        for person in persons:
+            person.set_value("name_last", "committed")
+        SObject.commit_many(persons)
+
+        search = Search("unittest/person")
+        search.add_filter("name_last", "committed")
+        self.assertEqual(5, search.get_count())
+        self.assertEqual("committed", persons[0].get_value("name_last"))
+
+
     def _test_set_value(self):
         ''' test with different Database Impl'''
         update = Update()
@@ -10,18 +10,13 @@
 #
 #
 
-__all__ = ["SqlException", "DatabaseException", "Sql", "DbContainer", "DbResource", "DbPasswordUtil", "Select", "Insert", "Update", "Delete", "CreateTable", "DropTable", "AlterTable", 'CreateView']
+__all__ = ["SqlException", "DatabaseException", "Sql", "DbContainer", "DbConnectionPool", "DbListener", "DbResource", "DbPasswordUtil", "Select", "Insert", "MultiInsert", "Update", "Delete", "CreateTable", "DropTable", "AlterTable", 'CreateView']
 
 
 import os, types, sys
-import re, datetime
+import re, datetime, time
 
-try:
-    import thread
-except:
-    import _thread as thread
-
-from threading import Lock
+from threading import Lock, Condition
 
 from pyasm.common import Container, Config, TacticException, Environment
 from dateutil.tz import *
@@ -341,41 +336,29 @@ class Sql(Base):
 
 
 
+    def get_table_info_cache(self):
+        '''get the process wide table metadata cache for this database'''
+        from pyasm.biz import TableInfoCache
+        return TableInfoCache.get_by_db_resource(self.get_db_resource())
+
+
     def get_columns(self,table=None,use_cache=True):
         '''Returns a list of string ordered columns contained in this table
         '''
         db_resource = self.get_db_resource()
-        database = self.get_database_name()
 
-        from pyasm.security import Site
-        #use_cache = False
-        site = Site.get_site()
-        if site:
-            key = '%s:%s:%s' %(site, db_resource, table)
-        else:
-            key = '%s:%s' %(db_resource, table)
+        cache = None
         if use_cache:
-            columns = Container.get_dict("Sql:table_columns", key)
-            if columns:
-                return list(columns)
-
-            # use global cache
-            if database == 'sthpw':
-                from pyasm.biz import CacheContainer
-                if site:
-                    cache = CacheContainer.get("%s:sthpw_column_info" % site)
-                else:
-                    cache = CacheContainer.get("sthpw_column_info")
-                if cache:
-                    columns = cache.get_value_by_key("columns", table)
-                    if columns != None:
-                        return list(columns)
+            cache = self.get_table_info_cache()
+            columns = cache.get_columns(table)
+            if columns != None:
+                return columns
 
         impl = self.get_database_impl()
         columns = impl.get_columns(db_resource, table)
 
-        if use_cache:
-            Container.put_dict("Sql:table_columns", key, columns)
+        if cache:
+            cache.add_columns(table, columns)
 
         return list(columns)
 
@@ -388,8 +371,19 @@ class Sql(Base):
 
 
     def get_column_info(self, table, column=None, use_cache=True):
-        impl = self.get_database_impl()
-        info = impl.get_column_info(self.get_db_resource(), table)
+        cache = None
+        info = None
+        if use_cache:
+            cache = self.get_table_info_cache()
+            info = cache.get_column_info(table)
+
+        if info == None:
+            impl = self.get_database_impl()
+            info = impl.get_column_info(self.get_db_resource(), table)
+            # do not remember tables that do not exist (yet)
+            if cache and info:
+                cache.add_table(table, info)
+
         if not column:
             return info
         else:
@@ -397,12 +391,18 @@ class Sql(Base):
 
 
     def get_column_types(self, table):
-        impl = self.get_database_impl()
-        return impl.get_column_types(self.get_db_resource(), table)
+        info = self.get_column_info(table)
+        column_dict = {}
+        for key, value in info.items():
+            column_dict[key] = value.get('data_type')
+        return column_dict
 
     def get_column_nullables(self, table):
-        impl = self.get_database_impl()
-        return impl.get_column_nullables(self.get_db_resource(), table)
+        info = self.get_column_info(table)
+        column_dict = {}
+        for key, value in info.items():
+            column_dict[key] = value.get('nullable')
+        return column_dict
 
 
     def is_in_transaction(self):
@@ -801,6 +801,70 @@ class Sql(Base):
             raise SqlException("%s: %s\n" % (self.DO_QUERY_ERR, query))
 
 
+    def iter_query(self, query, batch_size=1000):
+        '''execute a query and yield the results in batches of at most
+        batch_size rows.  On PostgreSQL, this uses a server-side (named)
+        cursor so that the full result set is never held in memory.  Other
+        databases use a regular cursor with fetchmany().
+
+        The cursor description is available through
+        get_columns_from_description() once the first batch is yielded'''
+        if not self.conn:
+            self.connect()
+
+        if isinstance(query, Select):
+            query = query.get_statement()
+
+        self.query = query
+
+        if self.vendor == "PostgreSQL":
+            # use a held cursor so that it survives a commit issued while
+            # the results are being consumed
+            cursor_name = "spt_cursor_%s" % Common.generate_random_key(digits=10)
+            cursor = self.conn.cursor(cursor_name, withhold=True)
+            cursor.itersize = batch_size
+        else:
+            cursor = self.conn.cursor()
+
+        is_oracle = self.get_database_type() == "Oracle"
+        if is_oracle:
+            import cx_Oracle
+
+        try:
+            try:
+                cursor.execute(query)
+            except self.pgdb.Error as e:
+                print("ERROR: %s: "%self.DO_QUERY_ERR, str(e), str(query))
+                raise SqlException("%s: %s\n" % (self.DO_QUERY_ERR, query))
+
+            while True:
+                results = cursor.fetchmany(batch_size)
+                # named cursors only have a description after a fetch
+                self.description = cursor.description
+                if not results:
+                    break
+
+                # copy the data structure because LOBs in Oracle become stale
+                if is_oracle:
+                    results = [[str(y) if isinstance(y, cx_Oracle.LOB) else y for y in x] for x in results]
+
+                yield results
+
+                if len(results) < batch_size:
+                    break
+        finally:
+            try:
+                cursor.close()
+            except self.pgdb.Error:
+                pass
+
+            # a held cursor starts a transaction, so end it if the
+            # connection is not in a transaction
+            if self.vendor == "PostgreSQL" and self.transaction_count == 0:
+                self.conn.commit()
+
+
+
     def get_value(self, query):
         '''convenience function when you know there will be only one result'''
         result = self.do_query(query)
@@ -889,6 +953,67 @@ class Sql(Base):
 
 
 
+    def do_update_many(self, statements):
+        '''execute a list of update statements on a single cursor.  This
+        avoids the per statement overhead of do_update.  Returns the list of
+        row ids generated by each statement (for vendors that report them)'''
+        row_ids = []
+        if not statements:
+            return row_ids
+
+        query = None
+        try:
+            if not self.conn:
+                self.connect()
+
+            self.cursor = self.conn.cursor()
+
+            row_count = 0
+            for query in statements:
+                self.query = query
+                self.cursor.execute(query)
+                row_count += self.cursor.rowcount
+
+                if self.vendor == 'Sqlite':
+                    self.last_row_id = self.cursor.lastrowid
+                elif self.vendor == 'MySQL':
+                    self.last_row_id = self.conn.insert_id()
+                else:
+                    self.last_row_id = 0
+                row_ids.append(self.last_row_id)
+
+            self.row_count = row_count
+            self.cursor.close()
+
+            # commit the transaction if there is no transaction
+            if self.transaction_count == 0:
+                self.transaction_count = 1
+                self.commit()
+
+        except self.pgdb.Error as e:
+            print("Error with query (Error): ", self.database_name, query)
+            raise SqlException(e.__str__())
+
+        return row_ids
+
+
+
+    def notify(self, channel, payload=None):
+        '''send a notification to the listeners of a channel.  The
+        notification is delivered when the current transaction commits.
+        Returns False if the database does not support notifications'''
+        if self.get_database_type() != "PostgreSQL":
+            return False
+
+        if payload:
+            statement = 'NOTIFY "%s", %s' % (channel, Sql.quote(payload))
+        else:
+            statement = 'NOTIFY "%s"' % channel
+        self.do_update(statement)
+        return True
+
+
+
     def update_single(self, statement_obj):
         '''insert/updates a single statement.  This is a convenience function
         which returns the id of the update row.  It also checks that
@@ -943,6 +1068,36 @@ class Sql(Base):
         self.conn = None
 
 
+    def is_connection_valid(self):
+        '''check that the underlying connection is still alive.  This issues
+        a trivial statement on the connection and returns False on any
+        failure'''
+        if not self.conn:
+            return False
+
+        # psycopg2 flags connections closed by the server
+        if getattr(self.conn, "closed", 0):
+            return False
+
+        statement = self.database_impl.get_validate_statement()
+        if not statement:
+            return True
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(statement)
+            cursor.fetchall()
+            cursor.close()
+
+            # do not leave an open transaction on a pooled connection
+            if self.transaction_count == 0:
+                self.conn.rollback()
+        except Exception as e:
+            return False
+
+        return True
+
+
 
     def dump(self):
         print(self.results)
@@ -1092,13 +1247,14 @@ class Sql(Base):
 
 
 
-    def clear_table_cache(cls, database=None):
+    def clear_table_cache(self, database=None, table=None):
+        '''clear the cached table information of this database.  If a table
+        is given, only that table is cleared'''
         #if not database:
         #    database = Project.get().get_database_name()
         #key = "Sql:%s:tables"% database
         #Container.remove(key)
-        DatabaseImpl.clear_table_cache()
-    clear_table_cache = classmethod(clear_table_cache)
+        DatabaseImpl.clear_table_cache(db_resource=self.get_db_resource(), table=table)
 
 
     def table_exists(self, table):
@@ -1313,6 +1469,420 @@ class DbResource(Base):
 
 
 
+class DbConnectionPool(object):
+    '''A bounded pool of Sql connections to a single DbResource which is
+    shared by all of the threads in the process.
+
+    Connections are checked out for the duration of a thread's request
+    and checked back in by DbContainer.release_thread_sql().  The pool
+    enforces a maximum number of open connections (threads will block up
+    to a timeout waiting for one), validates connections that have been
+    idle for a while before handing them out and evicts connections that
+    have been idle or alive for too long.
+
+    The following options are read from the <database> section of the
+    config file:
+
+        pool_max_connections - maximum number of idle connections kept
+        pool_min_size - number of idle connections kept warm by maintain()
+        pool_max_size - maximum number of open connections (0 = unbounded)
+        pool_timeout - seconds to wait for a connection before failing
+        pool_max_idle_time - seconds before an idle connection is evicted
+        pool_max_lifetime - seconds before a connection is recycled
+        pool_validate_interval - idle seconds after which a connection
+            is validated on checkout (0 = always validate)
+    '''
+
+    def __init__(self, db_resource, **kwargs):
+        self.db_resource = db_resource
+        if DbResource.is_instance(db_resource):
+            self.key = db_resource.get_key()
+        else:
+            self.key = db_resource
+
+        self.max_idle = self._get_option(kwargs, "pool_max_connections", 0)
+        self.min_size = self._get_option(kwargs, "pool_min_size", 0)
+        self.max_size = self._get_option(kwargs, "pool_max_size", 0)
+        self.timeout = self._get_option(kwargs, "pool_timeout", 30)
+        self.max_idle_time = self._get_option(kwargs, "pool_max_idle_time", 300)
+        self.max_lifetime = self._get_option(kwargs, "pool_max_lifetime", 3600)
+        self.validate_interval = self._get_option(kwargs, "pool_validate_interval", 30)
+
+        if self.max_size and self.max_idle > self.max_size:
+            self.max_idle = self.max_size
+        if self.min_size > self.max_idle:
+            self.min_size = self.max_idle
+
+        # Sqlite cannot share connections across threads
+        if DbResource.is_instance(db_resource) and \
+                db_resource.get_vendor() == 'Sqlite':
+            self.max_idle = 0
+            self.min_size = 0
+
+        self.cond = Condition(Lock())
+
+        # idle connections: the most recently used is at the end
+        self.idle = []
+        self.num_open = 0
+        self.num_in_use = 0
+
+        self.stats = {
+            'checkouts': 0,
+            'checkins': 0,
+            'connects': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'timeouts': 0,
+            'validations': 0,
+            'validation_failures': 0,
+            'idle_evictions': 0,
+            'lifetime_evictions': 0,
+            'overflow_closes': 0,
+        }
+
+
+    def _get_option(self, kwargs, name, default):
+        value = kwargs.get(name)
+        if value in [None, ""]:
+            value = Config.get_value("database", name)
+        if value in [None, ""]:
+            return default
+        try:
+            return type(default)(value)
+        except ValueError:
+            print("WARNING: invalid value [%s] for database/%s" % (value, name))
+            return default
+
+
+    def get_key(self):
+        return self.key
+
+
+    def __len__(self):
+        '''number of idle connections in the pool'''
+        return len(self.idle)
+
+
+    def _is_expired(self, sql, now):
+        if self.max_lifetime and \
+                now - getattr(sql, "pool_created", now) > self.max_lifetime:
+            return "lifetime_evictions"
+        if self.max_idle_time and \
+                now - getattr(sql, "pool_last_used", now) > self.max_idle_time:
+            return "idle_evictions"
+        return None
+
+
+    def _evict(self, now, keep=0):
+        '''remove expired idle connections from the pool.  Must be called
+        with the lock held.  Returns the connections that need to be
+        closed'''
+        expired = []
+        remaining = []
+        # the oldest connections are at the front
+        num_idle = len(self.idle)
+        for i, sql in enumerate(self.idle):
+            reason = self._is_expired(sql, now)
+            # keep enough warm connections unless they are too old
+            if reason == "idle_evictions" and num_idle - len(expired) <= keep:
+                reason = None
+            if reason:
+                self.stats[reason] += 1
+                expired.append(sql)
+            else:
+                remaining.append(sql)
+
+        if expired:
+            self.idle = remaining
+            self.num_open -= len(expired)
+            self.cond.notify_all()
+        return expired
+
+
+    def _close(self, sqls):
+        for sql in sqls:
+            try:
+                sql.close()
+            except Exception as e:
+                print("WARNING: error closing connection [%s]: %s" % (self.key, e))
+
+
+    def checkout(self, timeout=None):
+        '''get a connection from the pool, opening a new one if the pool
+        is empty and the maximum has not been reached, otherwise waiting
+        for one to be checked in'''
+        if timeout == None:
+            timeout = self.timeout
+
+        start = None
+        while True:
+            sql = None
+            expired = []
+            self.cond.acquire()
+            try:
+                while True:
+                    now = time.time()
+                    expired.extend( self._evict(now, keep=self.min_size) )
+
+                    if self.idle:
+                        sql = self.idle.pop()
+                        break
+
+                    if not self.max_size or self.num_open < self.max_size:
+                        self.num_open += 1
+                        break
+
+                    # wait for a connection to be returned
+                    if start == None:
+                        start = now
+                        self.stats['waits'] += 1
+
+                    remaining = timeout - (now - start)
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise DatabaseException("Timed out after [%s] seconds waiting for a connection to [%s]: %s open" % (timeout, self.key, self.num_open))
+                    self.cond.wait(remaining)
+
+                self.num_in_use += 1
+                self.stats['checkouts'] += 1
+                if start != None:
+                    wait_time = time.time() - start
+                    self.stats['wait_time'] += wait_time
+                    if wait_time > self.stats['max_wait_time']:
+                        self.stats['max_wait_time'] = wait_time
+            finally:
+                self.cond.release()
+
+            # network operations are done outside of the lock
+            self._close(expired)
+
+            if sql == None:
+                try:
+                    sql = Sql(self.db_resource)
+                    sql.connect()
+                except:
+                    self._release_slot()
+                    raise
+                sql.pool_created = time.time()
+                self._add_stats('connects')
+                return sql
+
+            # validate connections that have been sitting idle
+            idle_time = time.time() - getattr(sql, "pool_last_used", 0)
+            if idle_time < self.validate_interval:
+                return sql
+
+            self._add_stats('validations')
+            if sql.is_connection_valid():
+                return sql
+
+            self._add_stats('validation_failures')
+            print("WARNING: discarding dead connection to [%s]" % self.key)
+            self.discard(sql)
+
+
+    def _add_stats(self, key):
+        '''stats are updated under the pool lock, so this is only used
+        for work done outside of it'''
+        self.cond.acquire()
+        try:
+            self.stats[key] += 1
+        finally:
+            self.cond.release()
+
+
+    def _release_slot(self):
+        self.cond.acquire()
+        try:
+            self.num_open -= 1
+            self.num_in_use -= 1
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+
+    def checkin(self, sql):
+        '''return a connection to the pool.  The connection is closed if
+        the pool already holds enough idle connections'''
+        close = False
+        self.cond.acquire()
+        try:
+            now = time.time()
+            self.num_in_use -= 1
+            self.stats['checkins'] += 1
+
+            if not sql.get_connection():
+                self.num_open -= 1
+            elif self._is_expired(sql, now) == "lifetime_evictions":
+                self.stats['lifetime_evictions'] += 1
+                self.num_open -= 1
+                close = True
+            elif len(self.idle) >= self.max_idle:
+                self.stats['overflow_closes'] += 1
+                self.num_open -= 1
+                close = True
+            else:
+                sql.pool_last_used = now
+                self.idle.append(sql)
+
+            self.cond.notify()
+        finally:
+            self.cond.release()
+
+        if close:
+            self._close([sql])
+
+
+    def discard(self, sql):
+        '''close a checked out connection and remove it from the pool'''
+        self._release_slot()
+        self._close([sql])
+
+
+    def maintain(self):
+        '''evict expired idle connections and open connections up to
+        the minimum size'''
+        self.cond.acquire()
+        try:
+            expired = self._evict(time.time(), keep=self.min_size)
+            num_new = self.min_size - len(self.idle)
+            if self.max_size:
+                num_new = min(num_new, self.max_size - self.num_open)
+            num_new = max(num_new, 0)
+            self.num_open += num_new
+        finally:
+            self.cond.release()
+
+        self._close(expired)
+
+        for i in range(0, num_new):
+            try:
+                sql = Sql(self.db_resource)
+                sql.connect()
+            except Exception as e:
+                print("WARNING: could not open connection to [%s]: %s" % (self.key, e))
+                self.cond.acquire()
+                try:
+                    self.num_open -= 1
+                    self.cond.notify()
+                finally:
+                    self.cond.release()
+                continue
+
+            now = time.time()
+            sql.pool_created = now
+            sql.pool_last_used = now
+
+            self.cond.acquire()
+            try:
+                self.stats['connects'] += 1
+                self.idle.insert(0, sql)
+                self.cond.notify()
+            finally:
+                self.cond.release()
+
+
+    def close_idle(self):
+        '''close all of the idle connections in the pool'''
+        self.cond.acquire()
+        try:
+            idle = self.idle
+            self.idle = []
+            self.num_open -= len(idle)
+            self.cond.notify_all()
+        finally:
+            self.cond.release()
+
+        self._close(idle)
+
+
+    def get_stats(self):
+        self.cond.acquire()
+        try:
+            stats = dict(self.stats)
+            stats['open'] = self.num_open
+            stats['idle'] = len(self.idle)
+            stats['in_use'] = self.num_in_use
+            stats['max_size'] = self.max_size
+            stats['min_size'] = self.min_size
+        finally:
+            self.cond.release()
+        return stats
+
+
+
+
+class DbListener(object):
+    '''Listens on a dedicated connection for notifications sent with
+    Sql.notify().  Only PostgreSQL supports notifications.'''
+
+    def __init__(self, db_resource, channel):
+        self.db_resource = db_resource
+        self.channel = channel
+        self.sql = None
+
+
+    def is_supported(self):
+        impl = self.db_resource.get_database_impl()
+        return impl.get_database_type() == "PostgreSQL"
+
+
+    def is_listening(self):
+        return self.sql != None
+
+
+    def listen(self):
+        if self.sql:
+            return
+
+        sql = Sql(self.db_resource)
+        sql.connect()
+
+        # notifications are only delivered outside of a transaction
+        conn = sql.get_connection()
+        conn.set_isolation_level(0)
+
+        cursor = conn.cursor()
+        cursor.execute('LISTEN "%s"' % self.channel)
+        cursor.close()
+
+        self.sql = sql
+
+
+    def wait(self, timeout):
+        '''wait for notifications until the timeout has passed.  Returns the
+        list of payloads received.  Connection errors are raised, after
+        which listen() has to be called again'''
+        import select
+
+        self.listen()
+        conn = self.sql.get_connection()
+        try:
+            if select.select([conn], [], [], timeout) == ([], [], []):
+                return []
+
+            conn.poll()
+            payloads = [x.payload for x in conn.notifies]
+            del conn.notifies[:]
+            return payloads
+        except Exception:
+            self.close()
+            raise
+
+
+    def close(self):
+        if not self.sql:
+            return
+        try:
+            self.sql.close()
+        except Exception:
+            pass
+        self.sql = None
+
+
+
+
 class DbContainer(Base):
     '''Class which maintains a pool of all of the connections
     to the database.  This allows global access to these
@@ -1365,23 +1935,10 @@ class DbContainer(Base):
     #
     # sql pooling methods
     #
-    #session_sql_dict = {}
-    #session_time_dict = {}
-    #session_max_lifespan = 60
 
-    if Sql.get_default_database_type() == 'Sqlite':
-        # Sqlite cannot share connections across threads
-        pool_max_connections = 0
-    else:
-        pool_max_connections = Config.get_value("database", "pool_max_connections")
-    if pool_max_connections != 0 and not pool_max_connections:
-        pool_max_connections = 0
-    else:
-        pool_max_connections = int(pool_max_connections)
-
-
-    # global connection pool
+    # global connection pools: one DbConnectionPool per DbResource key
     connection_pool = {}
+    pool_lock = Lock()
 
     def get_global_connection_pool(cls):
         '''gets the global connection pool. Do not use this data structure
@@ -1390,16 +1947,51 @@ class DbContainer(Base):
     get_global_connection_pool = classmethod(get_global_connection_pool)
 
 
+    def get_db_pool(cls, db_resource):
+        '''get the shared connection pool for a database resource'''
+        if DbResource.is_instance(db_resource):
+            database_key = db_resource.get_key()
+        else:
+            database_key = db_resource
+
+        pool = cls.connection_pool.get(database_key)
+        if pool == None:
+            cls.pool_lock.acquire()
+            try:
+                # check once again ( thread safe )
+                pool = cls.connection_pool.get(database_key)
+                if pool == None:
+                    pool = DbConnectionPool(db_resource)
+                    cls.connection_pool[database_key] = pool
+            finally:
+                cls.pool_lock.release()
+        return pool
+    get_db_pool = classmethod(get_db_pool)
+
+
+    def get_pool_stats(cls):
+        '''get the statistics of every global connection pool'''
+        stats = {}
+        for database_key, pool in list(cls.connection_pool.items()):
+            stats[database_key] = pool.get_stats()
+        return stats
+    get_pool_stats = classmethod(get_pool_stats)
+
+
+    def maintain_global_connections(cls):
+        '''evict expired connections and refill every global pool to
+        its minimum size'''
+        for database_key, pool in list(cls.connection_pool.items()):
+            pool.maintain()
+    maintain_global_connections = classmethod(maintain_global_connections)
+
+
     def close_all_global_connections(cls):
-        '''This doesn't close all of them in high volume because it is
-        rather a simple implementation, however in periods of low volume,
-        it should close all connections'''
-        connection_pool = cls.get_global_connection_pool()
-        for database, connections in connection_pool.items():
-            number = len(connections)
-            for i in range(0, number):
-                sql = cls.get_connection_pool_sql(database)
-                sql.close()
+        '''close all of the idle connections in the global pools.
+        Connections in use by other threads are closed when they are
+        checked back in'''
+        for database_key, pool in list(cls.connection_pool.items()):
+            pool.close_idle()
     close_all_global_connections = classmethod(close_all_global_connections)
 
 
@@ -1425,60 +2017,12 @@ class DbContainer(Base):
         if sql:
             return sql
 
+        # otherwise get it from the global connection pool.
+        pool = cls.get_db_pool(db_resource)
+        sql = pool.checkout()
 
-        # otherwise get it from the connection pool.
-        global_pool = cls.connection_pool.get(database_key)
-        if global_pool == None:
-            lock = thread.allocate_lock()
-            lock.acquire()
-
-            # check once again ( thread safe ) and create a new one if it doesn't exist
-
-            global_pool = cls.connection_pool.get(database_key)
-            if global_pool == None:
-                # create a new global pool
-                global_pool = []
-                cls.connection_pool[database_key] = global_pool
-
-            lock.release()
-
-        # if the pool is empty, then open a new database connection
-        lock = thread.allocate_lock()
-        #lock = Lock()
-        lock.acquire()
-
-        sql = None
-        try:
-            if not global_pool:
-
-                # before making a connection, make sure the user is even
-                # allowed to do so based on site locking
-                """
-                ticket = Environment.get_ticket()
-                site = "foo"
-                host = "localhost"
-                port = "5432"
-                if db_resource.get_port() != port:
-                    raise SQLException("Denied access to [%s]" % db_resource)
-                if db_resource.get_host() != host:
-                    raise SQLException("Denied access to [%s]" % db_resource)
-                """
-
-                sql = Sql(db_resource)
-                sql.connect()
-
-            else:
-
-                # otherwise reuse one from the pool
-                sql = global_pool.pop()
-                #import thread as xx
-                #print("CONNECT: reuse: ", database_key, sql, xx.get_ident())
-
-
-            # remember for this thread
-            thread_pool[database_key] = sql
-        finally:
-            lock.release()
+        # remember for this thread
+        thread_pool[database_key] = sql
 
         assert sql.get_connection()
         return sql
@@ -1486,13 +2030,24 @@ class DbContainer(Base):
     get_connection_pool_sql = classmethod(get_connection_pool_sql)
 
 
+    def _discard_thread_sql(cls, database_key, sql):
+        '''close a connection held by this thread and release its slot
+        in the global pool'''
+        pool = cls.connection_pool.get(database_key)
+        if pool:
+            pool.discard(sql)
+        else:
+            sql.close()
+    _discard_thread_sql = classmethod(_discard_thread_sql)
+
+
     def close_thread_sql(cls):
         # abort all of the open connections in this thread
         thread_pool = Container.get("DbContainer::thread_pool")
         if not thread_pool:
             return
         for database_key, sql in thread_pool.items():
-            sql.close()
+            cls._discard_thread_sql(database_key, sql)
         # clear the thread pool
         Container.put("DbContainer::thread_pool", {})
     close_thread_sql = classmethod(close_thread_sql)
@@ -1505,7 +2060,7 @@ class DbContainer(Base):
         thread_pool = Container.get("DbContainer::thread_pool")
         if not thread_pool:
             return
-        for database_key, sql in thread_pool.items():
+        for database_key, sql in list(thread_pool.items()):
             try:
                 sql.commit()
 
@@ -1513,7 +2068,7 @@ class DbContainer(Base):
                 print("WARNING: When trying to commit: ", e)
                 del(thread_pool[database_key])
             finally:
-                sql.close()
+                cls._discard_thread_sql(database_key, sql)
 
         # clear the thread pool
         Container.put("DbContainer::thread_pool", {})
@@ -1530,7 +2085,7 @@ class DbContainer(Base):
             try:
                 sql.rollback(force=force)
             finally:
-                sql.close()
+                cls._discard_thread_sql(database_key, sql)
         # clear the thread pool
         Container.put("DbContainer::thread_pool", {})
     abort_thread_sql = classmethod(abort_thread_sql)
@@ -1538,17 +2093,11 @@ class DbContainer(Base):
 
     def release_thread_sql(cls):
         # release all of the open connections back to the pool
-        #print("releasing: ", thread.get_ident())
-
-
-        lock = Lock()
-        lock.acquire()
+        thread_pool = Container.get("DbContainer::thread_pool")
+        if not thread_pool:
+            return
 
         try:
-            thread_pool = Container.get("DbContainer::thread_pool")
-            if not thread_pool:
-                return
-
             for database_key, sql in thread_pool.items():
                 # failsafe commit. When a db is not available, there is nothing to commit
                 # NOTE: implemented in 4.0
@@ -1556,30 +2105,20 @@ class DbContainer(Base):
                     sql.commit()
                 except SqlException as e:
                     print("WARNING: ", e.__str__())
-                # Do not pool sqlite. SQLite does not like sharing connection
-                # amongst threads
-                if sql.get_database_type() == 'Sqlite':
-                    sql.close()
+                    cls._discard_thread_sql(database_key, sql)
                     continue
 
-                # close any transactions
-                global_pool = cls.connection_pool.get(database_key)
-
-                if len(global_pool) < cls.pool_max_connections:
-                    # return the sql connection to the pool
-                    global_pool.append(sql)
+                pool = cls.connection_pool.get(database_key)
+                if pool:
+                    # Sqlite connections are never kept by the pool
+                    pool.checkin(sql)
                 else:
-                    # if the global pool is greater than a maximum / thread,
-                    # just release it completely
                     sql.close()
 
-
+        finally:
             # clear the thread pool
             Container.put("DbContainer::thread_pool", {})
 
-        finally:
-            lock.release()
-
     release_thread_sql = classmethod(release_thread_sql)
 
 
@@ -3022,9 +3561,6 @@ class Insert(object):
         # quote the values
         cols = list(self.data.keys())
         cols.sort()
-        values = []
-        for col in cols:
-            values.append(self.data.get(col))
 
         #if not cols:
         #    # add an empty row
@@ -3033,53 +3569,64 @@ class Insert(object):
         #    return statement
 
         statement = []
+        statement.append('INSERT INTO %s' % self.get_table_expr())
+
+        quoted_values = self.get_quoted_values(cols)
+
+        # This is Oracle specific.  In Oracle, there is no auto increment
+        # without creating triggers all over the place.
+        if database_type == "Oracle" and "id" not in cols:
+            cols.insert(0, "id")
+            sequence_name = self.impl.get_sequence_name(self.table, self.database)
+            #quoted_values.insert(0, '%s."%s".nextval' % (self.database,sequence_name))
+            quoted_values.insert(0, '%s.nextval' % (sequence_name))
+
+        statement.append( "(%s)" % ", ".join(['"%s"'%x for x in cols]) )
+        statement.append( "VALUES (%s)" % ", ".join(quoted_values) )
+
+        return self.encode_statement(statement)
 
 
+    def get_table_expr(self):
+        '''get the fully qualified table name used in the statement'''
+        database_type = self.impl.get_database_type()
         if self.database and database_type == "Oracle":
-            statement.append('INSERT INTO %s."%s"' % (self.database, self.table))
+            return '%s."%s"' % (self.database, self.table)
         #elif database_type == "SQLServer":
-        #    statement.append('INSERT INTO [%s]' % self.table)
-        else:
-            #statement.append('INSERT INTO "%s"' % self.table)
-            parts = []
-            if self.database:
-                parts.append('"%s"' % self.database)
-            if self.schema:
-                parts.append('"%s"' % self.schema)
-            parts.append('"%s"' % self.table)
-            table = ".".join(parts)
+        #    return '[%s]' % self.table
+
+        parts = []
+        if self.database:
+            parts.append('"%s"' % self.database)
+        if self.schema:
+            parts.append('"%s"' % self.schema)
+        parts.append('"%s"' % self.table)
+        return ".".join(parts)
 
-            statement.append('INSERT INTO %s' % table)
 
+    def get_quoted_values(self, cols):
+        '''get the list of quoted values for the given columns'''
+        database_type = self.impl.get_database_type()
 
         quoted_values = []
-
-        for i in range(0, len(cols)):
+        for col in cols:
             unicode_escape = False
-            value = values[i]
+            value = self.data.get(col)
 
-            if cols[i] in self.unquoted_cols:
-                quoted_values.append( str(values[i]) )
-            elif cols[i] in self.escape_quoted_cols:
-                quoted_values.append(Sql.quote(values[i], has_outside_quotes=False, escape=True))
+            if col in self.unquoted_cols:
+                quoted_values.append( str(value) )
+            elif col in self.escape_quoted_cols:
+                quoted_values.append(Sql.quote(value, has_outside_quotes=False, escape=True))
             else:
 
                 if database_type == 'SQLServer':
                     unicode_escape = True
-                quoted_values.append( Sql.quote(values[i], unicode_escape=unicode_escape) )
-        # This is Oracle specific.  In Oracle, there is no auto increment
-        # without creating triggers all over the place.
-        if database_type == "Oracle" and "id" not in cols:
-            cols.insert(0, "id")
-            sequence_name = self.impl.get_sequence_name(self.table, self.database)
-            #quoted_values.insert(0, '%s."%s".nextval' % (self.database,sequence_name))
-            quoted_values.insert(0, '%s.nextval' % (sequence_name))
-
-        statement.append( "(%s)" % ", ".join(['"%s"'%x for x in cols]) )
-        statement.append( "VALUES (%s)" % ", ".join(quoted_values) )
-
+                quoted_values.append( Sql.quote(value, unicode_escape=unicode_escape) )
+        return quoted_values
 
 
+    def encode_statement(self, statement):
+        '''join the parts of a statement, decoding them where necessary'''
         encoded_statements = []
 
 
@@ -3116,6 +3663,68 @@ class Insert(object):
 
 
 
+class MultiInsert(object):
+    '''A class to combine several Insert objects into multi-row insert
+    statements.  Inserts are grouped by their columns so that each group
+    is written with a single INSERT ... VALUES (...), (...) statement'''
+
+    def __init__(self, chunk_size=500):
+        self.inserts = []
+        self.chunk_size = chunk_size
+
+    def add_insert(self, insert):
+        self.inserts.append(insert)
+
+    def get_inserts(self):
+        return self.inserts
+
+
+    def get_statements(self):
+        '''get the list of statements needed to insert all of the rows'''
+        if not self.inserts:
+            return []
+
+        impl = self.inserts[0].impl
+        if not impl.has_multi_row_insert():
+            return [x.get_statement() for x in self.inserts]
+
+        # group the inserts that have exactly the same columns
+        groups = {}
+        group_keys = []
+        for insert in self.inserts:
+            impl.preprocess_sql(insert.data, insert.unquoted_cols)
+            cols = list(insert.data.keys())
+            cols.sort()
+            key = tuple(cols)
+            if key not in groups:
+                groups[key] = []
+                group_keys.append(key)
+            groups[key].append(insert)
+
+        statements = []
+        for key in group_keys:
+            inserts = groups[key]
+            cols = list(key)
+            for i in range(0, len(inserts), self.chunk_size):
+                chunk = inserts[i:i+self.chunk_size]
+                first = chunk[0]
+
+                statement = []
+                statement.append('INSERT INTO %s' % first.get_table_expr())
+                statement.append( "(%s)" % ", ".join(['"%s"'%x for x in cols]) )
+
+                rows = []
+                for insert in chunk:
+                    quoted_values = insert.get_quoted_values(cols)
+                    rows.append( "(%s)" % ", ".join(quoted_values) )
+                statement.append( "VALUES %s" % ", ".join(rows) )
+
+                statements.append( first.encode_statement(statement) )
+
+        return statements
+
+
+
 class Update(object):
     '''class that non-linearly builds up an update statement'''
 
@@ -3660,7 +4269,7 @@ class CreateTable(Base):
                 statement = self.get_statement()
                 sql.do_update(statement)
 
-            sql.clear_table_cache(self.database)
+            sql.clear_table_cache(self.database, table=self.table)
 
         else:
             print("WARNING: table [%s] exists ... skipping" % self.table)
@@ -3745,7 +4354,7 @@ class DropTable(Base):
             DbContainer.commit_thread_sql()
 
         sql.do_update(self.statement)
-        sql.clear_table_cache()
+        sql.clear_table_cache(table=self.table)
 
 
 
@@ -3860,6 +4469,8 @@ class AlterTable(CreateTable):
             statements = self.get_statements()
             for statement in statements:
                 sql.do_update(statement)
+
+            sql.clear_table_cache(table=self.table)
         else:
             print("WARNING: table [%s] does not exist ... skipping" % self.table)
 
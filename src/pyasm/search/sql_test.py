@@ -58,6 +58,8 @@ class SqlTest(unittest.TestCase):
 
 
             self._test_get_connect()
+            self._test_connection_pool()
+            self._test_table_info_cache()
             self._test_select_class()
             self._test_insert_class()
             self._test_update_class()
@@ -87,6 +89,47 @@ class SqlTest(unittest.TestCase):
 
         self.assertEqual(sql1, sql2)
 
+
+    def _test_connection_pool(self):
+        db_res = DbResource.get_default('unittest')
+        if db_res.get_vendor() == 'Sqlite':
+            return
+
+        pool = DbConnectionPool(db_res, pool_max_connections=1, pool_max_size=2, pool_timeout=0.1, pool_validate_interval=0)
+
+        sql1 = pool.checkout()
+        sql2 = pool.checkout()
+        self.assertEqual(2, pool.get_stats().get("open"))
+
+        # the pool is exhausted
+        try:
+            pool.checkout()
+        except DatabaseException:
+            pass
+        else:
+            self.fail("Checkout did not time out")
+        self.assertEqual(1, pool.get_stats().get("timeouts"))
+
+        # only one idle connection is kept
+        pool.checkin(sql1)
+        pool.checkin(sql2)
+        stats = pool.get_stats()
+        self.assertEqual(1, stats.get("idle"))
+        self.assertEqual(1, stats.get("overflow_closes"))
+
+        # dead connections are replaced on checkout
+        dead = pool.idle[0]
+        dead.close()
+        sql3 = pool.checkout()
+        self.assertNotEqual(dead, sql3)
+        self.assertEqual(True, sql3.is_connection_valid())
+        self.assertEqual(1, pool.get_stats().get("validation_failures"))
+
+        pool.checkin(sql3)
+        pool.close_idle()
+        self.assertEqual(0, pool.get_stats().get("open"))
+
+
     def _test_select_class(self):
         """ test a select """
         select = Select()
@@ -482,7 +525,7 @@ WHEN 'cow' THEN 1 \nWHEN 'dog' THEN 2 \nWHEN 'horse' THEN 3 \nELSE 4 END )''' %
 
         # clear cache
         SearchType.clear_column_cache(search_type)
-        cache_dict = Container.get("DatabaseImpl:column_info")
+        cache_dict = Container.get("DatabaseImpl:column_info") or {}
 
 
         # assume database is the same as sthpw
@@ -491,12 +534,35 @@ WHEN 'cow' THEN 1 \nWHEN 'dog' THEN 2 \nWHEN 'horse' THEN 3 \nELSE 4 END )''' %
         table_info = cache_dict.get("%s:%s" % (db_resource, "country"))
         self.assertEqual(table_info == None, True)
 
+        # the process wide cache is cleared as well
+        sql = DbContainer.get(db_resource)
+        cache = sql.get_table_info_cache()
+        self.assertEqual(None, cache.caches.get('data').get("country"))
 
-        key = "%s:%s" % (db_resource, "country")
-        cache_dict[key] = None
         exists = SearchType.column_exists(search_type, 'special_place')
         self.assertEqual(exists, False)
 
+
+    def _test_table_info_cache(self):
+        db_resource = DbResource.get_default('unittest')
+        sql = DbContainer.get(db_resource)
+        cache = sql.get_table_info_cache()
+
+        sql.clear_table_cache(table="person")
+        self.assertEqual(None, cache.get_columns("person"))
+
+        misses = cache.get_stats().get("misses")
+        hits = cache.get_stats().get("hits")
+
+        columns = sql.get_columns("person")
+        self.assertEqual(columns, cache.get_columns("person"))
+        self.assertEqual(columns, sql.get_columns("person"))
+        self.assertEqual(True, sql.table_exists("person"))
+
+        stats = cache.get_stats()
+        self.assertEqual(True, stats.get("misses") > misses)
+        self.assertEqual(True, stats.get("hits") >= hits + 2)
+
     def _test_join(self):
         """ test a select """
         Project.set_project('unittest')
@@ -50,6 +50,10 @@ class Transaction(Base):
         self.transaction_log = None
         self.change_timestamps = {}
         self.description = ""
+        self.commit_buffers = {}
+        self.commit_callbacks = []
+        self.rollback_buffers = {}
+        self.rollback_callbacks = []
 
     def set_record(self, record_flag):
         self.record_flag = record_flag
@@ -99,6 +103,30 @@ class Transaction(Base):
         return self.change_timestamps
 
 
+    def get_commit_buffer(self, key, callback):
+        '''get a list which is passed to callback once all of the databases
+        of the transaction have been committed.  The list is discarded if
+        the transaction is rolled back'''
+        buffer = self.commit_buffers.get(key)
+        if buffer == None:
+            buffer = []
+            self.commit_buffers[key] = buffer
+            self.commit_callbacks.append( (callback, buffer) )
+        return buffer
+
+
+    def get_rollback_buffer(self, key, callback):
+        '''get a list which is passed to callback once all of the databases
+        of the transaction have been rolled back.  The list is discarded if
+        the transaction is committed'''
+        buffer = self.rollback_buffers.get(key)
+        if buffer == None:
+            buffer = []
+            self.rollback_buffers[key] = buffer
+            self.rollback_callbacks.append( (callback, buffer) )
+        return buffer
+
+
 
 
 
@@ -172,6 +200,15 @@ class Transaction(Base):
             except SqlException:
                 print("ERROR: FAILED TO COMMIT", transaction_obj.get_database_name())
 
+        callbacks = self.commit_callbacks
+        self.commit_buffers = {}
+        self.commit_callbacks = []
+        for callback, buffer in callbacks:
+            try:
+                callback(buffer)
+            except Exception as e:
+                print("WARNING: commit callback failed: ", e)
+
         # check the number of nodes in the transaction.  If there are
         # no nodes, then nothing happened don't put this into the log
         nodes = self.xml.get_nodes("transaction/*")
@@ -221,7 +258,14 @@ class Transaction(Base):
             FileUndo.undo(node, ticket)
          
         # reset transaction and the counter
+        callbacks = self.rollback_callbacks
         self._reset()
+
+        for callback, buffer in callbacks:
+            try:
+                callback(buffer)
+            except Exception as e:
+                print("WARNING: rollback callback failed: ", e)
     
         # close connections, not sure if this is needed
         #from pyasm.search import DbContainer
@@ -639,7 +683,9 @@ class FileUndo:
         '''makes the src file look like it was just created (from orig)
         The difference with this and 'move' is that on undo, 'move' will
         move the file back to the src and this will move it to a cache
-        directory'''
+        directory.  When a file is copied, its checksum is calculated while
+        copying and returned'''
+        checksum = None
         if io_action:
             if src:
                 # take into account the situation where this is a link
@@ -650,7 +696,7 @@ class FileUndo:
                     if os.path.isdir(orig):
                         shutil.copytree(orig, src)
                     else:
-                        shutil.copy(orig,src)
+                        checksum = Checksum.copy_file(orig, src)
                 else:
                     shutil.move(orig,src)
             else:
@@ -659,6 +705,7 @@ class FileUndo:
         extra['orig'] = orig
 
         FileUndo._add_to_transaction_log("create", src, "", extra=extra)
+        return checksum
     create = staticmethod(create)
        
 
@@ -782,6 +829,60 @@ class FileUndo:
     symlink = staticmethod(symlink)
 
 
+
+    # ioctl to clone the blocks of a file (Linux btrfs, xfs)
+    FICLONE = 0x40049409
+
+    def link(src, dst, mode='hardlink'):
+        '''make dst share the data of an identical file src that is already
+        in the repository.  A hardlink shares the file itself, a reflink
+        only shares the blocks until one of them is changed.  If the link
+        cannot be made (another file system, no support), the file is
+        copied.  Returns the mode that was used'''
+        assert mode in ['hardlink','reflink']
+
+        dirname = os.path.dirname(dst)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+        if os.path.islink(dst):
+            os.unlink(dst)
+
+        try:
+            FileUndo._link(src, dst, mode)
+        except (OSError, IOError) as e:
+            print("WARNING: could not %s [%s] to [%s]: %s" % (mode, src, dst, e))
+            if os.path.exists(dst):
+                os.unlink(dst)
+            shutil.copy(src, dst)
+            mode = 'copy'
+
+        FileUndo._add_to_transaction_log("link", src, dst, {'mode': mode})
+        return mode
+
+    link = staticmethod(link)
+
+
+    def _link(src, dst, mode):
+        if mode == 'hardlink':
+            os.link(src, dst)
+            return
+
+        import fcntl
+        fsrc = open(src, 'rb')
+        try:
+            fdst = open(dst, 'wb')
+            try:
+                fcntl.ioctl(fdst.fileno(), FileUndo.FICLONE, fsrc.fileno())
+            finally:
+                fdst.close()
+        finally:
+            fsrc.close()
+        shutil.copymode(src, dst)
+
+    _link = staticmethod(_link)
+
+
     def _add_to_transaction_log(type, src, dst, extra={}):
 
         # remove the base from the beginning
@@ -847,6 +948,10 @@ class FileUndo:
                         os.unlink(dst)
                 else:
                     Environment.add_warning("Cannot delete", "Cannote remove nonexistent file/dir [%s]" % dst)
+            elif type == "link":
+                # the original file is left untouched
+                if os.path.exists(dst) or os.path.islink(dst):
+                    os.unlink(dst)
             elif type == "remove":
                 # move tmp file back
                 shutil.move(dst,src)
@@ -987,6 +1092,24 @@ class FileUndo:
                 shutil.copytree(src, dst)
             else:
                 shutil.copyfile(src, dst)
+        elif type == "link":
+            mode = Xml.get_attribute(node,"mode")
+            dirname = os.path.dirname(dst)
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            if os.path.exists(dst):
+                os.unlink(dst)
+
+            linked = False
+            if mode in ['hardlink','reflink']:
+                try:
+                    FileUndo._link(src, dst, mode)
+                    linked = True
+                except (OSError, IOError) as e:
+                    if os.path.exists(dst):
+                        os.unlink(dst)
+            if not linked:
+                shutil.copy(src, dst)
         elif type == "remove":
             shutil.move(src,dst)
         elif type == "mkdir":
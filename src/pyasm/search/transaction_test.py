@@ -48,6 +48,7 @@ class TransactionTest(unittest.TestCase):
             self._test_transaction()
             self._test_undo()
             self._test_file_undo()
+            self._test_file_link()
             self._test_debug_log()
         except:
             
@@ -236,6 +237,39 @@ class TransactionTest(unittest.TestCase):
         os.unlink(src2)
 
 
+    def _test_file_link(self):
+
+        tmpdir = Environment.get_tmp_dir()
+
+        src = "%s/test_link_src" % tmpdir
+        dst = "%s/temp/unittest_link/test_link_dst" % tmpdir
+
+        for path in [src, dst]:
+            if os.path.exists(path):
+                os.unlink(path)
+
+        file = open(src,"w")
+        file.write("whatever")
+        file.close()
+
+        transaction = Transaction.get(create=True)
+        mode = FileUndo.link(src, dst, 'hardlink')
+        transaction.commit()
+
+        self.assertEquals(True, os.path.exists(dst) )
+        self.assertEquals("whatever", open(dst).read() )
+        if mode == 'hardlink':
+            self.assertEquals(True, os.path.samefile(src, dst) )
+
+        TransactionLog.get_last().undo()
+
+        # the original file is not touched
+        self.assertEquals(True, os.path.exists(src) )
+        self.assertEquals(False, os.path.exists(dst) )
+
+        os.unlink(src)
+
+
     def _test_debug_log(self):
         '''tests that the debug log executes outside of a transaction'''
 
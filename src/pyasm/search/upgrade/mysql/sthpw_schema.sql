@@ -583,6 +583,7 @@ CREATE INDEX "status_log_stype_sid_idx" on "status_log" ("search_type", "search_
 CREATE INDEX "task_search_type_search_id_idx" on "task" ("search_type", "search_id");
 CREATE INDEX "con_d_stype_d_sid_con_idx" on "connection" ("dst_search_type", "dst_search_id", "context");
 CREATE INDEX "con_s_stype_s_sid_idx" on "connection" ("src_search_type", "src_search_id");
+CREATE INDEX "file_md5_st_size_idx" on "file" ("md5", "st_size");
 
 
 INSERT INTO "search_object" ("code", "search_type", "namespace", "description", "database", "table_name", "class_name", "title", "schema") VALUES ('sthpw/db_resource', 'sthpw/db_resource', 'sthpw', 'Database Resource', 'sthpw', 'db_resource', 'pyasm.search.SObject', 'Database Resource', 'public');
@@ -22,6 +22,12 @@ class SthpwUpgrade(BaseUpgrade):
     # 4.8.0.a01
     #
 
+    def upgrade_v4_8_0_b01_002(self):
+        self.run_sql('''
+        CREATE INDEX "file_md5_st_size_idx" on file (md5, st_size);
+        ''')
+
+
     def upgrade_v4_8_0_b01_001(self):
         if self.get_database_type() == 'PostgreSQL':
             self.run_sql('''
@@ -12,7 +12,7 @@
 
 __all__ = ['AccessManager', 'Sudo']
 
-import types
+import types, hashlib
 
 from pyasm.common import Base, Xml, Environment, Common, Container
 from pyasm.search import Search, SearchType
@@ -87,6 +87,9 @@ class Sudo(object):
 
 class AccessManager(Base):
 
+    # key of the cache of the compiled rules of each combination of groups
+    RULES_KEY = "access_rules"
+
     def __init__(self):
         self.is_admin_flag = False
         self.groups = {}
@@ -95,6 +98,11 @@ class AccessManager(Base):
         
         self.was_admin = None 
 
+        # the rules may be compiled rules shared with other threads, in
+        # which case they are copied before they are changed
+        self.is_shared = False
+        self.search_filters = None
+
 
 
     def get_access_summary(self):
@@ -218,6 +226,11 @@ class AccessManager(Base):
         if not rule_nodes:
             return
 
+        if self.is_shared:
+            self.groups = dict( [(x, y.copy()) for x, y in self.groups.items()] )
+            self.is_shared = False
+        self.search_filters = None
+
         # store all of the project codes (this will only run once)
         if self.project_codes == None:
             search = Search('sthpw/project')
@@ -551,11 +564,10 @@ class AccessManager(Base):
         if self.is_admin_flag:
             return True
 
-        group = "search_filter"
         search_type = search.get_base_search_type()
 
         self.alter_search_type_search(search)
-        rules = self.groups.get(group)
+        rules = self.get_search_filters().get(search_type)
         if not rules:
             return
 
@@ -567,18 +579,7 @@ class AccessManager(Base):
 
         # preprocess to get a list of rule that will apply
         rules_dict = {}
-        for rule_item in rules.values():
-            access, dct = rule_item
-
-            rule = dct
-            rule_search_type = rule.get('search_type')
-            if not rule_search_type:
-                print("No [search_type] defined in security rule")
-                continue
-
-            # search types must match
-            if rule_search_type != search_type:
-                continue
+        for rule in rules:
 
             project = rule.get('project')
            
@@ -676,6 +677,108 @@ class AccessManager(Base):
 
 
 
+    def get_search_filters(self):
+        '''get the search filter rules indexed by search type'''
+        if self.search_filters == None:
+            self.search_filters = self._build_search_filters(self.groups)
+        return self.search_filters
+
+
+    def _build_search_filters(self, groups):
+        search_filters = {}
+        rules = groups.get("search_filter")
+        if not rules:
+            return search_filters
+
+        for rule_item in rules.values():
+            access, rule = rule_item
+
+            rule_search_type = rule.get('search_type')
+            if not rule_search_type:
+                print("No [search_type] defined in security rule")
+                continue
+
+            rules_list = search_filters.get(rule_search_type)
+            if rules_list == None:
+                rules_list = []
+                search_filters[rule_search_type] = rules_list
+            rules_list.append(rule)
+
+        return search_filters
+    _build_search_filters = classmethod(_build_search_filters)
+
+
+
+    def add_group_rules(self, login_groups):
+        '''add the access rules of a list of login groups.  The rules of
+        each combination of groups are compiled once and are shared by
+        all threads'''
+        if self.groups or not login_groups:
+            # already has rules, so they have to be merged one at a time
+            for login_group in login_groups:
+                self.add_xml_rules(login_group)
+            return
+
+        compiled = self.get_compiled_rules(login_groups)
+        self.groups = compiled.get("groups")
+        self.search_filters = compiled.get("search_filters")
+        self.project_codes = compiled.get("project_codes")
+        self.is_shared = True
+
+
+    def get_compiled_rules(cls, login_groups):
+        '''get the compiled rules of a list of login groups'''
+        from pyasm.biz import CacheContainer, CustomCache
+        from pyasm.security import Site
+
+        rules_cache = CacheContainer.get(cls.RULES_KEY)
+        if rules_cache == None:
+            rules_cache = CustomCache(key=cls.RULES_KEY, action=dict)
+            from pyasm.command import ClearCacheTrigger
+            ClearCacheTrigger.register(cls.RULES_KEY, ['sthpw/login_group', 'sthpw/login_in_group', 'sthpw/project'])
+
+        # the key contains the rules themselves, so a changed group
+        # never matches an old key
+        key = [Site.get_site()]
+        for login_group in login_groups:
+            access_rules = login_group.get_value("access_rules") or ""
+            if not isinstance(access_rules, six.binary_type):
+                access_rules = access_rules.encode("utf-8")
+            key.append( (
+                login_group.get_value("login_group"),
+                login_group.get_value("project_code", no_exception=True),
+                hashlib.md5(access_rules).hexdigest()
+            ) )
+        key = tuple(key)
+
+        caches = rules_cache.caches
+        compiled = caches.get(key)
+        if compiled != None:
+            return compiled
+
+        access_manager = AccessManager()
+        for login_group in login_groups:
+            access_manager.add_xml_rules(login_group)
+
+        compiled = {
+            'groups': access_manager.groups,
+            'search_filters': access_manager.get_search_filters(),
+            'project_codes': access_manager.project_codes,
+        }
+        caches[key] = compiled
+        return compiled
+    get_compiled_rules = classmethod(get_compiled_rules)
+
+
+    def clear_compiled_rules(cls, notify=False):
+        '''clear the compiled rules of this process.  If notify is True,
+        the other processes clear their rules as well'''
+        from pyasm.command import ClearCacheTrigger
+        ClearCacheTrigger.clear_cache(cls.RULES_KEY, notify=notify)
+    clear_compiled_rules = classmethod(clear_compiled_rules)
+
+
+
     def alter_search_type_search(self, search):
         # special provision for various search types, particularly in
         # the sthpw database
@@ -1254,6 +1254,31 @@ class Ticket(SObject):
         return self.get_value("ticket")
 
 
+    def is_expired(self):
+        '''determines if the expiry of the ticket has passed.  Tickets
+        without an expiry do not expire'''
+        from datetime import datetime
+        from dateutil import parser
+
+        expiry = self.get_value("expiry")
+        if not expiry or expiry == "NULL":
+            return False
+
+        if isinstance(expiry, six.string_types):
+            try:
+                expiry = parser.parse(expiry)
+            except (ValueError, OverflowError):
+                # this could be an expression, such as "now()", of a
+                # ticket which was not committed
+                return False
+
+        if expiry.tzinfo:
+            now = datetime.now(expiry.tzinfo)
+        else:
+            now = datetime.now()
+        return expiry <= now
+
+
     def get_by_key(key):
         '''class method to get Ticket sobject by it's key'''
         # find the ticket in the database
@@ -1267,6 +1292,19 @@ class Ticket(SObject):
     def get_by_valid_key(key):
         '''class method to get Ticket sobject by it's key.  The key must be
         valid in that it has not yet expired.'''
+        # tickets validated recently are cached
+        from pyasm.biz import TicketCache
+        ticket_cache = TicketCache.get()
+        found, ticket = ticket_cache.get_ticket(key)
+        # a ticket which expired since it was cached is looked up again,
+        # as its expiry may have been extended
+        if found and ticket and ticket.is_expired():
+            found = False
+        if found:
+            if not ticket:
+                print("WARNING: Ticket [%s] is not valid" % key)
+            return ticket
+
         # find the ticket in the database
 
         from pyasm.security import Site
@@ -1302,6 +1340,8 @@ class Ticket(SObject):
             if site:
                 Site.pop_site()
 
+        ticket_cache.add_ticket(key, ticket)
+
         if not ticket:
             print("WARNING: Ticket [%s] is not valid" % key)
 
@@ -1384,6 +1424,10 @@ class Ticket(SObject):
             except SqlException as e:
                 print("Sql error has occured.")
 
+            # the key may have been cached as not valid
+            from pyasm.biz import TicketCache
+            TicketCache.get().remove_ticket(key, notify=False)
+
         return ticket
     create = staticmethod(create)
 
@@ -1394,9 +1438,27 @@ class Ticket(SObject):
         timeout = Config.get_value("security","inactive_ticket_expiry")
         if not timeout:
             return
+
+        # the expiry is extended at most once per interval.  The ticket may
+        # be shared through the ticket cache, so it is updated in the
+        # database without changing the sobject
+        from pyasm.biz import TicketCache
+        key = login_ticket.get_key()
+        if not TicketCache.get().should_update_expiry(key):
+            return
+
         offset,type = timeout.split(" ")
         expiry = impl.get_timestamp_now(offset=offset, type=type)
-        Ticket.update_expiry(login_ticket,expiry)
+
+        db_resource = login_ticket.get_db_resource()
+        update = Update()
+        update.set_database(db_resource)
+        update.set_table(login_ticket.get_table())
+        update.set_value("expiry", expiry, quoted=False)
+        update.add_filter("ticket", key)
+
+        sql = DbContainer.get(db_resource)
+        sql.do_update(update.get_statement())
 
     update_session_expiry = staticmethod(update_session_expiry)
 
@@ -2121,8 +2183,7 @@ class Security(Base):
 
     def add_access_rules(self):
         '''Add access rules for each group to the access manager.'''
-        for group in self._groups:
-            self._access_manager.add_xml_rules(group)
+        self._access_manager.add_group_rules(self._groups)
 
 
     def setup_access_manager(self):
@@ -203,6 +203,7 @@ class SecurityTest(unittest.TestCase):
             self._test_access_manager()
 
             self._test_guest_allow()
+            self._test_compiled_rules()
 
 
 
@@ -780,6 +781,43 @@ class SecurityTest(unittest.TestCase):
 
 
 
+    def _test_compiled_rules(self):
+        group = SearchType.create("sthpw/login_group")
+        group.set_value("login_group", "compiled_test")
+        group.set_value("access_rules", """
+        <rules>
+        <rule group='builtin' key='view_side_bar' access='allow'/>
+        <rule value='unittest' search_type='sthpw/task' column='project_code' group='search_filter'/>
+        </rules>
+        """)
+
+        # the rules are compiled once and shared
+        access_manager = AccessManager()
+        access_manager.add_group_rules([group])
+        access_manager2 = AccessManager()
+        access_manager2.add_group_rules([group])
+        self.assertEqual(True, access_manager.groups is access_manager2.groups)
+        self.assertEqual("allow", access_manager.get_access("builtin", {'key': 'view_side_bar', 'project': '*'}))
+        self.assertEqual(1, len(access_manager.get_search_filters().get("sthpw/task")))
+
+        # adding rules does not change the shared rules
+        xml = Xml()
+        xml.read_string("<rules><rule group='builtin' key='other' access='allow'/></rules>")
+        access_manager2.add_xml_rules(xml)
+        self.assertEqual(False, access_manager.groups is access_manager2.groups)
+        self.assertEqual(None, access_manager.get_access("builtin", {'key': 'other', 'project': '*'}))
+        self.assertEqual("allow", access_manager2.get_access("builtin", {'key': 'other', 'project': '*'}))
+
+        # changed rules are compiled again
+        group.set_value("access_rules", "<rules><rule group='builtin' key='view_side_bar' access='deny'/></rules>")
+        access_manager3 = AccessManager()
+        access_manager3.add_group_rules([group])
+        self.assertEqual("deny", access_manager3.get_access("builtin", {'key': 'view_side_bar', 'project': '*'}))
+
+        AccessManager.clear_compiled_rules()
+
+
+
     def _test_guest_allow(self):
         '''test Config tag allow_guest in security tag.
         Note: Since it is hard to emulate AppServer class,
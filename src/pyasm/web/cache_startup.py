@@ -15,60 +15,14 @@ __all__ = ['CacheStartup', 'TableInfoCache']
 import tacticenv
 
 from pyasm.common import Config, Common, Container, GlobalContainer
-from pyasm.search import DbContainer, DatabaseImpl, DbResource
+from pyasm.search import DbContainer, DbResource
 from tactic.command import Scheduler, SchedulerTask
 from pyasm.security import Batch
-from pyasm.biz import BaseCache, CacheContainer, SearchTypeCache
+from pyasm.biz import CacheContainer, SearchTypeCache, TableInfoCache, STHPW_TABLES
+from pyasm.biz import CacheBus, CacheBusListener
 
 import time
 
-STHPW_TABLES = ['project', 'search_object', 'login', 'login_group', 'login_in_group','snapshot','file','trigger','notification','ticket', 'task', 'task', 'status_log', 'pref_setting', 'cache', 'transaction_log', 'change_timestamp']
-
-# custom cache class
-class TableInfoCache(BaseCache):
-    def __init__(self, **kwargs):
-        self.database = kwargs.get("database")
-        self.tables = kwargs.get("tables") or []
-
-        self.db_resource = kwargs.get("db_resource")
-        if not self.db_resource:
-            self.db_resource = DbResource.get_default(self.database)
-
-        if not kwargs.get("key") and self.db_resource:
-            self.key = str(self.db_resource)
-        else:
-            self.key = kwargs.get("key")
-
-        super(TableInfoCache, self).__init__(self.key)
-
-
-        # precache some of the sthpw tables
-        if not self.tables and  self.db_resource.get_database() == "sthpw":
-            self.tables = STHPW_TABLES
-
-
-
-    def init_cache(self):
-
-        data = {}
-        self.caches['data'] = data
-        columns = {}
-        self.caches['columns'] = columns
-
-        for table in self.tables:
-            DatabaseImpl.get().get_column_info(self.db_resource, table)
-
-
-
-    def add_table(self, table, column_data):
-        data = self.caches['data']
-        data[table] = column_data
-
-        sql = self.db_resource.get_sql()
-        columns = self.caches['columns']
-        column_list = sql.get_columns(table)
-        columns[table] = column_list
-
 
 
 class CacheStartup(object):
@@ -83,7 +37,6 @@ class CacheStartup(object):
             return
 
 
-        from pyasm.search import DbResource
         db_resource = DbResource.get_default("sthpw")
 
         # pre-cache sthpw tables definitions
@@ -99,6 +52,8 @@ class CacheStartup(object):
         from pyasm.security import Sudo
         sudo = Sudo()
         try:
+            # pre-cache the table definitions of all of the projects
+            self.cache_project_tables()
 
             # cache search object table
             search_type_cache = SearchTypeCache.get("sthpw/search_object")
@@ -121,6 +76,46 @@ class CacheStartup(object):
 
 
 
+    def cache_project_tables(self):
+        '''warm the table metadata cache for the tables of all of the
+        search types registered in each project'''
+        from pyasm.search import Search
+
+        search_type_cache = SearchTypeCache.get("sthpw/search_object")
+        search_type_objs = search_type_cache.get_sobjects()
+
+        search = Search("sthpw/project")
+        projects = search.get_sobjects()
+        for project in projects:
+            project_code = project.get_code()
+            if project_code in ['sthpw', 'admin']:
+                continue
+
+            try:
+                db_resource = project.get_project_db_resource()
+                if not db_resource.exists():
+                    continue
+
+                impl = db_resource.get_database_impl()
+                table_info = impl.get_table_info(db_resource)
+
+                tables = set()
+                for search_type_obj in search_type_objs:
+                    if search_type_obj.get_value("database") not in ["{project}", project_code]:
+                        continue
+                    table = search_type_obj.get_table()
+                    if table in table_info:
+                        tables.add(table)
+
+                cache = TableInfoCache.get_by_db_resource(db_resource)
+                cache.warm(tables)
+            except Exception as e:
+                print("WARNING: could not cache tables of project [%s]: %s" % (project_code, e))
+            finally:
+                DbContainer.release_thread_sql()
+
+
+
     def init_scheduler(self):
 
         scheduler = Scheduler.get()
@@ -136,6 +131,12 @@ class CacheStartup(object):
 
     def start_cache_tasks(self, scheduler):
 
+        # with a cache bus, invalidations are pushed to this process as
+        # they happen, so there is no need to poll the cache table
+        if CacheBus.get_mode() != "poll":
+            self.start_cache_bus_task(scheduler)
+            return
+
         
         # do a dirty check every X seconds
         class DirtyTask(SchedulerTask):
@@ -181,16 +182,40 @@ class CacheStartup(object):
         scheduler.add_interval_task(task, interval=interval, mode='threaded', delay=30)
 
 
+    def start_cache_bus_task(self, scheduler):
+
+        # listen for invalidations for the life of the process
+        class CacheBusTask(SchedulerTask):
+            def execute(self):
+                listener = CacheBusListener()
+                while True:
+                    try:
+                        messages = listener.wait(5)
+                        if messages:
+                            CacheBus.dispatch(messages)
+                    except Exception as e:
+                        print("WARNING: cache bus error: ", e)
+                        listener.close()
+                        time.sleep(5)
+                    finally:
+                        DbContainer.commit_thread_sql()
+                        DbContainer.release_thread_sql()
+
+        task = CacheBusTask()
+        scheduler.add_single_task(task, mode='threaded', delay=10)
+
+
     def start_basic_tasks(self, scheduler):
 
-        # close all extraneous database connections 15 minutes
-        class DatabaseCloseTask(SchedulerTask):
+        # evict idle and expired database connections and keep the
+        # minimum number of connections warm.  This replaces closing
+        # all connections every 15 minutes
+        class DatabasePoolTask(SchedulerTask):
             def execute(self):
-                #print("Closing all connections")
-                DbContainer.close_all_global_connections()
+                DbContainer.maintain_global_connections()
 
-        task = DatabaseCloseTask()
-        interval = 15*60
+        task = DatabasePoolTask()
+        interval = 60
         scheduler.add_interval_task(task, interval=interval, mode='threaded', delay=60)
 
 
@@ -250,7 +275,6 @@ if __name__ == '__main__':
     cmd.init_scheduler()
 
     try:
-        import time
         time.sleep(600)
     except KeyboardInterrupt:
         scheduler = Scheduler.get()
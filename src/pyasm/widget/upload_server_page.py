@@ -19,9 +19,9 @@ from pyasm.common import Environment, TacticException, Common
 from pyasm.biz import File
 from pyasm.search import SearchType
 from pyasm.web import *
-from pyasm.command import FileUpload
+from pyasm.command import FileUpload, UploadSession
 
-import shutil, re
+import shutil, re, base64
 
 import six
 basestring = six.string_types
@@ -32,6 +32,11 @@ class UploadServerWdg(Widget):
     def get_display(self):
         web = WebContainer.get_web()
 
+        # chunk of a resumable upload
+        upload_id = web.get_form_value("upload_id")
+        if upload_id:
+            return self.dump_chunk(upload_id)
+
         num_files = web.get_form_value("num_files")
         files = []
 
@@ -107,14 +112,49 @@ class UploadServerWdg(Widget):
 
 
 
-    def dump(self, field_storage, file_name):
-
+    def get_ticket(self):
         web = WebContainer.get_web()
-
         ticket = web.get_form_value("transaction_ticket")
         if not ticket:
             security = Environment.get_security()
             ticket = security.get_ticket_key()
+        return ticket
+
+
+
+    def dump_chunk(self, upload_id):
+        '''write a chunk sent with the upload_id, offset and checksum fields
+        into a resumable upload.  See UploadSession'''
+        web = WebContainer.get_web()
+
+        field_storage = web.get_form_value("file")
+        if not field_storage or isinstance(field_storage, basestring):
+            raise TacticException("No data sent for upload [%s]" % upload_id)
+
+        offset = web.get_form_value("offset") or 0
+        checksum = web.get_form_value("checksum")
+
+        f = field_storage.file
+        f.seek(0)
+        data = f.read()
+
+        # the python client sends the data base64 encoded
+        match = re.match(b"^data:[\w\-\_]+\/[\w\-\_]+;base64,", data[:100])
+        if match:
+            data = base64.b64decode(data[match.end():])
+
+        session = UploadSession(upload_id, ticket=self.get_ticket())
+        checksum = session.write_chunk(offset, data, checksum)
+
+        return "upload_id=%s\noffset=%s\nchecksum=%s\n" % (upload_id, offset, checksum)
+
+
+
+    def dump(self, field_storage, file_name):
+
+        web = WebContainer.get_web()
+
+        ticket = self.get_ticket()
 
 
         tmpdir = Environment.get_tmp_dir()
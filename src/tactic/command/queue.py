@@ -8,14 +8,14 @@
 #    or disclosed in any way without written permission.
 #
 #
-__all__ = ['JobTask', 'Queue']
+__all__ = ['JobTask', 'Queue', 'QueueListener']
 
 import tacticenv
 
 from pyasm.security import Batch
 from pyasm.common import Common, Config, Container, Environment, jsonloads, jsondumps, TacticException
 from pyasm.biz import Project
-from pyasm.search import Search, SearchType, DbContainer, Transaction
+from pyasm.search import Search, SearchType, DbContainer, DbListener, Transaction, Sql, Select
 from pyasm.command import Command
 from tactic.command import Scheduler, SchedulerTask
 
@@ -27,11 +27,80 @@ class Queue:
 
     def get_next_job(job_search_type="sthpw/queue", queue_type=None, server_code=None):
 
+        jobs = Queue.claim_jobs(job_search_type=job_search_type, queue_type=queue_type, server_code=server_code, limit=1)
+        if jobs:
+            return jobs[0]
+        else:
+            return None
+
+    get_next_job = staticmethod(get_next_job)
+
+
+
+    def claim_jobs(job_search_type="sthpw/queue", queue_type=None, server_code=None, limit=1, host=None):
+        '''lock up to "limit" pending jobs for this process and return them.
+        On PostgreSQL, the jobs are claimed with a single statement which
+        skips rows locked by other queue processes.  Other databases try
+        to lock the pending jobs one at a time'''
+
         sql = DbContainer.get("sthpw")
 
         search_type_obj = SearchType.get(job_search_type)
         table = search_type_obj.get_table()
 
+        if sql.get_database_type() == "PostgreSQL":
+            queue_ids = Queue._claim_skip_locked(sql, table, queue_type, server_code, limit, host)
+        else:
+            queue_ids = Queue._claim_one_by_one(sql, job_search_type, table, queue_type, server_code, limit, host)
+
+        if not queue_ids:
+            return []
+
+        search = Search(job_search_type)
+        search.add_filters("id", queue_ids)
+        search.add_order_by("priority")
+        search.add_order_by("timestamp")
+        return search.get_sobjects()
+
+    claim_jobs = staticmethod(claim_jobs)
+
+
+
+    def _claim_skip_locked(sql, table, queue_type, server_code, limit, host):
+
+        select = Select()
+        select.set_database(sql)
+        select.add_table(table)
+        select.add_column("id")
+        if queue_type:
+            select.add_filter("queue", queue_type)
+        if server_code:
+            select.add_filter("server_code", server_code)
+        select.add_filter("state", "pending")
+        select.add_order_by("priority")
+        select.add_order_by("timestamp")
+        select.set_limit(limit)
+
+        set_host = ""
+        if host:
+            set_host = ', "host" = %s' % Sql.quote(host)
+
+        update = '''UPDATE "%s" SET "state" = 'locked'%s WHERE "id" IN (%s FOR UPDATE SKIP LOCKED) RETURNING "id"''' % (table, set_host, select.get_statement())
+
+        results = sql.do_query(update)
+
+        # the update has to be committed if there is no transaction
+        if sql.transaction_count == 0:
+            sql.commit()
+
+        return [x[0] for x in results]
+
+    _claim_skip_locked = staticmethod(_claim_skip_locked)
+
+
+
+    def _claim_one_by_one(sql, job_search_type, table, queue_type, server_code, limit, host):
+
         # get the entire queue
         search = Search(job_search_type)
         if queue_type:
@@ -44,11 +113,15 @@ class Queue:
         search.add_order_by("timestamp")
 
 
-        chunk = 10
+        chunk = max(10, limit)
         search.add_limit(chunk)
 
         queues = search.get_sobjects()
-        queue_id = 0
+        queue_ids = []
+
+        set_host = ""
+        if host:
+            set_host = ", host = %s" % Sql.quote(host)
 
         for queue in queues:
 
@@ -56,23 +129,29 @@ class Queue:
 
             # attempt to lock this queue
             # have to do this manually
-            update = """UPDATE "%s" SET state = 'locked' where id = '%s' and state = 'pending'""" % (table, queue_id)
+            update = """UPDATE "%s" SET state = 'locked'%s where id = '%s' and state = 'pending'""" % (table, set_host, queue_id)
 
             sql.do_update(update)
             row_count = sql.get_row_count()
 
             if row_count == 1:
-                break
-            else:
-                queue_id = 0
+                queue_ids.append(queue_id)
+                if len(queue_ids) >= limit:
+                    break
 
-        if queue_id:
-            queue = Search.get_by_id(job_search_type, queue_id)
-            return queue
-        else:
-            return None
+        return queue_ids
 
-    get_next_job = staticmethod(get_next_job)
+    _claim_one_by_one = staticmethod(_claim_one_by_one)
+
+
+
+    def notify():
+        '''wake up the queue processes waiting for new jobs'''
+        # the notification is only sent once the transaction commits
+        sql = DbContainer.get("sthpw")
+        sql.notify(QueueListener.CHANNEL)
+
+    notify = staticmethod(notify)
 
 
     def add(command, kwargs, queue_type, priority, description, message_code=None):
@@ -107,12 +186,39 @@ class Queue:
         queue.set_user()
         queue.commit()
 
+        Queue.notify()
+
         return queue
 
     add = staticmethod(add)
 
 
 
+class QueueListener(DbListener):
+    '''Waits for new jobs to be added to the queue.  On PostgreSQL, this
+    listens for notifications on a dedicated connection.  Other databases
+    have no notifications'''
+
+    CHANNEL = "spt_queue"
+
+    def __init__(self):
+        db_resource = DbContainer.get("sthpw").get_db_resource()
+        super(QueueListener, self).__init__(db_resource, self.CHANNEL)
+
+
+    def wait(self, timeout):
+        '''wait until a job is added or the timeout has passed.  Returns
+        True if a notification was received'''
+        import time
+
+        try:
+            payloads = super(QueueListener, self).wait(timeout)
+            return len(payloads) > 0
+        except Exception as e:
+            print("WARNING: queue listener failed: ", e)
+            time.sleep(timeout)
+            return False
+
 
 
 
@@ -136,6 +242,34 @@ class JobTask(SchedulerTask):
 
         self.max_jobs = 20
 
+        # number of jobs claimed from the queue at once
+        self.claim_size = kwargs.get("claim_size")
+        if not self.claim_size:
+            self.claim_size = 1
+        self.claimed_jobs = []
+
+        # maximum time to wait for a new job when the queue is empty
+        self.idle_interval = kwargs.get("idle_interval")
+        if not self.idle_interval:
+            self.idle_interval = 5
+        self.wait_interval = self.check_interval
+        self.listener = None
+
+        # run the jobs in a pool of persistent worker processes
+        self.worker_pool = None
+        if kwargs.get("workers"):
+            from pyasm.security import Site
+            from .queue_worker import JobWorkerPool
+            self.worker_pool = JobWorkerPool(
+                workers=kwargs.get("workers"),
+                concurrency=kwargs.get("concurrency"),
+                timeout=kwargs.get("job_timeout"),
+                max_attempts=kwargs.get("max_attempts"),
+                retry_interval=kwargs.get("retry_interval"),
+                max_jobs_per_worker=kwargs.get("max_jobs_per_worker"),
+                site=Site.get_site(),
+            )
+
         self.queue_type = kwargs.get("queue")
         self.pid_path = kwargs.get("pid_path")
         super(JobTask, self).__init__()
@@ -160,7 +294,34 @@ class JobTask(SchedulerTask):
 
 
     def get_next_job(self, queue_type=None):
-        return Queue.get_next_job(queue_type=queue_type)
+        if not self.claimed_jobs:
+            process_key = self.get_process_key()
+            self.claimed_jobs = Queue.claim_jobs(queue_type=queue_type, limit=self.claim_size, host=process_key)
+
+        if self.claimed_jobs:
+            return self.claimed_jobs.pop(0)
+        else:
+            return None
+
+
+
+    def wait_for_job(self):
+        '''wait when there are no jobs in the queue.  If notifications are
+        available, this sleeps until a job is added, otherwise the wait
+        interval is doubled each time up to the idle interval'''
+        import time
+
+        if self.get_job_search_type() == "sthpw/queue":
+            if not self.listener:
+                listener = QueueListener()
+                if listener.is_supported():
+                    self.listener = listener
+            if self.listener:
+                self.listener.wait(self.idle_interval)
+                return
+
+        time.sleep(self.wait_interval)
+        self.wait_interval = min(self.wait_interval * 2, self.idle_interval)
 
 
 
@@ -180,7 +341,7 @@ class JobTask(SchedulerTask):
         if count >= 3:
             return
         try:
-            for job in self.jobs:
+            for job in self.jobs + self.claimed_jobs:
                 # reset all none complete jobs to pending
 
                 current_state = job.get_value("state")
@@ -193,6 +354,7 @@ class JobTask(SchedulerTask):
                 job.commit()
 
             self.jobs = []
+            self.claimed_jobs = []
 
         except Exception as e:
             print("Exception: ", e.message)
@@ -212,12 +374,25 @@ class JobTask(SchedulerTask):
                 os.utime(pid_path, None)
 
             self.check_existing_jobs()
-            self.check_new_job(self.queue_type)
-            time.sleep(self.check_interval)
+            self.check_worker_pool()
+            has_job = self.check_new_job(self.queue_type)
+            if self.worker_pool and self.worker_pool.is_busy():
+                # results of the workers need to be collected
+                has_job = True
+            if has_job:
+                self.wait_interval = self.check_interval
+                time.sleep(self.check_interval)
+            else:
+                self.wait_for_job()
             DbContainer.close_thread_sql()
 
             if self.max_jobs_completed != -1 and self.jobs_completed > self.max_jobs_completed:
 
+                if self.worker_pool:
+                    if self.worker_pool.is_busy():
+                        continue
+                    self.worker_pool.close()
+
                 if os.environ.get('TACTIC_QUEUE_MODE') == "monitor":
                     Common.kill()
                 else:
@@ -246,8 +421,11 @@ class JobTask(SchedulerTask):
             state = job.get_value("state")
             if state == 'cancel':
                 print("Cancel task [%s] ...." % job_code)
-                scheduler = Scheduler.get()
-                scheduler.cancel_task(job_code)
+                if self.worker_pool and self.worker_pool.cancel(job_code):
+                    pass
+                else:
+                    scheduler = Scheduler.get()
+                    scheduler.cancel_task(job_code)
 
                 job.set_value("state", "terminated")
                 job.commit()
@@ -259,23 +437,47 @@ class JobTask(SchedulerTask):
 
 
 
+    def check_worker_pool(self):
+        '''collect the jobs finished by the worker pool'''
+        if not self.worker_pool:
+            return
+
+        for job, state in self.worker_pool.poll():
+            if job in self.jobs:
+                self.jobs.remove(job)
+            self.jobs_completed += 1
+
+
+
+    def get_worker_stats(self):
+        '''throughput and latency metrics of the worker pool'''
+        if not self.worker_pool:
+            return {}
+        return self.worker_pool.get_stats()
+
+
+
     def check_new_job(self, queue_type=None):
 
 
         num_jobs = len(self.jobs)
         if num_jobs >= self.max_jobs:
             print("Already at max jobs [%s]" % self.max_jobs)
-            return
+            return True
+
+        if self.worker_pool and self.worker_pool.get_capacity() <= 0:
+            return True
       
         self.job = self.get_next_job(queue_type)
         if not self.job:
-            return
+            return False
 
 		
-        # set the process key
+        # set the process key, unless it was set when claiming the job
         process_key = self.get_process_key()
-        self.job.set_value("host", process_key)
-        self.job.commit()
+        if self.job.get_value("host", no_exception=True) != process_key:
+            self.job.set_value("host", process_key)
+            self.job.commit()
 
         self.jobs.append(self.job)
 
@@ -314,6 +516,20 @@ class JobTask(SchedulerTask):
             kwargs['code'] = script_code
 
 
+        if self.worker_pool:
+            data = {
+                'command': command,
+                'kwargs': kwargs,
+                'login': login,
+                'project_code': project_code,
+                'job_code': job_code,
+                'job_search_type': self.get_job_search_type(),
+            }
+            print("Sending job to worker: ", job_code)
+            self.worker_pool.submit(self.job, data)
+            self.job = None
+            return True
+
 
         # add the job to the kwargs
         kwargs['job'] = self.job
@@ -475,6 +691,8 @@ class JobTask(SchedulerTask):
             else:
                 scheduler.add_single_task(task, mode='threaded')
 
+        return True
+
 
 
     def start(**kwargs):
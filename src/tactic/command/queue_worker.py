@@ -0,0 +1,476 @@
+############################################################
+#
+#    Copyright (c) 2010, Southpaw Technology
+#                        All Rights Reserved
+#
+#    PROPRIETARY INFORMATION.  This software is proprietary to
+#    Southpaw Technology, and is not to be reproduced, transmitted,
+#    or disclosed in any way without written permission.
+#
+#
+'''Pool of persistent worker processes which execute queue jobs.  Each
+worker imports TACTIC and connects to the database once and then runs
+jobs sent to it by the JobTask, so the startup cost is not paid for
+every job.'''
+
+__all__ = ['JobWorkerPool']
+
+import tacticenv
+
+from pyasm.common import Common, Container, TacticException
+from pyasm.search import Search, DbContainer, Transaction
+
+import os, time
+import multiprocessing
+
+import six
+basestring = six.string_types
+
+
+# modules imported by each worker when it starts
+WARM_IMPORTS = [
+    'pyasm.security',
+    'pyasm.search',
+    'pyasm.biz',
+    'pyasm.command',
+    'tactic.command',
+]
+
+
+
+def run_worker(conn, site, warm_imports):
+    '''main loop of a worker process.  Jobs are received through the
+    connection until None is sent or the pool goes away'''
+
+    for module in warm_imports:
+        try:
+            __import__(module)
+        except Exception as e:
+            print("WARNING: queue worker could not import [%s]: %s" % (module, e))
+
+    from pyasm.security import Batch
+    Batch(site=site)
+
+    while True:
+        try:
+            data = conn.recv()
+        except (EOFError, IOError, KeyboardInterrupt):
+            break
+
+        if data is None:
+            break
+
+        result = run_job(data)
+
+        try:
+            conn.send(result)
+        except (EOFError, IOError):
+            break
+
+    DbContainer.close_all()
+
+
+
+def run_job(data):
+    '''execute a single job inside of a worker process'''
+    from pyasm.security import Batch
+    from pyasm.biz import Project
+    from pyasm.command import Command
+
+    result = {
+        'job_code': data.get("job_code"),
+        'pid': os.getpid(),
+    }
+
+    start = time.time()
+    try:
+        project_code = data.get("project_code")
+        Batch(site=data.get("site"), project_code=project_code, login_code=data.get("login"))
+        Project.set_project(project_code)
+
+        kwargs = data.get("kwargs") or {}
+
+        # add the job to the kwargs
+        job_code = data.get("job_code")
+        if job_code:
+            search = Search(data.get("job_search_type") or "sthpw/queue")
+            search.add_filter("code", job_code)
+            kwargs['job'] = search.get_sobject()
+
+        cmd = Common.create_from_class_path(data.get("command"), kwargs=kwargs)
+
+        Container.put(Command.TOP_CMD_KEY, None)
+        Container.put(Transaction.KEY, None)
+        Command.execute_cmd(cmd)
+
+        result['state'] = "complete"
+
+    except TacticException as e:
+        # This is an error on this server, so don't bother retrying
+        result['state'] = "error"
+        result['message'] = str(e)
+
+    except Exception as e:
+        result['state'] = "retry"
+        result['message'] = str(e)
+
+    finally:
+        # keep the connections for the next job
+        DbContainer.release_thread_sql()
+
+    result['run_time'] = time.time() - start
+    return result
+
+
+
+
+class JobWorker(object):
+    '''handle to a single worker process'''
+
+    def __init__(self, context, site, warm_imports):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(child_conn, site, warm_imports))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+        self.entry = None
+        self.start_time = None
+        self.num_jobs = 0
+
+
+    def is_busy(self):
+        return self.entry is not None
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+
+    def send(self, entry):
+        self.entry = entry
+        self.start_time = time.time()
+        self.num_jobs += 1
+        self.conn.send(entry['data'])
+
+
+    def get_result(self):
+        '''get the result of the current job without blocking.  Returns None
+        if the job is still running'''
+        if not self.conn.poll():
+            return None
+        return self.conn.recv()
+
+
+    def terminate(self):
+        try:
+            self.process.terminate()
+            self.process.join(1)
+        except Exception:
+            pass
+        self.conn.close()
+
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+
+
+class JobWorkerPool(object):
+    '''Dispatches queue jobs to a pool of persistent worker processes.
+    None of the methods block, so they can be called from the JobTask loop.
+
+    @keyparam:
+        workers - maximum number of worker processes
+        concurrency - maximum number of jobs run at once for each queue name.
+            Either a dictionary or a string like "render:1,default:4"
+        timeout - number of seconds after which a job is killed
+        max_attempts - number of times a failed job is run
+        retry_interval - seconds before the first retry.  This doubles with
+            each attempt
+        max_jobs_per_worker - recycle a worker after it has run this
+            many jobs.  0 means workers are never recycled
+        site - site the workers run in
+    '''
+
+    def __init__(self, **kwargs):
+        self.num_workers = int(kwargs.get("workers") or 2)
+
+        concurrency = kwargs.get("concurrency") or {}
+        if isinstance(concurrency, basestring):
+            parts = [x.strip() for x in concurrency.split(",") if x.strip()]
+            concurrency = {}
+            for part in parts:
+                name, value = part.split(":")
+                concurrency[name.strip()] = int(value)
+        self.concurrency = concurrency
+
+        self.timeout = int(kwargs.get("timeout") or 3600)
+        self.max_attempts = int(kwargs.get("max_attempts") or 3)
+        self.retry_interval = float(kwargs.get("retry_interval") or 5)
+        self.max_jobs_per_worker = int(kwargs.get("max_jobs_per_worker") or 0)
+        self.site = kwargs.get("site")
+        self.warm_imports = kwargs.get("warm_imports") or WARM_IMPORTS
+
+        # workers are started as new interpreters so that they do not
+        # share database connections with this process
+        try:
+            self.context = multiprocessing.get_context("spawn")
+        except AttributeError:
+            self.context = multiprocessing
+
+        self.workers = []
+
+        # jobs waiting for a free slot or for their retry time
+        self.waiting = []
+
+        self.start_time = time.time()
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'errors': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'cancelled': 0,
+            'worker_starts': 0,
+            'worker_deaths': 0,
+            'run_time': 0.0,
+            'max_run_time': 0.0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+
+    def get_capacity(self):
+        '''number of new jobs that can be accepted right now'''
+        return self.num_workers - self.get_num_running() - len(self.waiting)
+
+
+    def get_num_running(self, queue=None):
+        count = 0
+        for worker in self.workers:
+            if not worker.is_busy():
+                continue
+            if queue is None or worker.entry['queue'] == queue:
+                count += 1
+        return count
+
+
+    def is_busy(self):
+        return self.get_num_running() > 0 or len(self.waiting) > 0
+
+
+    def submit(self, job, data):
+        '''add a job to the pool.  The data is sent to the worker and has to
+        contain the command, kwargs, login, project_code and job_code'''
+        queue = job.get_value("queue", no_exception=True) or "default"
+
+        data = data.copy()
+        if not data.get("site"):
+            data['site'] = self.site
+
+        now = time.time()
+        entry = {
+            'job': job,
+            'job_code': job.get_code(),
+            'queue': queue,
+            'data': data,
+            'attempts': 0,
+            'submit_time': now,
+            'ready_time': now,
+        }
+        self.waiting.append(entry)
+        self.stats['submitted'] += 1
+
+        self._dispatch()
+
+
+    def cancel(self, job_code):
+        '''stop a job, killing its worker if it is running'''
+        for entry in self.waiting:
+            if entry['job_code'] == job_code:
+                self.waiting.remove(entry)
+                self.stats['cancelled'] += 1
+                return True
+
+        for worker in self.workers:
+            if worker.is_busy() and worker.entry['job_code'] == job_code:
+                worker.terminate()
+                self.workers.remove(worker)
+                self.stats['cancelled'] += 1
+                return True
+
+        return False
+
+
+    def poll(self):
+        '''collect the results of the workers and start waiting jobs.
+        Returns a list of (job, state) for the jobs that have finished'''
+        finished = []
+        now = time.time()
+
+        for worker in list(self.workers):
+            if not worker.is_busy():
+                if not worker.is_alive():
+                    self.workers.remove(worker)
+                continue
+
+            entry = worker.entry
+
+            try:
+                result = worker.get_result()
+            except (EOFError, IOError):
+                result = {'state': 'retry', 'message': 'Worker process died'}
+                self.stats['worker_deaths'] += 1
+                worker.terminate()
+                self.workers.remove(worker)
+            else:
+                if result is None:
+                    if not worker.is_alive():
+                        result = {'state': 'retry', 'message': 'Worker process died'}
+                        self.stats['worker_deaths'] += 1
+                        worker.terminate()
+                        self.workers.remove(worker)
+                    elif now - worker.start_time > self.timeout:
+                        print("Job [%s] timed out after [%s] seconds" % (entry['job_code'], self.timeout))
+                        result = {'state': 'error', 'message': 'Timed out'}
+                        self.stats['timeouts'] += 1
+                        worker.terminate()
+                        self.workers.remove(worker)
+                    else:
+                        continue
+
+                else:
+                    worker.entry = None
+                    if self.max_jobs_per_worker and worker.num_jobs >= self.max_jobs_per_worker:
+                        worker.close()
+                        self.workers.remove(worker)
+
+            run_time = now - worker.start_time
+            self.stats['run_time'] += run_time
+            if run_time > self.stats['max_run_time']:
+                self.stats['max_run_time'] = run_time
+
+            state = result.get("state")
+            if state == "retry":
+                entry['attempts'] += 1
+                if entry['attempts'] < self.max_attempts:
+                    # reschedule without blocking the loop
+                    delay = self.retry_interval * (2 ** (entry['attempts'] - 1))
+                    print("WARNING in Queue: %s.  Retrying [%s] in %s seconds" % (result.get("message"), entry['job_code'], delay))
+                    entry['ready_time'] = now + delay
+                    entry['submit_time'] = entry['ready_time']
+                    self.waiting.append(entry)
+                    self.stats['retries'] += 1
+                    continue
+
+                print("ERROR: reached max attempts for job [%s]" % entry['job_code'])
+                state = "error"
+
+            if state == "error":
+                print("Error: ", result.get("message"))
+                self.stats['errors'] += 1
+            else:
+                self.stats['completed'] += 1
+
+            job = entry['job']
+            job.set_value("state", state)
+            job.commit()
+            finished.append( (job, state) )
+
+        self._dispatch()
+        return finished
+
+
+    def _dispatch(self):
+        '''send waiting jobs to free workers'''
+        if not self.waiting:
+            return
+
+        now = time.time()
+        for entry in list(self.waiting):
+            if entry['ready_time'] > now:
+                continue
+
+            queue = entry['queue']
+            limit = self.concurrency.get(queue, self.num_workers)
+            if self.get_num_running(queue) >= limit:
+                continue
+
+            worker = self._get_free_worker()
+            if not worker:
+                break
+
+            self.waiting.remove(entry)
+
+            wait_time = now - entry['submit_time']
+            self.stats['wait_time'] += wait_time
+            if wait_time > self.stats['max_wait_time']:
+                self.stats['max_wait_time'] = wait_time
+
+            try:
+                worker.send(entry)
+            except (EOFError, IOError):
+                # the worker is gone, so try again on the next poll
+                worker.entry = None
+                worker.terminate()
+                self.workers.remove(worker)
+                self.stats['worker_deaths'] += 1
+                self.waiting.append(entry)
+
+
+    def _get_free_worker(self):
+        for worker in self.workers:
+            if not worker.is_busy() and worker.is_alive():
+                return worker
+
+        if len(self.workers) >= self.num_workers:
+            return None
+
+        worker = JobWorker(self.context, self.site, self.warm_imports)
+        self.workers.append(worker)
+        self.stats['worker_starts'] += 1
+        return worker
+
+
+    def get_stats(self):
+        stats = self.stats.copy()
+        finished = stats['completed'] + stats['errors']
+        started = stats['submitted'] - len(self.waiting)
+        if finished:
+            stats['avg_run_time'] = stats['run_time'] / finished
+        else:
+            stats['avg_run_time'] = 0.0
+        if started > 0:
+            stats['avg_wait_time'] = stats['wait_time'] / started
+        else:
+            stats['avg_wait_time'] = 0.0
+
+        elapsed = time.time() - self.start_time
+        if elapsed > 0:
+            stats['jobs_per_hour'] = finished * 3600.0 / elapsed
+        else:
+            stats['jobs_per_hour'] = 0.0
+
+        stats['running'] = self.get_num_running()
+        stats['waiting'] = len(self.waiting)
+        stats['workers'] = len(self.workers)
+        return stats
+
+
+    def close(self):
+        for worker in self.workers:
+            if worker.is_busy():
+                worker.terminate()
+            else:
+                worker.close()
+        self.workers = []
+
+
@@ -16,6 +16,8 @@ from pyasm.common import jsonloads, jsondumps, Environment
 from tactic.ui.common import BaseRefreshWdg
 
 import re
+import six
+basestring = six.string_types
 
 class BaseRestHandler(BaseRefreshWdg):
 
@@ -80,12 +82,33 @@ class SObjectRestHandler(BaseRestHandler):
         # /rest/get_by_code/cars/CAR00009
 
         # /rest/query?search_type=sthpw/cars
+        # /rest/query?search_type=sthpw/snapshot&limit=1000&cursor=
         if method == "query":
+            search_type = self.kwargs.get("search_type")
+            filters = self._get_json_kwarg("filters") or []
+            columns = self._get_json_kwarg("columns") or []
+            order_bys = self._get_json_kwarg("order_bys") or []
+            limit = self.kwargs.get("limit")
+            if limit:
+                limit = int(limit)
+
+            server = TacticServerStub.get()
+
+            # the cursor of the next page is returned with each page
+            cursor = self.kwargs.get("cursor")
+            if cursor != None:
+                if search_type == "sthpw/snapshot":
+                    return server.query_snapshots(filters, columns, order_bys, limit=limit, cursor=cursor)
+                return server.query(search_type, filters, columns, order_bys, limit=limit, cursor=cursor)
+
             code = self.kwargs.get("data")
-            from pyasm.search import Search
-            sobject = Search.get_by_code(search_type, code)
-            sobject_dict = sobject.get_sobject_dict()
-            return sobject_dict
+            if code:
+                from pyasm.search import Search
+                sobject = Search.get_by_code(search_type, code)
+                sobject_dict = sobject.get_sobject_dict()
+                return sobject_dict
+
+            return server.query(search_type, filters, columns, order_bys, limit=limit)
 
         # /rest/expression/@SOBJECT(sthpw/task)
         elif method == "expression":
@@ -103,6 +126,13 @@ class SObjectRestHandler(BaseRestHandler):
         return {}
 
 
+    def _get_json_kwarg(self, name):
+        value = self.kwargs.get(name)
+        if value and isinstance(value, basestring):
+            value = jsonloads(value)
+        return value
+
+
 
 
 class APIRestHandler(BaseRestHandler):
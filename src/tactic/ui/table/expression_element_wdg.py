@@ -176,6 +176,7 @@ class ExpressionElementWdg(TypeTableElementWdg):
         self.report_value = None
 
         self.cache_results = None
+        self.batch_results = {}
 
 
 
@@ -459,8 +460,15 @@ class ExpressionElementWdg(TypeTableElementWdg):
                 else:
                     result = ''
         else:
+            batch_results = None
+            if sobject and self.sobjects and len(self.sobjects) > 1:
+                batch_results = self._get_batch_results(expression, ret_single, ret_list)
 
-            result = parser.eval(expression, sobject, vars=self.vars, single=ret_single, list=ret_list, show_retired=self.show_retired)
+            search_key = sobject and sobject.get_search_key()
+            if batch_results and search_key in batch_results:
+                result = batch_results.get(search_key)
+            else:
+                result = parser.eval(expression, sobject, vars=self.vars, single=ret_single, list=ret_list, show_retired=self.show_retired)
 
 
         # if the result has a get_display_value call, then use that.
@@ -496,6 +504,43 @@ class ExpressionElementWdg(TypeTableElementWdg):
         return result
 
 
+    def _get_batch_results(self, expression, ret_single, ret_list):
+        '''evaluate the expression for all of the sobjects at once.  Returns
+        a dictionary of the result for each search key'''
+        key = (expression, ret_single, ret_list)
+        if key in self.batch_results:
+            return self.batch_results.get(key)
+
+        element_name = self.get_name()
+        sobjects = [x for x in self.sobjects if x and not x.is_insert()]
+        row_vars = []
+        for sobject in sobjects:
+            row_vars.append( {
+                'SOBJECT_ID': sobject.get_id(),
+                'SOBJECT_CODE': sobject.get_code(),
+            } )
+
+        vars = {
+            'ELEMENT_NAME': element_name,
+            'ELEMENT': element_name,
+        }
+
+        batch_results = {}
+        try:
+            parser = ExpressionParser()
+            results = parser.eval_many(expression, sobjects, vars=vars, row_vars=row_vars, single=ret_single, list=ret_list, show_retired=self.show_retired)
+            for sobject, result in zip(sobjects, results):
+                batch_results[sobject.get_search_key()] = result
+        except Exception as e:
+            # evaluate each sobject on its own instead
+            print("WARNING: batch evaluation of [%s] failed: %s" % (expression, e))
+            batch_results = None
+
+        self.batch_results[key] = batch_results
+        return batch_results
+
+
+
     def init_kwargs(self):
         '''initialize kwargs'''
         state = self.kwargs.get("state")